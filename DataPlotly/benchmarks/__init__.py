@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of plot building on synthetic layers
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+"""
+Runs the benchmark suite, see DataPlotly.benchmarks.suite
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import sys
+
+from DataPlotly.benchmarks.suite import main
+
+sys.exit(main())
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""
+Synthetic layers for benchmarks
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import random
+
+from qgis.PyQt.QtCore import (
+    QDate,
+    QVariant
+)
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsFeature,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsPointXY,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+
+# features are created and added in batches, to bound memory use for large layers
+BATCH_SIZE = 10000
+
+CATEGORIES = ['category_{}'.format(i) for i in range(12)]
+
+
+def synthetic_fields() -> QgsFields:
+    """
+    Returns the fields of synthetic layers
+    """
+    fields = QgsFields()
+    fields.append(QgsField('int_value', QVariant.Int))
+    fields.append(QgsField('double_value', QVariant.Double))
+    fields.append(QgsField('ratio', QVariant.Double))
+    fields.append(QgsField('category', QVariant.String))
+    fields.append(QgsField('label', QVariant.String))
+    fields.append(QgsField('date', QVariant.Date))
+    return fields
+
+
+def synthetic_features(fields: QgsFields, count: int, seed: int = 1):
+    """
+    Yields lists of count reproducible random point features, in batches
+    """
+    generator = random.Random(seed)
+    start_date = QDate(2000, 1, 1)
+    batch = []
+    for i in range(count):
+        f = QgsFeature(fields)
+        f.setAttributes([
+            generator.randint(0, 1000),
+            generator.gauss(100, 25),
+            generator.random(),
+            CATEGORIES[generator.randrange(len(CATEGORIES))],
+            'feature {}'.format(i),
+            start_date.addDays(generator.randrange(7000))
+        ])
+        f.setGeometry(QgsGeometry.fromPointXY(QgsPointXY(generator.uniform(-180, 180), generator.uniform(-90, 90))))
+        batch.append(f)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def create_memory_layer(count: int, seed: int = 1) -> QgsVectorLayer:
+    """
+    Creates a memory layer with count synthetic features
+    """
+    layer = QgsVectorLayer('Point?crs=EPSG:4326', 'synthetic_{}'.format(count), 'memory')
+    fields = synthetic_fields()
+    layer.dataProvider().addAttributes(fields.toList())
+    layer.updateFields()
+    for batch in synthetic_features(layer.fields(), count, seed):
+        layer.dataProvider().addFeatures(batch)
+    return layer
+
+
+def create_geopackage_layer(path: str, count: int, seed: int = 1) -> QgsVectorLayer:
+    """
+    Creates a GeoPackage at path with count synthetic features, and returns its layer
+    """
+    return create_file_layer(path, count, seed, 'GPKG')
+
+
+def create_file_layer(path: str, count: int, seed: int = 1, driver: str = 'GPKG') -> QgsVectorLayer:
+    """
+    Creates a file of an OGR driver at path with count synthetic features, and returns its layer
+    """
+    fields = synthetic_fields()
+    writer = QgsVectorFileWriter(path, 'UTF-8', fields, QgsWkbTypes.Point,
+                                 QgsCoordinateReferenceSystem('EPSG:4326'), driver)
+    if writer.hasError() != QgsVectorFileWriter.NoError:
+        raise IOError(writer.errorMessage())
+    for batch in synthetic_features(fields, count, seed):
+        writer.addFeatures(batch)
+    # flushes the file
+    del writer
+
+    return QgsVectorLayer(path, 'synthetic_{}'.format(count), 'ogr')
@@ -0,0 +1,458 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark suite of plot building
+
+Times fetching values, building traces, generating HTML and selecting plotted
+features for every plot type, on synthetic layers, and measures the peak memory
+allocated while building each plot. The figure serializer is also compared with
+plotly's JSON encoder on large traces, and the columnar reader with the feature
+iterator on a large FlatGeobuf file:
+
+    python -m DataPlotly.benchmarks --sizes 10000,100000 --output results.json
+    python -m DataPlotly.benchmarks --output new.json --compare results.json --threshold 0.2
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import plotly.graph_objs as go
+from plotly.utils import PlotlyJSONEncoder
+from qgis.core import (
+    Qgis,
+    QgsFeatureRequest,
+    QgsProject,
+    QgsSettings
+)
+
+from DataPlotly.benchmarks.layers import (
+    CATEGORIES,
+    create_file_layer,
+    create_geopackage_layer,
+    create_memory_layer
+)
+from DataPlotly.core.columnar_reader import ColumnarReader
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.plot_settings import PlotSettings
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# plot type -> x, y and z fields of synthetic layers
+PLOT_FIELDS = {
+    'scatter': ('double_value', 'int_value', ''),
+    'box': ('category', 'double_value', ''),
+    'violin': ('category', 'double_value', ''),
+    'bar': ('category', 'double_value', ''),
+    'histogram': ('double_value', '', ''),
+    'pie': ('category', 'int_value', ''),
+    '2dhistogram': ('double_value', 'int_value', ''),
+    'contour': ('double_value', 'int_value', ''),
+    'polar': ('double_value', 'int_value', ''),
+    'ternary': ('int_value', 'double_value', 'ratio')
+}
+
+PHASES = ('fetch', 'trace', 'layout', 'html', 'selection')
+
+PROVIDERS = ('memory', 'gpkg')
+
+# memory regressions smaller than this many bytes are ignored
+MIN_MEMORY_DIFFERENCE = 64 * 1024
+
+
+class BenchmarkSuite:
+    """
+    Runs benchmarks of every plot type on synthetic layers of several sizes and providers,
+    and compares results with a baseline.
+
+    Each phase is run repeat times, and the fastest time is kept. If measure_memory is
+    True, each plot is built once more with tracemalloc enabled, see memory_usage. If
+    serializer_size is not 0, JSON serialization is benchmarked on traces of that many
+    values, see run_serializer. If columnar_size is not 0, fetching the values of a file
+    with that many features is benchmarked with and without the columnar reader, see
+    run_columnar.
+    """
+
+    def __init__(self, sizes=(10000, 100000), providers=PROVIDERS,  # pylint: disable=too-many-arguments
+                 plot_types=None, repeat: int = 3, measure_memory: bool = True, serializer_size: int = 1000000,
+                 columnar_size: int = 5000000):
+        self.sizes = sizes
+        self.providers = providers
+        self.plot_types = plot_types or sorted(PlotFactory.PLOT_TYPES)
+        self.repeat = repeat
+        self.measure_memory = measure_memory
+        self.serializer_size = serializer_size
+        self.columnar_size = columnar_size
+
+    @staticmethod
+    def create_settings(plot_type: str, layer) -> PlotSettings:
+        """
+        Creates the settings of a benchmarked plot
+        """
+        x, y, z = PLOT_FIELDS.get(plot_type, ('double_value', 'int_value', ''))
+        settings = PlotSettings(plot_type)
+        settings.source_layer_id = layer.id()
+        settings.properties['x_name'] = x
+        settings.properties['y_name'] = y
+        settings.properties['z_name'] = z
+        return settings
+
+    @staticmethod
+    def select(layer, factory) -> bool:
+        """
+        Selects features like a selection or click in the plot does, returning False
+        if the plot type doesn't support selections
+        """
+        plot_type = factory.settings.plot_type
+        if plot_type in ('scatter', 'ternary', 'polar'):
+            # a selection of 10% of the points
+            layer.selectByIds(factory.settings.feature_ids[::10])
+        elif plot_type == 'histogram':
+            # a click on a bin
+            exp = """ "{}" <= {} AND "{}" > {} """.format(factory.settings.properties['x_name'], 105,
+                                                          factory.settings.properties['x_name'], 95)
+            layer.selectByIds([f.id() for f in layer.getFeatures(QgsFeatureRequest().setFilterExpression(exp))])
+        elif plot_type in ('bar', 'box', 'violin', 'pie'):
+            # a click on a category
+            exp = """ "{}" = '{}' """.format(factory.settings.properties['x_name'], CATEGORIES[0])
+            layer.selectByIds([f.id() for f in layer.getFeatures(QgsFeatureRequest().setFilterExpression(exp))])
+        else:
+            return False
+        layer.removeSelection()
+        return True
+
+    def build(self, layer, plot_type: str) -> PlotFactory:
+        """
+        Builds the HTML of a plot type on a layer, phase by phase, returning the factory
+        """
+        factory = PlotFactory(self.create_settings(plot_type, layer), build=False)
+        factory.dispose()
+        factory.fetch_values_from_layer()
+        factory.trace = factory._build_trace()  # pylint: disable=protected-access
+        factory.layout = factory._build_layout()  # pylint: disable=protected-access
+        factory.build_html({})
+        return factory
+
+    def memory_usage(self, layer, plot_type: str) -> tuple:
+        """
+        Measures the peak memory allocated while building a plot type on a layer, returning
+        the peak in bytes and the number of plotted features.
+
+        The plot is built once before measuring, so that one-off allocations (e.g. plotly
+        validators) are not counted. tracemalloc only traces memory allocated by Python
+        (including numpy arrays), not by QGIS, Qt or GDAL; tracing is restarted if it was
+        already enabled.
+        """
+        self.build(layer, plot_type)
+
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        tracemalloc.start()
+        try:
+            factory = self.build(layer, plot_type)
+            features = len(factory.settings.feature_ids)
+            del factory
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak, features
+
+    def run_plot(self, layer, plot_type: str) -> dict:
+        """
+        Benchmarks a plot type on a layer, returning the fastest time of each phase
+        and the peak memory
+        """
+        times = {}
+        result = {}
+
+        def record(phase, seconds):
+            times[phase] = min(times.get(phase, seconds), seconds)
+
+        for _ in range(self.repeat):
+            factory = self.build(layer, plot_type)
+            for phase in ('fetch', 'trace', 'layout', 'html'):
+                record(phase, factory.stats.time(phase))
+
+            start = time.perf_counter()
+            if self.select(layer, factory):
+                record('selection', time.perf_counter() - start)
+
+            result['features'] = len(factory.settings.feature_ids)
+            result['html_chars'] = factory.stats.payload_chars
+
+        result.update({phase: times.get(phase) for phase in PHASES})
+
+        result['peak_memory'] = None
+        result['memory_per_feature'] = None
+        if self.measure_memory:
+            peak, features = self.memory_usage(layer, plot_type)
+            result['peak_memory'] = peak
+            if features:
+                result['memory_per_feature'] = peak / features
+        return result
+
+    @staticmethod
+    def create_serializer_traces(size: int) -> list:
+        """
+        Creates traces of size values, with lists like plots built from layers have,
+        numpy arrays with NaN values and dates
+        """
+        generator = random.Random(1)
+        start = datetime.datetime(2000, 1, 1)
+        if numpy is not None:
+            y = numpy.arange(size, dtype=float)
+            y[::100] = numpy.nan
+        else:
+            y = [float('nan') if i % 100 == 0 else float(i) for i in range(size)]
+        return [
+            go.Scatter(x=[generator.gauss(100, 25) for _ in range(size)],
+                       y=[generator.randint(0, 1000) for _ in range(size)],
+                       ids=list(range(size))),
+            go.Scatter(x=[start + datetime.timedelta(minutes=i) for i in range(size)],
+                       y=y)
+        ]
+
+    def run_serializer(self, size: int) -> dict:
+        """
+        Times serializing traces of size values with FigureSerializer and with plotly's
+        PlotlyJSONEncoder, returning the fastest times and the speedup
+        """
+        traces = self.create_serializer_traces(size)
+        times = {'plotly': None, 'serializer': None}
+
+        def record(key, seconds):
+            times[key] = seconds if times[key] is None else min(times[key], seconds)
+
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            json.dump(traces, io.StringIO(), cls=PlotlyJSONEncoder)
+            record('plotly', time.perf_counter() - start)
+
+            start = time.perf_counter()
+            FigureSerializer(io.StringIO()).dump(traces)
+            record('serializer', time.perf_counter() - start)
+
+        times['values'] = size
+        times['speedup'] = times['plotly'] / times['serializer'] if times['serializer'] else None
+        return times
+
+    def run_columnar(self, size: int) -> dict:
+        """
+        Times fetching the values of a scatter plot from a FlatGeobuf file of size features
+        with the columnar reader and with the feature iterator, returning the fastest times
+        and the speedup, or None if columnar reading isn't available
+        """
+        if not ColumnarReader.is_available():
+            return None
+
+        times = {'iterator': None, 'columnar': None}
+        temp_dir = tempfile.mkdtemp()
+        try:
+            try:
+                layer = create_file_layer(os.path.join(temp_dir, 'synthetic.fgb'), size, driver='FlatGeobuf')
+            except IOError:
+                # FlatGeobuf is not available
+                return None
+            QgsProject.instance().addMapLayer(layer, False)
+            try:
+                for _ in range(self.repeat):
+                    for key, columnar in (('iterator', False), ('columnar', True)):
+                        QgsSettings().setValue('dataplotly/columnar_reader', columnar)
+                        factory = PlotFactory(self.create_settings('scatter', layer), build=False)
+                        factory.dispose()
+                        factory.fetch_values_from_layer()
+                        if columnar and factory.stats.fetch_path != 'columnar reader':
+                            return None
+                        seconds = factory.stats.time('fetch')
+                        times[key] = seconds if times[key] is None else min(times[key], seconds)
+            finally:
+                QgsSettings().remove('dataplotly/columnar_reader')
+                QgsProject.instance().removeMapLayer(layer.id())
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        times['values'] = size
+        times['speedup'] = times['iterator'] / times['columnar'] if times['columnar'] else None
+        return times
+
+    def run(self, progress=None) -> dict:
+        """
+        Runs the benchmarks, returning the results. progress is an optional callback
+        called with the key and result of each benchmark.
+        """
+        results = {}
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for provider in self.providers:
+                for size in self.sizes:
+                    if provider == 'memory':
+                        layer = create_memory_layer(size)
+                    else:
+                        layer = create_geopackage_layer(os.path.join(temp_dir, 'synthetic_{}.gpkg'.format(size)), size)
+                    QgsProject.instance().addMapLayer(layer, False)
+                    try:
+                        for plot_type in self.plot_types:
+                            key = '{}/{}/{}'.format(provider, size, plot_type)
+                            results[key] = self.run_plot(layer, plot_type)
+                            if progress:
+                                progress(key, results[key])
+                    finally:
+                        QgsProject.instance().removeMapLayer(layer.id())
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        serializer = self.run_serializer(self.serializer_size) if self.serializer_size else None
+        columnar = self.run_columnar(self.columnar_size) if self.columnar_size else None
+
+        return {
+            'metadata': {
+                'date': datetime.datetime.now().isoformat(),
+                'qgis': Qgis.QGIS_VERSION,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'repeat': self.repeat,
+                'measure_memory': self.measure_memory
+            },
+            'results': results,
+            'serializer': serializer,
+            'columnar': columnar
+        }
+
+    @staticmethod
+    def compare(baseline: dict, current: dict, thresholds: dict = None, default_threshold: float = 0.2,
+                min_difference: float = 0.005) -> list:  # pylint: disable=too-many-arguments
+        """
+        Compares results with baseline results, and returns the regressions as a list of
+        (benchmark key, phase, baseline value, current value) tuples.
+
+        A phase regresses if it is slower than the baseline by more than its threshold
+        (a fraction, per phase in thresholds, or default_threshold) and by more than
+        min_difference seconds, which ignores noise in very fast phases. The peak memory
+        is compared like a phase (as 'peak_memory'), ignoring differences smaller than
+        MIN_MEMORY_DIFFERENCE bytes.
+        """
+        thresholds = thresholds or {}
+        regressions = []
+        for key, result in current['results'].items():
+            base = baseline['results'].get(key)
+            if base is None:
+                continue
+            for phase in PHASES + ('peak_memory',):
+                before = base.get(phase)
+                after = result.get(phase)
+                if before is None or after is None:
+                    continue
+                threshold = thresholds.get(phase, default_threshold)
+                difference = MIN_MEMORY_DIFFERENCE if phase == 'peak_memory' else min_difference
+                if after > before * (1 + threshold) and after - before > difference:
+                    regressions.append((key, phase, before, after))
+        return regressions
+
+
+def parse_thresholds(values) -> tuple:
+    """
+    Parses threshold arguments, either a default fraction (e.g. 0.2) or a
+    phase=fraction pair, returning the default threshold and per phase thresholds
+    """
+    default = 0.2
+    thresholds = {}
+    for value in values or []:
+        if '=' in value:
+            phase, fraction = value.split('=', 1)
+            thresholds[phase.strip()] = float(fraction)
+        else:
+            default = float(value)
+    return default, thresholds
+
+
+def main(argv=None) -> int:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description='Benchmarks DataPlotly plots on synthetic layers')
+    parser.add_argument('--sizes', default='10000,100000', help='comma separated feature counts')
+    parser.add_argument('--providers', default=','.join(PROVIDERS),
+                        help='comma separated providers: {}'.format(', '.join(PROVIDERS)))
+    parser.add_argument('--plot-types', default='', help='comma separated plot types (default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each benchmark')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring the peak memory')
+    parser.add_argument('--serializer-size', type=int, default=1000000,
+                        help='values of the traces of the serializer benchmark (0 to skip it)')
+    parser.add_argument('--columnar-size', type=int, default=5000000,
+                        help='features of the file of the columnar reader benchmark (0 to skip it)')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    parser.add_argument('--compare', help='JSON file of baseline results to compare with')
+    parser.add_argument('--threshold', action='append',
+                        help='allowed slowdown, as a fraction (e.g. 0.2) or per phase (e.g. fetch=0.3)')
+    args = parser.parse_args(argv)
+
+    # imported here, so that the suite can be used from an existing application
+    from DataPlotly.core.batch_renderer import create_application  # pylint: disable=import-outside-toplevel
+    application = create_application()
+    try:
+        suite = BenchmarkSuite(sizes=[int(s) for s in args.sizes.split(',') if s],
+                               providers=[p for p in args.providers.split(',') if p],
+                               plot_types=[t for t in args.plot_types.split(',') if t] or None,
+                               repeat=args.repeat,
+                               measure_memory=not args.no_memory,
+                               serializer_size=args.serializer_size,
+                               columnar_size=args.columnar_size)
+
+        def report(key, result):
+            values = ['{} {:.1f} ms'.format(phase, result[phase] * 1000)
+                      for phase in PHASES if result[phase] is not None]
+            if result['peak_memory'] is not None:
+                values.append('peak memory {:.1f} MB'.format(result['peak_memory'] / (1024 * 1024)))
+            if result['memory_per_feature'] is not None:
+                values.append('{:.0f} bytes/feature'.format(result['memory_per_feature']))
+            print('{}: {}'.format(key, ', '.join(values)))
+
+        results = suite.run(report)
+        if results['serializer']:
+            print('serializer ({} values): plotly {:.1f} ms, DataPlotly {:.1f} ms, {:.1f}x faster'.format(
+                results['serializer']['values'], results['serializer']['plotly'] * 1000,
+                results['serializer']['serializer'] * 1000, results['serializer']['speedup']))
+        if results['columnar']:
+            print('columnar reader ({} features): iterator {:.1f} ms, columnar {:.1f} ms, {:.1f}x faster'.format(
+                results['columnar']['values'], results['columnar']['iterator'] * 1000,
+                results['columnar']['columnar'] * 1000, results['columnar']['speedup']))
+    finally:
+        application.exitQgis()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        default_threshold, thresholds = parse_thresholds(args.threshold)
+        regressions = BenchmarkSuite.compare(baseline, results, thresholds, default_threshold)
+        for key, phase, before, after in regressions:
+            if phase == 'peak_memory':
+                print('REGRESSION {} {}: {:.1f} MB -> {:.1f} MB'.format(
+                    key, phase, before / (1024 * 1024), after / (1024 * 1024)), file=sys.stderr)
+            else:
+                print('REGRESSION {} {}: {:.1f} ms -> {:.1f} ms'.format(key, phase, before * 1000, after * 1000),
+                      file=sys.stderr)
+        if regressions:
+            return 1
+
+    return 0
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Atlas prefetching of plot values
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from collections import OrderedDict
+
+from qgis.core import (
+    QgsProject,
+    QgsGeometry,
+    QgsSpatialIndex,
+    QgsCoordinateTransform,
+    QgsCsException,
+    QgsExpressionContextGenerator
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_factory import PlotFactory, FilterRegion
+
+
+class AtlasPrefetch:
+    """
+    Fetches the values for a plot filtered by atlas features with a single
+    pass over the source layer.
+
+    All the plot values are loaded once, together with the feature geometries
+    which are stored in a spatial index. The values for each atlas page are
+    then served from memory, by partitioning the fetched features against the
+    atlas feature geometry. The most recently used partitions are cached.
+
+    Console usage:
+
+    .. code-block:: python
+        prefetch = AtlasPrefetch(settings)
+        page_settings = prefetch.settings_for_region(atlas_feature.id(), region)
+        factory = PlotFactory(page_settings)
+    """
+
+    # columns of PlotSettings holding one value per plotted feature
+    COLUMNS = ('x', 'y', 'z', 'feature_ids', 'additional_hover_text',
+               'data_defined_marker_sizes', 'data_defined_colors',
+               'data_defined_stroke_colors', 'data_defined_stroke_widths')
+
+    def __init__(self, settings: PlotSettings, context_generator: QgsExpressionContextGenerator = None,
+                 cache_size: int = 64):
+        self.settings = settings
+        self.context_generator = context_generator
+        self.cache_size = cache_size
+        self.factory = None
+        self.index = None
+        self.partitions = OrderedDict()
+
+    @staticmethod
+    def is_supported(settings: PlotSettings) -> bool:
+        """
+        Returns True if the plot values for the specified settings can be prefetched,
+        i.e. if none of the plot expressions depend on the current atlas feature, and
+        the values aren't sampled (samples are drawn from the features of each page)
+        """
+        if settings.properties.get('sample_mode'):
+            return False
+
+        expressions = [settings.properties['x_name'],
+                       settings.properties['y_name'],
+                       settings.properties['z_name'],
+                       settings.layout['additional_info_expression']]
+        for key in PlotSettings.DYNAMIC_PROPERTIES:
+            prop = settings.data_defined_properties.property(key)
+            if prop.isActive():
+                expressions.append(prop.asExpression())
+
+        return not any('@atlas' in e for e in expressions if e)
+
+    def fetch(self):
+        """
+        Fetches all the plot values and geometries from the source layer
+        """
+        settings = copy_settings(self.settings)
+        settings.properties['visible_features_only'] = False
+
+        self.factory = PlotFactory(settings, self.context_generator, collect_geometries=True)
+        # the factory refetches the values whenever the layer is modified
+        self.factory.plot_built.connect(self.build_index)
+        self.build_index()
+
+    def dispose(self):
+        """
+        Stops refetching the values when the source layer is modified
+        """
+        if self.factory is not None:
+            self.factory.dispose()
+
+    def build_index(self):
+        """
+        Builds the spatial index of the fetched feature geometries
+        """
+        self.partitions.clear()
+        self.index = QgsSpatialIndex()
+        for row, geometry in enumerate(self.factory.feature_geometries):
+            if geometry.isNull() or geometry.isEmpty():
+                continue
+            self.index.addFeature(row, geometry.boundingBox())
+
+    def rows_for_region(self, region: FilterRegion) -> list:
+        """
+        Returns the (sorted) rows of the fetched values which intersect the region
+        """
+        if self.factory is None:
+            self.fetch()
+
+        if not self.factory.source_layer:
+            return []
+
+        geometry = QgsGeometry(region.geometry)
+        ct = QgsCoordinateTransform(region.crs(), self.factory.source_layer.crs(),
+                                    QgsProject.instance().transformContext())
+        try:
+            geometry.transform(ct)
+        except QgsCsException:
+            return []
+
+        engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+        engine.prepareGeometry()
+
+        geometries = self.factory.feature_geometries
+        rows = [row for row in self.index.intersects(geometry.boundingBox())
+                if engine.intersects(geometries[row].constGet())]
+        rows.sort()
+        return rows
+
+    def settings_for_region(self, key, region: FilterRegion) -> PlotSettings:
+        """
+        Returns a copy of the plot settings, populated with the values of the
+        features intersecting the region. The key (e.g. the atlas feature id)
+        is used to cache the partition.
+        """
+        rows = self.partitions.get(key)
+        if rows is None:
+            rows = self.rows_for_region(region)
+            self.partitions[key] = rows
+            while len(self.partitions) > self.cache_size:
+                self.partitions.popitem(last=False)
+        else:
+            self.partitions.move_to_end(key)
+
+        settings = copy_settings(self.settings)
+        settings.source_layer_id = None
+        for column in AtlasPrefetch.COLUMNS:
+            values = getattr(self.factory.settings, column)
+            setattr(settings, column, [values[r] for r in rows] if values else [])
+
+        return settings
+
+
+def copy_settings(settings: PlotSettings) -> PlotSettings:
+    """
+    Returns a copy of the plot settings, without any of the fetched values
+    """
+    res = PlotSettings(settings.plot_type, properties=dict(settings.properties), layout=dict(settings.layout),
+                       source_layer_id=settings.source_layer_id)
+    res.data_defined_properties = settings.data_defined_properties
+    return res
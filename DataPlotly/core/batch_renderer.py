@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Headless batch rendering of plot settings files
+
+Renders plot settings XML files (see PlotSettings.write_to_file) without the QGIS
+interface, e.g. from a nightly job:
+
+    python -m DataPlotly.core.batch_renderer --project project.qgz --output plots settings/*.xml
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+from qgis.core import (
+    QgsApplication,
+    QgsExpression,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsField,
+    QgsFields,
+    QgsProject,
+    QgsVectorFileWriter,
+    QgsVectorLayer,
+    QgsWkbTypes
+)
+from qgis.PyQt.QtCore import QVariant
+
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_writer import PlotWriter
+
+# the application of a worker process
+_application = None
+# snapshot path -> layer, for the snapshots loaded by the current process
+_snapshot_layers = {}
+
+
+class BatchRenderer:
+    """
+    Renders a set of plot settings files to HTML, JSON and static images.
+
+    Each distinct source layer is fetched a single time: the attributes (and geometries,
+    if needed) used by all the plots of the layer are written to a temporary snapshot,
+    and the plots are then rendered from the snapshot in a pool of processes.
+
+    Snapshots keep the feature ids and the name of their source layer, so $id, @layer_name
+    and the feature ids of the plots are those of the source. Expressions using other
+    properties of the layer, e.g. @layer_id or its CRS, use those of the snapshot. As the
+    feature ids are stored in the GeoPackage fid column, a source field named fid is
+    replaced by the feature ids.
+
+    Filters on selected or visible features don't apply without a map canvas, so they
+    are ignored.
+    """
+
+    FORMATS = ('html', 'json', 'png', 'svg')
+    # the GeoPackage column of the snapshot feature ids
+    SNAPSHOT_FID = 'fid'
+
+    def __init__(self, output_dir: str, formats=('html',), processes: int = None, width: int = 800,
+                 height: int = 600):  # pylint: disable=too-many-arguments
+        self.output_dir = output_dir
+        self.formats = formats
+        self.processes = processes or os.cpu_count() or 1
+        self.width = width
+        self.height = height
+
+    @staticmethod
+    def used_field_names(layer: QgsVectorLayer, settings_list):
+        """
+        Returns the names of the fields used by the plots of a layer, and whether
+        the plots need geometries
+        """
+        field_names = set()
+        needs_geometry = False
+        for settings in settings_list:
+            texts = [settings.properties['x_name'],
+                     settings.properties['y_name'],
+                     settings.properties['z_name'],
+                     settings.layout['additional_info_expression'],
+                     settings.properties.get('sample_field', '')]
+            for text in texts:
+                if not text:
+                    continue
+                index = layer.fields().lookupField(text)
+                if index >= 0:
+                    field_names.add(layer.fields().at(index).name())
+                    continue
+                expression = QgsExpression(text)
+                field_names.update(expression.referencedColumns())
+                needs_geometry = needs_geometry or expression.needsGeometry()
+
+            field_names.update(settings.data_defined_properties.referencedFields())
+            # data defined properties may use geometries
+            needs_geometry = needs_geometry or settings.data_defined_properties.hasActiveProperties()
+
+        if QgsFeatureRequest.ALL_ATTRIBUTES in field_names:
+            field_names = set(layer.fields().names())
+        return field_names, needs_geometry
+
+    @staticmethod
+    def write_snapshot(layer: QgsVectorLayer, settings_list, path: str) -> bool:
+        """
+        Fetches the attributes and geometries used by the plots of a layer, and writes
+        them to a GeoPackage, with the feature ids of the layer
+        """
+        field_names, needs_geometry = BatchRenderer.used_field_names(layer, settings_list)
+        attributes = [i for i, field in enumerate(layer.fields())
+                      if field.name() in field_names and field.name().lower() != BatchRenderer.SNAPSHOT_FID]
+
+        # a field named like the fid column sets the ids of the written features
+        fields = QgsFields()
+        fields.append(QgsField(BatchRenderer.SNAPSHOT_FID, QVariant.LongLong))
+        for i in attributes:
+            fields.append(layer.fields().at(i))
+
+        writer = QgsVectorFileWriter(path, 'UTF-8', fields,
+                                     layer.wkbType() if needs_geometry else QgsWkbTypes.NoGeometry,
+                                     layer.crs(), 'GPKG', [], ['FID={}'.format(BatchRenderer.SNAPSHOT_FID)])
+        try:
+            if writer.hasError() != QgsVectorFileWriter.NoError:
+                return False
+
+            request = QgsFeatureRequest().setSubsetOfAttributes(attributes)
+            if not needs_geometry:
+                request.setFlags(QgsFeatureRequest.NoGeometry)
+            for f in layer.getFeatures(request):
+                snapshot_feature = QgsFeature(fields)
+                snapshot_feature.setAttributes([f.id()] + [f.attribute(i) for i in attributes])
+                if needs_geometry and f.hasGeometry():
+                    snapshot_feature.setGeometry(f.geometry())
+                if not writer.addFeature(snapshot_feature):
+                    return False
+            return writer.hasError() == QgsVectorFileWriter.NoError
+        finally:
+            # closes the file
+            del writer
+
+    def read_settings(self, settings_files, project_path: str = None, layer_path: str = None):
+        """
+        Reads settings files, and returns a dict of source layer to the list of
+        (settings file, settings) tuples which plot it
+        """
+        layer = None
+        if layer_path:
+            layer = QgsVectorLayer(layer_path, os.path.basename(layer_path), 'ogr')
+            if not layer.isValid():
+                raise ValueError('Invalid layer {}'.format(layer_path))
+        elif project_path and not QgsProject.instance().read(project_path):
+            raise ValueError('Could not read project {}'.format(project_path))
+
+        sources = {}
+        for settings_file in settings_files:
+            settings = PlotSettings()
+            if not settings.read_from_file(settings_file):
+                raise ValueError('Could not read settings {}'.format(settings_file))
+
+            source = layer or QgsProject.instance().mapLayer(settings.source_layer_id)
+            if source is None:
+                raise ValueError('No layer for settings {}'.format(settings_file))
+            sources.setdefault(source, []).append((settings_file, settings))
+
+        return sources
+
+    def run(self, settings_files, project_path: str = None, layer_path: str = None, progress=None) -> list:
+        """
+        Renders settings files, returning a list of (settings file, written paths, error) tuples.
+
+        The layers are read from a project, or a single layer is used for all settings.
+        progress is an optional callback called with each result.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        sources = self.read_settings(settings_files, project_path, layer_path)
+
+        snapshot_dir = tempfile.mkdtemp()
+        try:
+            jobs = []
+            for i, (layer, items) in enumerate(sources.items()):
+                snapshot_path = os.path.join(snapshot_dir, 'source_{}.gpkg'.format(i))
+                if not self.write_snapshot(layer, [settings for _, settings in items], snapshot_path):
+                    raise ValueError('Could not fetch layer {}'.format(layer.name()))
+                jobs.extend((settings_file, snapshot_path, layer.name(), self.output_dir, self.formats, self.width,
+                             self.height) for settings_file, _ in items)
+
+            results = []
+            if self.processes == 1 or len(jobs) == 1:
+                try:
+                    for job in jobs:
+                        results.append(render_job(job))
+                        if progress:
+                            progress(results[-1])
+                finally:
+                    release_snapshots()
+            else:
+                # a fresh interpreter per worker, as QGIS can't be forked once initialized
+                pool_context = multiprocessing.get_context('spawn')
+                with pool_context.Pool(min(self.processes, len(jobs)), initializer=init_worker) as pool:
+                    for result in pool.imap_unordered(render_job, jobs):
+                        results.append(result)
+                        if progress:
+                            progress(result)
+            return results
+        finally:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def create_application() -> QgsApplication:
+    """
+    Creates and initializes a QgsApplication without a display
+    """
+    # static images need fonts, so a GUI application is used with the offscreen platform
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    application = QgsApplication([], True)
+    application.initQgis()
+    return application
+
+
+def init_worker():
+    """
+    Initializes a worker process
+    """
+    global _application  # pylint: disable=global-statement
+    _application = create_application()
+
+
+def release_snapshots():
+    """
+    Removes the snapshot layers loaded by the current process
+    """
+    for layer in _snapshot_layers.values():
+        QgsProject.instance().removeMapLayer(layer.id())
+    _snapshot_layers.clear()
+
+
+def render_job(job):
+    """
+    Renders a settings file from a snapshot of its source layer, returning a
+    (settings file, written paths, error) tuple
+    """
+    settings_file, snapshot_path, layer_name, output_dir, formats, width, height = job
+    try:
+        settings = PlotSettings()
+        if not settings.read_from_file(settings_file):
+            return settings_file, [], 'Could not read settings'
+
+        layer = _snapshot_layers.get(snapshot_path)
+        if layer is None:
+            layer = QgsVectorLayer(snapshot_path, layer_name, 'ogr')
+            QgsProject.instance().addMapLayer(layer, False)
+            _snapshot_layers[snapshot_path] = layer
+
+        settings.source_layer_id = layer.id()
+        settings.properties['selected_features_only'] = False
+        settings.properties['visible_features_only'] = False
+        factory = PlotFactory(settings)
+        # the plot is only written once, it does not follow changes of the snapshot layer
+        factory.dispose()
+
+        paths = []
+        base_path = os.path.join(output_dir, os.path.splitext(os.path.basename(settings_file))[0])
+        for output_format in formats:
+            path = '{}.{}'.format(base_path, output_format)
+            if output_format == 'html':
+                PlotWriter.write_html(factory, path)
+            elif output_format == 'json':
+                PlotWriter.write_json(factory, path)
+            elif not PlotWriter.supports_image(settings.plot_type) or \
+                    not PlotWriter.write_image(factory, path, width, height):
+                continue
+            paths.append(path)
+
+        return settings_file, paths, None
+    except Exception as e:  # pylint: disable=broad-except
+        return settings_file, [], str(e)
+
+
+def main(argv=None) -> int:
+    """
+    Command line entry point
+    """
+    parser = argparse.ArgumentParser(description='Renders DataPlotly settings files without the QGIS interface')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--project', help='QGIS project containing the source layers of the plots')
+    source.add_argument('--layer', help='layer used as the source of all plots')
+    parser.add_argument('--output', required=True, help='output folder')
+    parser.add_argument('--formats', default='html',
+                        help='comma separated output formats: {}'.format(', '.join(BatchRenderer.FORMATS)))
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--width', type=int, default=800, help='static image width, in pixels')
+    parser.add_argument('--height', type=int, default=600, help='static image height, in pixels')
+    parser.add_argument('settings', nargs='+', help='plot settings XML files')
+    args = parser.parse_args(argv)
+
+    formats = [f.strip().lower() for f in args.formats.split(',') if f.strip()]
+    unknown = [f for f in formats if f not in BatchRenderer.FORMATS]
+    if unknown:
+        parser.error('unknown formats: {}'.format(', '.join(unknown)))
+
+    application = create_application()
+    failed = 0
+    try:
+        def report(result):
+            nonlocal failed
+            settings_file, paths, error = result
+            if error:
+                failed += 1
+                print('{}: {}'.format(settings_file, error), file=sys.stderr)
+            else:
+                print('{}: {}'.format(settings_file, ', '.join(paths)))
+
+        renderer = BatchRenderer(args.output, formats, args.processes, args.width, args.height)
+        renderer.run(args.settings, project_path=args.project, layer_path=args.layer, progress=report)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        QgsProject.instance().clear()
+        application.exitQgis()
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
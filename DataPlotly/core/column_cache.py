@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of layer columns
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import glob
+import hashlib
+import os
+import shutil
+
+from qgis.core import (
+    QgsApplication,
+    QgsSettings,
+    QgsVectorLayer
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class ColumnCache:
+    """
+    Persistent cache of numeric plot columns, stored as .npy files in the profile folder.
+
+    Cached columns are memory mapped when loaded, so reopening a project maps the
+    values of large layers instead of rescanning the source. Entries are keyed by the
+    layer source, subset string, fields and the modification time and size of the
+    source files, so changing the data on disk invalidates them. Storing an entry
+    removes the entries of previous versions of the same data, and the least recently
+    used entries are removed when the cache exceeds its maximum size.
+
+    Only file based layers without pending edits can be cached. The cache is opt-in,
+    enabled with the 'dataplotly/column_cache' setting, and requires numpy. Its maximum
+    size (in MB) is set with the 'dataplotly/column_cache_size' setting.
+    """
+
+    DEFAULT_MAX_SIZE = 512
+
+    def __init__(self, directory: str = None, max_size: int = None):
+        if directory is None:
+            directory = os.path.join(QgsApplication.qgisSettingsDirPath(), 'dataplotly', 'column_cache')
+        self.directory = directory
+        if max_size is None:
+            max_size = QgsSettings().value('dataplotly/column_cache_size', ColumnCache.DEFAULT_MAX_SIZE, int) * 1024 ** 2
+        # in bytes
+        self.max_size = max_size
+
+    @staticmethod
+    def is_enabled() -> bool:
+        """
+        Returns True if the column cache is enabled and available
+        """
+        return numpy is not None and QgsSettings().value('dataplotly/column_cache', False, bool)
+
+    @staticmethod
+    def source_stamp(layer: QgsVectorLayer):
+        """
+        Returns a stamp of the modification times and sizes of the files of a layer
+        source, or None if the layer isn't file based
+        """
+        if layer.providerType() != 'ogr':
+            return None
+
+        path = layer.source().split('|')[0]
+        if not os.path.isfile(path):
+            return None
+
+        # e.g. a shapefile's .dbf changes when only attributes are edited
+        stamp = []
+        for file in sorted(glob.glob(glob.escape(os.path.splitext(path)[0]) + '.*')):
+            stat = os.stat(file)
+            stamp.append((os.path.basename(file), stat.st_mtime_ns, stat.st_size))
+        return stamp
+
+    def entry_path(self, layer: QgsVectorLayer, fields: dict):
+        """
+        Returns the folder of the cache entry for fields (a dict of axis to field name)
+        of a layer, or None if the layer can't be cached
+        """
+        if layer.isModified():
+            return None
+
+        stamp = self.source_stamp(layer)
+        if stamp is None:
+            return None
+
+        # entries of the same data share a prefix, so that those of previous versions can be removed
+        key = repr((layer.source(),
+                    layer.subsetString(),
+                    [(f.name(), f.typeName()) for f in layer.fields()],
+                    sorted(fields.items())))
+        return os.path.join(self.directory, '{}-{}'.format(hashlib.sha1(key.encode('utf-8')).hexdigest(),
+                                                           hashlib.sha1(repr(stamp).encode('utf-8')).hexdigest()))
+
+    def load(self, layer: QgsVectorLayer, fields: dict):
+        """
+        Returns the cached feature ids and columns (a dict of axis to memory mapped array)
+        for fields of a layer, or None if they aren't cached
+
+        Unlike the columns, the feature ids are loaded as a list: they are passed one by one
+        to the QGIS API (e.g. to select or identify features) which requires Python integers,
+        and converting them once is cheaper than converting them on each use.
+        """
+        path = self.entry_path(layer, fields)
+        if path is None or not os.path.isdir(path):
+            return None
+
+        try:
+            # the modification time of entries records their last use, see evict()
+            os.utime(path)
+            feature_ids = numpy.load(os.path.join(path, 'fid.npy')).tolist()
+            columns = {axis: numpy.load(os.path.join(path, '{}.npy'.format(axis)), mmap_mode='r')
+                       for axis in fields}
+        except (OSError, ValueError):
+            return None
+
+        return feature_ids, columns
+
+    def store(self, layer: QgsVectorLayer, fields: dict, feature_ids: list, columns: dict):
+        """
+        Stores the feature ids and columns (a dict of axis to values) for fields of a layer
+        """
+        path = self.entry_path(layer, fields)
+        if path is None:
+            return
+
+        arrays = {axis: numpy.asarray(columns[axis]) for axis in fields}
+        if any(array.dtype.kind not in 'iuf' for array in arrays.values()):
+            # only numeric columns can be memory mapped
+            return
+
+        # write to a temporary folder first, so that readers never see partial entries
+        temp_path = path + '.tmp'
+        try:
+            os.makedirs(temp_path, exist_ok=True)
+            numpy.save(os.path.join(temp_path, 'fid.npy'), numpy.asarray(feature_ids, dtype=numpy.int64))
+            for axis, array in arrays.items():
+                numpy.save(os.path.join(temp_path, '{}.npy'.format(axis)), array)
+            shutil.rmtree(path, ignore_errors=True)
+            os.replace(temp_path, path)
+        except OSError:
+            shutil.rmtree(temp_path, ignore_errors=True)
+            return
+
+        # entries of previous versions of the data are never loaded again
+        prefix = os.path.basename(path).split('-')[0]
+        for entry in self.entries():
+            if entry != path and os.path.basename(entry).startswith(prefix + '-'):
+                shutil.rmtree(entry, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> list:
+        """
+        Returns the folders of all complete cache entries
+        """
+        return [path for path in glob.glob(os.path.join(glob.escape(self.directory), '*-*'))
+                if os.path.isdir(path) and not path.endswith('.tmp')]
+
+    @staticmethod
+    def entry_size(path: str) -> int:
+        """
+        Returns the size in bytes of the files of a cache entry
+        """
+        size = 0
+        for file in os.listdir(path):
+            try:
+                size += os.path.getsize(os.path.join(path, file))
+            except OSError:
+                pass
+        return size
+
+    def evict(self):
+        """
+        Removes the least recently used entries, until the cache doesn't exceed its maximum size
+        """
+        entries = []
+        for path in self.entries():
+            try:
+                entries.append((os.path.getmtime(path), path, self.entry_size(path)))
+            except OSError:
+                # removed meanwhile
+                pass
+
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries):
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        Removes all cached columns
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
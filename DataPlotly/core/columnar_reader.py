@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar reading of file based layers
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import os
+
+from qgis.PyQt.QtCore import QVariant
+from qgis.core import (
+    QgsProviderRegistry,
+    QgsSettings,
+    QgsVectorLayer
+)
+
+try:
+    import numpy
+    from osgeo import ogr
+except ImportError:
+    numpy = None
+    ogr = None
+
+
+class ColumnarReader:
+    """
+    Reads the columns of plain fields directly from columnar files (GeoParquet, Arrow IPC
+    and FlatGeobuf), through GDAL's Arrow stream interface.
+
+    This skips building a QgsFeature for every feature. Values are returned as lists of
+    the same Python types as the feature iterator, with features having a NULL value
+    in any of the required fields removed. It requires GDAL 3.6 or later, and can
+    be disabled with the 'dataplotly/columnar_reader' setting.
+    """
+
+    EXTENSIONS = ('.parquet', '.geoparquet', '.arrow', '.arrows', '.feather', '.ipc', '.fgb')
+
+    FIELD_TYPES = (QVariant.Int, QVariant.UInt, QVariant.LongLong, QVariant.ULongLong, QVariant.Double,
+                   QVariant.String)
+
+    def __init__(self, layer: QgsVectorLayer):
+        self.layer = layer
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Returns True if columnar reading is available and enabled
+        """
+        return ogr is not None and hasattr(ogr.Layer, 'GetArrowStreamAsNumPy') and \
+            QgsSettings().value('dataplotly/columnar_reader', True, bool)
+
+    def is_supported(self, field_names) -> bool:
+        """
+        Returns True if the specified fields of the layer can be read as columns
+        """
+        if not ColumnarReader.is_available() or self.layer.providerType() != 'ogr' or self.layer.isModified():
+            return False
+
+        path = QgsProviderRegistry.instance().decodeUri('ogr', self.layer.source()).get('path', '')
+        if os.path.splitext(path)[1].lower() not in ColumnarReader.EXTENSIONS:
+            return False
+
+        if self.layer.subsetString().strip().lower().startswith('select'):
+            # OGR SQL subset, not a plain filter
+            return False
+
+        fields = self.layer.fields()
+        for name in field_names:
+            index = fields.lookupField(name)
+            if index < 0 or fields.at(index).type() not in ColumnarReader.FIELD_TYPES:
+                return False
+        return True
+
+    def read(self, field_names, required_field_names):
+        """
+        Reads the feature ids and the values of the specified fields.
+
+        Returns a tuple of a list of feature ids and a dict of field name to value list,
+        or None if the layer can't be read. Features with NULL values in any of the
+        required fields are skipped.
+        """
+        parts = QgsProviderRegistry.instance().decodeUri('ogr', self.layer.source())
+        dataset = ogr.Open(parts['path'])
+        if dataset is None:
+            return None
+
+        if parts.get('layerName'):
+            ogr_layer = dataset.GetLayerByName(parts['layerName'])
+        else:
+            ogr_layer = dataset.GetLayer(parts.get('layerId') or 0)
+        if ogr_layer is None:
+            return None
+
+        layer_definition = ogr_layer.GetLayerDefn()
+        all_fields = [layer_definition.GetFieldDefn(i).GetName() for i in range(layer_definition.GetFieldCount())]
+        # QGIS field lookups are case insensitive
+        names = {name: next((f for f in all_fields if f.lower() == name.lower()), None) for name in field_names}
+        if None in names.values():
+            return None
+
+        ogr_layer.SetIgnoredFields([f for f in all_fields if f not in names.values()] + ['OGR_GEOMETRY', 'OGR_STYLE'])
+        if self.layer.subsetString() and ogr_layer.SetAttributeFilter(self.layer.subsetString()) != 0:
+            return None
+
+        fid_column = ogr_layer.GetFIDColumn() or 'OGC_FID'
+        feature_ids = []
+        columns = {name: [] for name in field_names}
+        for batch in ogr_layer.GetArrowStreamAsNumPy(options=['INCLUDE_FID=YES', 'USE_MASKED_ARRAYS=YES']):
+            valid = numpy.ones(len(batch[fid_column]), dtype=bool)
+            for name in required_field_names:
+                valid &= ColumnarReader.valid_values(batch[names[name]])
+
+            feature_ids.extend(batch[fid_column][valid].tolist())
+            for name in field_names:
+                columns[name].extend(ColumnarReader.to_list(batch[names[name]], valid))
+
+        return feature_ids, columns
+
+    @staticmethod
+    def valid_values(array):
+        """
+        Returns a boolean array of the non NULL values of a column
+        """
+        if numpy.ma.isMaskedArray(array):
+            return ~numpy.ma.getmaskarray(array)
+        if array.dtype == object:
+            return numpy.array([v is not None for v in array], dtype=bool)
+        return numpy.ones(len(array), dtype=bool)
+
+    @staticmethod
+    def to_list(array, valid) -> list:
+        """
+        Converts the valid values of a column to a list of Python values
+        """
+        # masked values (NULLs in optional fields) become None
+        values = array[valid].tolist()
+        return [v.decode('utf-8') if isinstance(v, bytes) else v for v in values] \
+            if array.dtype == object else values
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Cache of parsed layer expressions
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from qgis.core import (
+    QgsExpression,
+    QgsExpressionContext,
+    QgsVectorLayer
+)
+
+
+class CachedExpression:  # pylint: disable=too-few-public-methods
+    """
+    A parsed field or expression, with the details needed to build a feature request
+    """
+
+    def __init__(self, layer: QgsVectorLayer, field_or_expression: str):
+        self.field_index = layer.fields().lookupField(field_or_expression)
+        if self.field_index == -1:
+            self.expression = QgsExpression(field_or_expression)
+            self.needs_geometry = self.expression.needsGeometry()
+            self.referenced_columns = self.expression.referencedColumns()
+        else:
+            self.expression = None
+            self.needs_geometry = False
+            self.referenced_columns = {field_or_expression}
+
+
+class ExpressionCache:
+    """
+    Caches parsed fields and expressions for each layer, so that rebuilding plots
+    (e.g. for each atlas page or map extent change) doesn't parse them again.
+
+    The cache of a layer is cleared whenever the layer fields change.
+    """
+
+    # layer id -> {field or expression: CachedExpression}
+    _caches = {}
+    # ids of the layers whose changes are connected to invalidate
+    _connected_layers = set()
+
+    @staticmethod
+    def invalidate(layer_id: str):
+        """
+        Discards the cached expressions for a layer
+        """
+        ExpressionCache._caches.pop(layer_id, None)
+
+    @staticmethod
+    def layer_deleted(layer_id: str):
+        """
+        Discards the cached expressions for a deleted layer, and forgets the layer
+        """
+        ExpressionCache.invalidate(layer_id)
+        ExpressionCache._connected_layers.discard(layer_id)
+
+    @staticmethod
+    def cached_expression(layer: QgsVectorLayer, field_or_expression: str) -> CachedExpression:
+        """
+        Returns the cached details for a field or expression of a layer
+        """
+        layer_id = layer.id()
+        cache = ExpressionCache._caches.get(layer_id)
+        if cache is None:
+            cache = {}
+            ExpressionCache._caches[layer_id] = cache
+
+        # the signals of a layer are only connected once, whatever the number of invalidations
+        if layer_id not in ExpressionCache._connected_layers:
+            ExpressionCache._connected_layers.add(layer_id)
+            layer.updatedFields.connect(lambda: ExpressionCache.invalidate(layer_id))
+            layer.willBeDeleted.connect(lambda: ExpressionCache.layer_deleted(layer_id))
+
+        cached = cache.get(field_or_expression)
+        if cached is None:
+            cached = CachedExpression(layer, field_or_expression)
+            cache[field_or_expression] = cached
+        return cached
+
+    @staticmethod
+    def field_or_expression(layer: QgsVectorLayer, field_or_expression: str, context: QgsExpressionContext):
+        """
+        Returns a tuple of a prepared expression (or None for plain fields), whether
+        the geometry is needed, the referenced columns and the field index (or -1
+        for expressions).
+
+        Returned expressions are copies of the cached expression, prepared for the
+        specified context, so they are safe to use for a single fetch.
+        """
+        cached = ExpressionCache.cached_expression(layer, field_or_expression)
+        if cached.expression is None:
+            return None, False, cached.referenced_columns, cached.field_index
+
+        expression = QgsExpression(cached.expression)
+        if not expression.hasParserError():
+            expression.prepare(context)
+        return expression, cached.needs_geometry, cached.referenced_columns, -1
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+"""
+JSON serialization of plotly figures
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import datetime
+import decimal
+import io
+import json
+import math
+
+from qgis.PyQt.QtCore import (
+    QDate,
+    QDateTime,
+    QTime,
+    QVariant
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class FigureSerializer:
+    """
+    Writes plotly figures, traces and layouts as JSON to a file like object (anything
+    with a write method accepting strings, e.g. a text file, io.StringIO or a
+    socket's makefile('w')).
+
+    The output is equivalent to plotly's PlotlyJSONEncoder, but much faster for large
+    traces:
+
+    - arrays are encoded by the C JSON encoder in chunks of CHUNK_SIZE values, instead
+      of the encoder calling back into Python for every value, and without encoding
+      and decoding the whole figure a second time to replace NaN values
+    - numpy arrays are encoded by dtype: values of numeric arrays are only converted to
+      Python objects one chunk at a time, and NaN values are found with numpy
+    - plotly objects are serialized from their properties, without the deep copy of
+      to_plotly_json()
+    - dates (Python, Qt and numpy), QVariant and NULL values are supported
+
+    NaN and infinite values are written as null, like plotly does.
+    """
+
+    CHUNK_SIZE = 65536
+
+    ENCODER = json.JSONEncoder(allow_nan=False, separators=(',', ':'))
+
+    def __init__(self, fp):
+        self.fp = fp
+        # number of characters written
+        self.written = 0
+
+    @staticmethod
+    def dumps(value) -> str:
+        """
+        Returns the JSON of a value
+        """
+        buffer = io.StringIO()
+        FigureSerializer(buffer).dump(value)
+        return buffer.getvalue()
+
+    def write(self, text: str):
+        """
+        Writes raw text
+        """
+        self.fp.write(text)
+        self.written += len(text)
+
+    def dump(self, value):
+        """
+        Writes the JSON of a value
+        """
+        value = FigureSerializer.to_json_value(value)
+        if isinstance(value, dict):
+            self.write('{')
+            for i, (key, item) in enumerate(value.items()):
+                if i:
+                    self.write(',')
+                self.write(FigureSerializer.ENCODER.encode(str(key)))
+                self.write(':')
+                self.dump(item)
+            self.write('}')
+        elif numpy is not None and isinstance(value, numpy.ndarray):
+            self.dump_array(value)
+        elif isinstance(value, (list, tuple)):
+            self.dump_sequence(value)
+        elif isinstance(value, float) and not math.isfinite(value):
+            self.write('null')
+        else:
+            self.write(FigureSerializer.ENCODER.encode(value))
+
+    def dump_sequence(self, values):
+        """
+        Writes the JSON array of a list or tuple
+        """
+        self.write('[')
+        for start in range(0, len(values), self.CHUNK_SIZE):
+            chunk = values[start:start + self.CHUNK_SIZE]
+            if start:
+                self.write(',')
+            try:
+                # fast path: plain strings and numbers
+                self.write(FigureSerializer.ENCODER.encode(chunk)[1:-1])
+                continue
+            except (TypeError, ValueError):
+                pass
+            try:
+                # NaN values, dates, QVariant...
+                self.write(FigureSerializer.ENCODER.encode([FigureSerializer.to_json_scalar(value)
+                                                            for value in chunk])[1:-1])
+            except (TypeError, ValueError):
+                # nested objects and arrays
+                for i, value in enumerate(chunk):
+                    if i:
+                        self.write(',')
+                    self.dump(value)
+        self.write(']')
+
+    def dump_array(self, array):
+        """
+        Writes the JSON array of a numpy array
+        """
+        if array.ndim > 1:
+            self.write('[')
+            for i, row in enumerate(array):
+                if i:
+                    self.write(',')
+                self.dump_array(row)
+            self.write(']')
+            return
+
+        kind = array.dtype.kind
+        if kind not in 'biufM':
+            # strings and objects
+            self.dump_sequence(array.tolist())
+            return
+
+        self.write('[')
+        for start in range(0, len(array), self.CHUNK_SIZE):
+            chunk = array[start:start + self.CHUNK_SIZE]
+            if kind == 'f':
+                finite = numpy.isfinite(chunk)
+                if finite.all():
+                    values = chunk.tolist()
+                else:
+                    values = chunk.astype(object)
+                    values[~finite] = None
+                    values = values.tolist()
+            elif kind == 'M':
+                values = numpy.char.replace(numpy.datetime_as_string(chunk), 'T', ' ').astype(object)
+                values[numpy.isnat(chunk)] = None
+                values = values.tolist()
+            else:
+                values = chunk.tolist()
+            if start:
+                self.write(',')
+            self.write(FigureSerializer.ENCODER.encode(values)[1:-1])
+        self.write(']')
+
+    @staticmethod
+    def date_string(iso_string: str) -> str:
+        """
+        Converts an ISO date string to the format plotly uses, without UTC offset and
+        with a space between the date and time
+        """
+        iso_string = iso_string.replace('-00:00', '').replace('+00:00', '')
+        if iso_string.endswith('T00:00:00'):
+            return iso_string[:-len('T00:00:00')]
+        return iso_string.replace('T', ' ')
+
+    @staticmethod
+    def to_json_scalar(value):
+        """
+        Converts a value like to_json_value, and NaN and infinite values to None
+        """
+        value = FigureSerializer.to_json_value(value)
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+        return value
+
+    @staticmethod
+    def to_json_value(value):  # pylint: disable=too-many-return-statements
+        """
+        Converts a value to a type which can be written as JSON, i.e. a plain Python
+        scalar, list, tuple, dict or numpy array
+        """
+        if value is None or isinstance(value, (str, bool, int, float, dict, list, tuple)):
+            return value
+        if numpy is not None:
+            if isinstance(value, numpy.ndarray):
+                return value
+            if isinstance(value, numpy.generic):
+                if isinstance(value, numpy.datetime64):
+                    return None if numpy.isnat(value) else FigureSerializer.date_string(str(value))
+                return value.item()
+        if isinstance(value, QVariant):
+            return None if value.isNull() else FigureSerializer.to_json_value(value.value())
+        if isinstance(value, QDateTime):
+            return FigureSerializer.date_string(value.toPyDateTime().isoformat()) if value.isValid() else None
+        if isinstance(value, QDate):
+            return value.toPyDate().isoformat() if value.isValid() else None
+        if isinstance(value, QTime):
+            return value.toPyTime().isoformat() if value.isValid() else None
+        if isinstance(value, (datetime.date, datetime.time)):
+            return FigureSerializer.date_string(value.isoformat())
+        if isinstance(value, decimal.Decimal):
+            return float(value)
+        if hasattr(value, 'to_plotly_json'):
+            # plotly objects: use their properties directly, as to_plotly_json() deep copies them
+            props = getattr(value, '_props', None)
+            return props if isinstance(props, dict) else value.to_plotly_json()
+        raise TypeError('Object of type {} is not JSON serializable'.format(type(value).__name__))
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+On demand evaluation of hover text
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from collections import OrderedDict
+
+from qgis.core import (
+    NULL,
+    QgsExpressionContext,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsVectorLayer
+)
+
+from DataPlotly.core.expression_cache import ExpressionCache
+
+
+class HoverTextProvider:
+    """
+    Evaluates the hover text field or expression of a plot for single features, when
+    they are hovered in the plot view, instead of evaluating it for every plotted
+    feature and embedding the texts in the plot.
+
+    The expression is prepared and the feature request is built a single time, and
+    the texts of the most recently hovered features are cached.
+    """
+
+    CACHE_SIZE = 1000
+
+    def __init__(self, layer: QgsVectorLayer, field_or_expression: str, context: QgsExpressionContext):
+        self.layer = layer
+        self.context = QgsExpressionContext(context)
+        self.expression, needs_geometry, attrs, self.field_index = ExpressionCache.field_or_expression(
+            layer, field_or_expression, self.context)
+
+        self.request = QgsFeatureRequest()
+        self.request.setSubsetOfAttributes(attrs, layer.fields())
+        if not needs_geometry:
+            self.request.setFlags(QgsFeatureRequest.NoGeometry)
+
+        # feature id -> text, in least recently used order
+        self.texts = OrderedDict()
+
+    def text(self, feature_id: int) -> str:
+        """
+        Returns the hover text of a feature, or None if the feature doesn't exist
+        """
+        if feature_id in self.texts:
+            self.texts.move_to_end(feature_id)
+            return self.texts[feature_id]
+
+        self.request.setFilterFid(feature_id)
+        feature = QgsFeature()
+        if not self.layer.getFeatures(self.request).nextFeature(feature):
+            return None
+
+        if self.expression is not None:
+            self.context.setFeature(feature)
+            value = self.expression.evaluate(self.context)
+        else:
+            value = feature.attributes()[self.field_index]
+        text = '' if value is None or value == NULL else str(value)
+
+        self.texts[feature_id] = text
+        if len(self.texts) > self.CACHE_SIZE:
+            self.texts.popitem(last=False)
+        return text
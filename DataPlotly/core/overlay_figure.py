@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Overlaid plots
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import io
+from collections import OrderedDict
+
+from DataPlotly.core.figure_serializer import FigureSerializer
+
+
+class OverlayFigure:
+    """
+    Composes the plots of several factories overlaid in a single figure.
+
+    The figure keeps a registry of the trace shown for each factory id, so that once
+    the figure is displayed, it can be updated to the current traces of the factories
+    by sending only the traces which were added or rebuilt to the page (see
+    update_script), instead of building and loading the html of the whole figure again.
+
+    Subclasses (see SubplotGrid) can place the traces in the figure, and build its layout.
+    """
+
+    CONFIG = {'scrollZoom': True, 'editable': True}
+
+    def __init__(self):
+        # factory id -> (trace, placement) of the traces shown in the figure, in order
+        self.traces = OrderedDict()
+
+    def clear(self):
+        """
+        Clears the registry, e.g. when the figure is not shown anymore
+        """
+        self.traces = OrderedDict()
+
+    def placement(self, index: int, trace) -> dict:  # pylint: disable=unused-argument,no-self-use
+        """
+        Returns the properties to set on the trace of the index-th plot of the figure,
+        e.g. the axes or domain of its subplot
+        """
+        return {}
+
+    def figure_layout(self, factories) -> dict:
+        """
+        Returns the layout of the figure showing the plots of factories (a dict of
+        factory id to factory)
+        """
+        return self.merged_layout(factories)
+
+    @staticmethod
+    def merged_layout(factories) -> dict:
+        """
+        Returns the layout of the figure overlaying the plots of factories (a dict of
+        factory id to factory)
+
+        The layouts of all plots are merged, with the settings of the last plot (e.g.
+        titles, axes or bar mode) taking precedence, while settings only defined by
+        other plot types (e.g. ternary or polar axes) are kept.
+        """
+        layout = {}
+        for factory in factories.values():
+            layout.update(FigureSerializer.to_json_value(factory.layout))
+        return layout
+
+    @staticmethod
+    def hover_on_demand(factories) -> bool:
+        """
+        Returns True if the hover text of any of the plots of factories is evaluated
+        on demand, in which case the figure must show it (see PlotFactory.hover_text_script)
+        """
+        return any(factory.hover_on_demand for factory in factories.values())
+
+    @staticmethod
+    def placed_trace(trace, placement: dict):
+        """
+        Returns a trace with placement properties, without modifying the trace
+        """
+        if not placement:
+            return trace
+        return dict(FigureSerializer.to_json_value(trace), **placement)
+
+    def register(self, factories) -> OrderedDict:
+        """
+        Sets the registry to the traces of factories, returning the previous registry
+        """
+        previous = self.traces
+        self.traces = OrderedDict()
+        for i, (pid, factory) in enumerate(factories.items()):
+            trace = factory.trace[0]
+            self.traces[pid] = (trace, self.placement(i, trace))
+        return previous
+
+    def build(self, factories) -> str:
+        """
+        Builds the html of the figure showing the plots of factories (a dict of
+        factory id to factory), and returns its path
+        """
+        self.register(factories)
+        last_factory = list(factories.values())[-1]
+        return last_factory.build_figures(ptrace=[self.placed_trace(trace, placement) for trace, placement in self.traces.values()],
+                                          layout=self.figure_layout(factories),
+                                          hover_on_demand=self.hover_on_demand(factories))
+
+    def update_script(self, factories) -> str:
+        """
+        Returns the JavaScript updating the displayed figure to the plots of factories
+        (a dict of factory id to factory)
+
+        Traces of removed factories are deleted, and the traces of new, rebuilt or
+        moved factories are added or replaced, without sending the unchanged traces
+        again. The page applies the update with Plotly.react, which redraws the figure
+        once. If an added plot evaluates its hover text on demand, the script showing
+        it is installed first.
+        """
+        previous = self.register(factories)
+        indices = {pid: i for i, pid in enumerate(previous)}
+
+        buffer = io.StringIO()
+        serializer = FigureSerializer(buffer)
+        if self.hover_on_demand(factories):
+            factory = next(factory for factory in factories.values() if factory.hover_on_demand)
+            serializer.write(factory.hover_text_script("document.querySelector('.plotly-graph-div')"))
+        serializer.write('dataplotlyUpdateFigure([')
+        for i, (pid, (trace, placement)) in enumerate(self.traces.items()):
+            if i:
+                serializer.write(',')
+            if pid in indices and previous[pid][0] is trace and previous[pid][1] == placement:
+                # unchanged: the page reuses the trace it shows
+                serializer.write(str(indices[pid]))
+            else:
+                serializer.dump(self.placed_trace(trace, placement))
+        serializer.write('], ')
+        serializer.dump(self.figure_layout(factories))
+        serializer.write(', ')
+        serializer.dump(dict(self.CONFIG, showLink=False))
+        serializer.write(');')
+        return buffer.getvalue()
@@ -8,16 +8,13 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 """
 
+import io
 import tempfile
 import os
-import re
-import plotly
-import plotly.graph_objs as go
-from plotly import tools
+import uuid
 
 from qgis.core import (
     QgsProject,
-    QgsExpression,
     QgsExpressionContext,
     QgsExpressionContextUtils,
     QgsFeatureRequest,
@@ -27,7 +24,8 @@ from qgis.core import (
     QgsExpressionContextGenerator,
     QgsReferencedGeometryBase,
     QgsGeometry,
-    QgsCsException
+    QgsCsException,
+    QgsSymbolLayerUtils
 )
 from qgis.PyQt.QtCore import (
     QUrl,
@@ -36,6 +34,15 @@ from qgis.PyQt.QtCore import (
 )
 from qgis.PyQt.QtGui import QColor
 from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.expression_cache import ExpressionCache
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.core.hover_text import HoverTextProvider
+from DataPlotly.core.sampling import FeatureSampler
+from DataPlotly.core.column_cache import ColumnCache
+from DataPlotly.core.columnar_reader import ColumnarReader
+from DataPlotly.core.plot_stats import PlotStats
+from DataPlotly.core.spatial_filter import SpatialFilter
+from DataPlotly.core.subplot_grid import SubplotGrid
 from DataPlotly.core.plot_types.plot_type import PlotType
 from DataPlotly.core.plot_types import *  # pylint: disable=W0401,W0614
 
@@ -50,6 +57,87 @@ class FilterRegion(QgsReferencedGeometryBase):  # pylint: disable=too-few-public
         self.geometry = geometry
 
 
+class DataDefinedValues:
+    """
+    Collects the values of the active data defined properties of plot settings.
+
+    The active properties are resolved a single time, and decoded colors are
+    memoised so that repeated color values are only converted once.
+    """
+
+    def __init__(self, settings: PlotSettings, context: QgsExpressionContext):
+        self.context = context
+
+        def active_property(key):
+            if not settings.data_defined_properties.isActive(key):
+                return None
+            prop = settings.data_defined_properties.property(key)
+            prop.prepare(context)
+            return prop
+
+        self.marker_size_property = active_property(PlotSettings.PROPERTY_MARKER_SIZE)
+        self.stroke_width_property = active_property(PlotSettings.PROPERTY_STROKE_WIDTH)
+        self.color_property = active_property(PlotSettings.PROPERTY_COLOR)
+        self.stroke_color_property = active_property(PlotSettings.PROPERTY_STROKE_COLOR)
+
+        self.default_marker_size = settings.properties['marker_size']
+        self.default_stroke_width = settings.properties['marker_width']
+        self.default_color = QColor(settings.properties['in_color'])
+        self.default_stroke_color = QColor(settings.properties['out_color'])
+
+        # evaluated value -> color name
+        self.color_names = {}
+
+        self.marker_sizes = []
+        self.stroke_widths = []
+        self.colors = []
+        self.stroke_colors = []
+
+    def columns(self) -> list:
+        """
+        Returns the lists of values collected for the active properties
+        """
+        return [values for values, prop in ((self.marker_sizes, self.marker_size_property),
+                                            (self.stroke_widths, self.stroke_width_property),
+                                            (self.colors, self.color_property),
+                                            (self.stroke_colors, self.stroke_color_property)) if prop is not None]
+
+    def collect(self):
+        """
+        Evaluates the active properties for the feature set in the expression context
+        """
+        if self.marker_size_property:
+            self.context.setOriginalValueVariable(self.default_marker_size)
+            value, _ = self.marker_size_property.valueAsDouble(self.context, self.default_marker_size)
+            self.marker_sizes.append(value)
+        if self.stroke_width_property:
+            self.context.setOriginalValueVariable(self.default_stroke_width)
+            value, _ = self.stroke_width_property.valueAsDouble(self.context, self.default_stroke_width)
+            self.stroke_widths.append(value)
+        if self.color_property:
+            self.colors.append(self.color_name(self.color_property, self.default_color))
+        if self.stroke_color_property:
+            self.stroke_colors.append(self.color_name(self.stroke_color_property, self.default_stroke_color))
+
+    def color_name(self, prop, default_color: QColor) -> str:
+        """
+        Evaluates a color property and returns the color name
+        """
+        value, ok = prop.value(self.context, default_color)
+        if not ok or value is None or value == NULL:
+            return default_color.name()
+        if isinstance(value, QColor):
+            return value.name() if value.isValid() else default_color.name()
+
+        key = str(value)
+        name = self.color_names.get(key)
+        if name is None:
+            color = QgsSymbolLayerUtils.decodeColor(key)
+            name = color.name() if color.isValid() else default_color.name()
+            self.color_names[key] = name
+        return name
+
+
 class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
     """
     Plot factory which creates Plotly Plot objects
@@ -80,75 +168,173 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
 
     plot_built = pyqtSignal()
 
-    def __init__(self, settings: PlotSettings = None, context_generator: QgsExpressionContextGenerator = None,
-                 visible_region: QgsReferencedRectangle = None, polygon_filter: FilterRegion = None):
+    def __init__(self, settings: PlotSettings = None, context_generator: QgsExpressionContextGenerator = None,  # pylint: disable=too-many-arguments
+                 visible_region: QgsReferencedRectangle = None, polygon_filter: FilterRegion = None,
+                 collect_geometries: bool = False, build: bool = True, hover_on_demand: bool = False):
         super().__init__()
         if settings is None:
             settings = PlotSettings('scatter')
 
         self.settings = settings
         self.context_generator = context_generator
-        self.raw_plot = None
         self.plot_path = None
         self.selected_features_only = self.settings.properties['selected_features_only']
         self.visible_features_only = self.settings.properties.get('visible_features_only', False)
         self.visible_region = visible_region
         self.polygon_filter = polygon_filter
+        # if True, the geometries of the plotted features are kept in feature_geometries
+        self.collect_geometries = collect_geometries
+        self.feature_geometries = []
+        # the sampler used for the last fetch, if the plot is sampled
+        self.sampler = None
+        # performance stats of the last build
+        self.stats = PlotStats()
+        # if True, the hover text is evaluated when features are hovered in the plot
+        # view, using the hover_text provider, instead of being embedded in the plot
+        self.hover_on_demand = hover_on_demand and PlotFactory.PLOT_TYPES[settings.plot_type].shows_hover_text()
+        self.settings.hover_on_demand = self.hover_on_demand
+        self.hover_text = None
         self.trace = None
         self.layout = None
         self.source_layer = QgsProject.instance().mapLayer(
             self.settings.source_layer_id) if self.settings.source_layer_id else None
 
-        self.rebuild()
+        # if build is False, the plot is built later, e.g. progressively via rebuild_in_chunks
+        if build:
+            self.rebuild()
+
+        # True while the plot is rebuilt when the source layer changes, see dispose()
+        self.connected = False
+        self.connect_source_layer()
+
+    def connect_source_layer(self):
+        """
+        Rebuilds the plot when the source layer is modified or its selection changes.
+
+        This is done from the construction of the factory until dispose() is called.
+        """
+        if self.connected or not self.source_layer:
+            return
+        self.source_layer.layerModified.connect(self.rebuild)
+        if self.selected_features_only:
+            self.source_layer.selectionChanged.connect(self.rebuild)
+        self.connected = True
+
+    def dispose(self):
+        """
+        Stops rebuilding the plot when the source layer is modified or its selection changes.
 
-        if self.source_layer:
-            self.source_layer.layerModified.connect(self.rebuild)
+        Factories are rebuilt on layer changes for as long as they exist, so this must be
+        called by the owner of a factory (e.g. the plot panel or a layout item) when its
+        plot isn't shown anymore, or when the factory was only used to build a plot once.
+        The built trace and layout are kept.
+        """
+        if not self.connected:
+            return
+        self.connected = False
+        try:
+            self.source_layer.layerModified.disconnect(self.rebuild)
             if self.selected_features_only:
-                self.source_layer.selectionChanged.connect(self.rebuild)
+                self.source_layer.selectionChanged.disconnect(self.rebuild)
+        except (TypeError, RuntimeError):
+            # the layer was already deleted
+            pass
 
-    def fetch_values_from_layer(self):  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
+    def fetch_values_from_layer(self):
         """
         (Re)fetches plot values from the source layer.
         """
+        with self.stats.measure('fetch'):
+            for _ in self.fetch_values_in_chunks():
+                pass
+
+    def fetch_values_in_chunks(self, chunk_size: int = None):  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
+        """
+        (Re)fetches plot values from the source layer, in chunks of chunk_size features.
+
+        This is a generator, which yields a (start, end) tuple for each fetched chunk. The
+        values of the settings are extended in place, so after each chunk the settings
+        contain all values fetched so far. The last chunk may be smaller than chunk_size
+        (or empty). If chunk_size is not set, all values are fetched as a single chunk.
+        """
+
+        self.hover_text = None
+        if self.hover_on_demand and self.source_layer and self.settings.layout['additional_info_expression']:
+            self.hover_text = HoverTextProvider(self.source_layer, self.settings.layout['additional_info_expression'],
+                                                self.create_expression_context())
+
+        cached_fields = self.cacheable_fields()
+        if cached_fields:
+            cached = ColumnCache().load(self.source_layer, cached_fields)
+            if cached is not None:
+                feature_ids, columns = cached
+                self.sampler = None
+                self.feature_geometries = []
+                self.settings.feature_ids = feature_ids
+                self.settings.additional_hover_text = []
+                self.settings.x = columns.get('x', [])
+                self.settings.y = columns.get('y', [])
+                self.settings.z = columns.get('z', [])
+                self.stats.fetch_path = 'column cache'
+                self.stats.counts['features_plotted'] = len(feature_ids)
+                yield 0, len(feature_ids)
+                return
+
+        columnar_fields = self.columnar_fields()
+        if columnar_fields:
+            result = ColumnarReader(self.source_layer).read(
+                list(columnar_fields.values()),
+                [name for axis, name in columnar_fields.items() if axis != 'additional_info'])
+            if result is not None:
+                feature_ids, values = result
+                columns = {axis: values[name] for axis, name in columnar_fields.items()}
+                self.sampler = None
+                self.feature_geometries = []
+                self.settings.feature_ids = feature_ids
+                self.settings.additional_hover_text = columns.get('additional_info', [])
+                self.settings.x = columns.get('x', [])
+                self.settings.y = columns.get('y', [])
+                self.settings.z = columns.get('z', [])
+                if cached_fields:
+                    ColumnCache().store(self.source_layer, cached_fields, feature_ids, columns)
+                self.stats.fetch_path = 'columnar reader'
+                self.stats.counts['features_plotted'] = len(feature_ids)
+                yield 0, len(feature_ids)
+                return
 
         # Note: we keep things nice and efficient and only iterate a single time over the layer!
 
-        if not self.context_generator:
-            context = QgsExpressionContext()
-            context.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(self.source_layer))
-        else:
-            context = self.context_generator.createExpressionContext()
+        context = self.create_expression_context()
 
         self.settings.data_defined_properties.prepare(context)
 
         def add_source_field_or_expression(field_or_expression):
-            field_index = self.source_layer.fields().lookupField(field_or_expression)
-            if field_index == -1:
-                expression = QgsExpression(field_or_expression)
-                if not expression.hasParserError():
-                    expression.prepare(context)
-                return expression, expression.needsGeometry(), expression.referencedColumns()
+            return ExpressionCache.field_or_expression(self.source_layer, field_or_expression, context)
 
-            return None, False, {field_or_expression}
-
-        x_expression, x_needs_geom, x_attrs = add_source_field_or_expression(self.settings.properties['x_name']) if \
+        x_expression, x_needs_geom, x_attrs, x_index = add_source_field_or_expression(self.settings.properties['x_name']) if \
             self.settings.properties[
-                'x_name'] else (None, False, set())
-        y_expression, y_needs_geom, y_attrs = add_source_field_or_expression(self.settings.properties['y_name']) if \
+                'x_name'] else (None, False, set(), -1)
+        y_expression, y_needs_geom, y_attrs, y_index = add_source_field_or_expression(self.settings.properties['y_name']) if \
             self.settings.properties[
-                'y_name'] else (None, False, set())
-        z_expression, z_needs_geom, z_attrs = add_source_field_or_expression(self.settings.properties['z_name']) if \
+                'y_name'] else (None, False, set(), -1)
+        z_expression, z_needs_geom, z_attrs, z_index = add_source_field_or_expression(self.settings.properties['z_name']) if \
             self.settings.properties[
-                'z_name'] else (None, False, set())
-        additional_info_expression, additional_needs_geom, additional_attrs = add_source_field_or_expression(
-            self.settings.layout['additional_info_expression']) if self.settings.layout[
-            'additional_info_expression'] else (None, False, set())
+                'z_name'] else (None, False, set(), -1)
+        additional_info_expression, additional_needs_geom, additional_attrs, additional_info_index = add_source_field_or_expression(
+            self.fetched_hover_expression()) if self.fetched_hover_expression() else (None, False, set(), -1)
+
+        sampler = FeatureSampler.from_settings(self.settings)
+        self.sampler = sampler
+        sample_field = self.settings.properties.get('sample_field', '') if sampler and sampler.mode == FeatureSampler.MODE_STRATIFIED else ''
+        sample_expression, sample_needs_geom, sample_attrs, sample_index = add_source_field_or_expression(
+            sample_field) if sample_field else (None, False, set(), -1)
 
         attrs = set().union(self.settings.data_defined_properties.referencedFields(),
                             x_attrs,
                             y_attrs,
                             z_attrs,
-                            additional_attrs)
+                            additional_attrs,
+                            sample_attrs)
 
         request = QgsFeatureRequest()
 
@@ -159,10 +345,11 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
 
         request.setSubsetOfAttributes(attrs, self.source_layer.fields())
 
-        if not x_needs_geom and not y_needs_geom and not z_needs_geom and not additional_needs_geom and not self.settings.data_defined_properties.hasActiveProperties():
+        if not self.collect_geometries and not x_needs_geom and not y_needs_geom and not z_needs_geom and not additional_needs_geom \
+                and not sample_needs_geom and not self.settings.data_defined_properties.hasActiveProperties():
             request.setFlags(QgsFeatureRequest.NoGeometry)
 
-        visible_geom_engine = None
+        visible_feature_ids = None
         if self.visible_features_only and self.visible_region is not None:
             ct = QgsCoordinateTransform(self.visible_region.crs(), self.source_layer.crs(),
                                         QgsProject.instance().transformContext())
@@ -177,11 +364,11 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
             try:
                 rect = ct.transformBoundingBox(self.polygon_filter.geometry.boundingBox())
                 request.setFilterRect(rect)
-                g = self.polygon_filter.geometry
+                g = QgsGeometry(self.polygon_filter.geometry)
                 g.transform(ct)
 
-                visible_geom_engine = QgsGeometry.createGeometryEngine(g.constGet())
-                visible_geom_engine.prepareGeometry()
+                # exact intersection tests are only needed for features on the region boundary
+                visible_feature_ids = SpatialFilter(self.source_layer).filter_ids(g)
             except QgsCsException:
                 pass
 
@@ -189,29 +376,69 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
             it = self.source_layer.getSelectedFeatures(request)
         else:
             it = self.source_layer.getFeatures(request)
+        self.stats.fetch_path = 'iterator'
+        it = self.stats.timed_iterator('provider', it, 'features_read')
 
         xx = []
         yy = []
         zz = []
+        feature_ids = []
+        geometries = []
         additional_hover_text = []
-        marker_sizes = []
-        colors = []
-        stroke_colors = []
-        stroke_widths = []
+        data_defined_values = DataDefinedValues(self.settings, context)
+        read_attributes = max(x_index, y_index, z_index, additional_info_index, sample_index) >= 0
+
+        self.settings.feature_ids = feature_ids
+        self.feature_geometries = geometries
+        self.settings.additional_hover_text = additional_hover_text
+        self.settings.x = xx
+        self.settings.y = yy
+        self.settings.z = zz
+        if data_defined_values.marker_size_property:
+            self.settings.data_defined_marker_sizes = data_defined_values.marker_sizes
+        if data_defined_values.color_property:
+            self.settings.data_defined_colors = data_defined_values.colors
+        if data_defined_values.stroke_color_property:
+            self.settings.data_defined_stroke_colors = data_defined_values.stroke_colors
+        if data_defined_values.stroke_width_property:
+            self.settings.data_defined_stroke_widths = data_defined_values.stroke_widths
+
+        # columns which are filled for every plotted feature
+        columns = [feature_ids]
+        if self.collect_geometries:
+            columns.append(geometries)
+        if additional_info_expression is not None or additional_info_index >= 0:
+            columns.append(additional_hover_text)
+        if x_expression is not None or x_index >= 0:
+            columns.append(xx)
+        if y_expression is not None or y_index >= 0:
+            columns.append(yy)
+        if z_expression is not None or z_index >= 0:
+            columns.append(zz)
+        columns.extend(data_defined_values.columns())
+        # iteration position of each sampled feature, used to restore the layer order of a sample
+        sample_positions = []
+        if sampler and not sampler.keeps_order():
+            # samples may still replace earlier features, so can't be returned in chunks
+            chunk_size = None
+            columns.append(sample_positions)
+
+        chunk_start = 0
         for f in it:
-            if visible_geom_engine and not visible_geom_engine.intersects(f.geometry().constGet()):
+            if visible_feature_ids is not None and f.id() not in visible_feature_ids:
                 continue
 
-            self.settings.feature_ids.append(f.id())
             context.setFeature(f)
+            # plain fields are read by index, which avoids a name lookup for every feature
+            attributes = f.attributes() if read_attributes else None
 
             x = None
             if x_expression:
                 x = x_expression.evaluate(context)
                 if x == NULL or x is None:
                     continue
-            elif self.settings.properties['x_name']:
-                x = f[self.settings.properties['x_name']]
+            elif x_index >= 0:
+                x = attributes[x_index]
                 if x == NULL or x is None:
                     continue
 
@@ -220,8 +447,8 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
                 y = y_expression.evaluate(context)
                 if y == NULL or y is None:
                     continue
-            elif self.settings.properties['y_name']:
-                y = f[self.settings.properties['y_name']]
+            elif y_index >= 0:
+                y = attributes[y_index]
                 if y == NULL or y is None:
                     continue
 
@@ -230,15 +457,34 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
                 z = z_expression.evaluate(context)
                 if z == NULL or z is None:
                     continue
-            elif self.settings.properties['z_name']:
-                z = f[self.settings.properties['z_name']]
+            elif z_index >= 0:
+                z = attributes[z_index]
                 if z == NULL or z is None:
                     continue
 
+            replaced_index = None
+            if sampler:
+                stratum = None
+                if sample_expression:
+                    stratum = str(sample_expression.evaluate(context))
+                elif sample_index >= 0:
+                    stratum = str(attributes[sample_index])
+                index = sampler.sample_index(stratum)
+                if index is None:
+                    continue
+                if index < len(feature_ids):
+                    replaced_index = index
+                if not sampler.keeps_order():
+                    sample_positions.append(sampler.seen)
+
+            feature_ids.append(f.id())
+            if self.collect_geometries:
+                geometries.append(f.geometry())
+
             if additional_info_expression:
                 additional_hover_text.append(additional_info_expression.evaluate(context))
-            elif self.settings.layout['additional_info_expression']:
-                additional_hover_text.append(f[self.settings.layout['additional_info_expression']])
+            elif additional_info_index >= 0:
+                additional_hover_text.append(attributes[additional_info_index])
 
             if x is not None:
                 xx.append(x)
@@ -247,41 +493,119 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
             if z is not None:
                 zz.append(z)
 
-            if self.settings.data_defined_properties.isActive(PlotSettings.PROPERTY_MARKER_SIZE):
-                default_value = self.settings.properties['marker_size']
-                context.setOriginalValueVariable(default_value)
-                value, _ = self.settings.data_defined_properties.valueAsDouble(PlotSettings.PROPERTY_MARKER_SIZE,
-                                                                               context, default_value)
-                marker_sizes.append(value)
-            if self.settings.data_defined_properties.isActive(PlotSettings.PROPERTY_STROKE_WIDTH):
-                default_value = self.settings.properties['marker_width']
-                context.setOriginalValueVariable(default_value)
-                value, _ = self.settings.data_defined_properties.valueAsDouble(PlotSettings.PROPERTY_STROKE_WIDTH,
-                                                                               context, default_value)
-                stroke_widths.append(value)
-            if self.settings.data_defined_properties.isActive(PlotSettings.PROPERTY_COLOR):
-                default_value = QColor(self.settings.properties['in_color'])
-                value, _ = self.settings.data_defined_properties.valueAsColor(PlotSettings.PROPERTY_COLOR, context,
-                                                                              default_value)
-                colors.append(value.name())
-            if self.settings.data_defined_properties.isActive(PlotSettings.PROPERTY_STROKE_COLOR):
-                default_value = QColor(self.settings.properties['out_color'])
-                value, _ = self.settings.data_defined_properties.valueAsColor(PlotSettings.PROPERTY_STROKE_COLOR,
-                                                                              context, default_value)
-                stroke_colors.append(value.name())
+            data_defined_values.collect()
 
-        self.settings.additional_hover_text = additional_hover_text
-        self.settings.x = xx
-        self.settings.y = yy
-        self.settings.z = zz
-        if marker_sizes:
-            self.settings.data_defined_marker_sizes = marker_sizes
-        if colors:
-            self.settings.data_defined_colors = colors
-        if stroke_colors:
-            self.settings.data_defined_stroke_colors = stroke_colors
-        if stroke_widths:
-            self.settings.data_defined_stroke_widths = stroke_widths
+            if replaced_index is not None:
+                # the feature replaces a previously sampled feature
+                for column in columns:
+                    column[replaced_index] = column.pop()
+
+            if chunk_size and len(feature_ids) - chunk_start >= chunk_size:
+                yield chunk_start, len(feature_ids)
+                chunk_start = len(feature_ids)
+
+        if sample_positions:
+            order = sorted(range(len(sample_positions)), key=sample_positions.__getitem__)
+            for column in columns:
+                column[:] = [column[i] for i in order]
+
+        if cached_fields:
+            ColumnCache().store(self.source_layer, cached_fields, feature_ids, {'x': xx, 'y': yy, 'z': zz})
+
+        self.stats.counts['features_plotted'] = len(feature_ids)
+        yield chunk_start, len(feature_ids)
+
+    def create_expression_context(self) -> QgsExpressionContext:
+        """
+        Returns the expression context used to evaluate expressions of the source layer
+        """
+        if not self.context_generator:
+            context = QgsExpressionContext()
+            context.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(self.source_layer))
+            return context
+        return self.context_generator.createExpressionContext()
+
+    def fetched_hover_expression(self) -> str:
+        """
+        Returns the hover text field or expression to evaluate for every plotted feature,
+        i.e. an empty string if there isn't any or if it is evaluated on demand
+        """
+        return '' if self.hover_on_demand else self.settings.layout['additional_info_expression']
+
+    def hover_label(self, point: int) -> str:
+        """
+        Returns the hover label of a point of the plot, for plots whose hover labels are
+        evaluated on demand (see hover_on_demand): the plotted values (for plot types which
+        build labels from them, see PlotType.hover_label) followed by the hover text of the
+        feature. Returns None if the point has no label.
+        """
+        parts = [PlotFactory.PLOT_TYPES[self.settings.plot_type].hover_label(self.settings, point)]
+        if self.hover_text is not None and point < len(self.settings.feature_ids):
+            parts.append(self.hover_text.text(self.settings.feature_ids[point]))
+        return '<br>'.join(part for part in parts if part) or None
+
+    def hover_labels(self, curve: int) -> dict:
+        """
+        Returns the hover labels of all the points of the plot, as shown in a figure where
+        the plot is the curve-th trace, keyed as expected by dataplotlySetHoverTexts
+        """
+        labels = {}
+        for point in range(len(self.settings.x)):
+            label = self.hover_label(point)
+            if label is not None:
+                labels['{}:{}'.format(curve, point)] = label
+        return labels
+
+    def plain_fields(self, numeric_only: bool = False) -> dict:
+        """
+        Returns the fields (a dict of axis to field name) of a plot which only reads plain
+        fields of the source layer, or None if the plot uses expressions, filters, data
+        defined properties or sampling.
+
+        The hover info field is included with the 'additional_info' key, unless it is
+        evaluated on demand. If numeric_only is True, None is also returned if any of the
+        fields isn't numeric.
+        """
+        if self.selected_features_only or self.visible_features_only or self.collect_geometries \
+                or self.settings.data_defined_properties.hasActiveProperties() \
+                or FeatureSampler.from_settings(self.settings) is not None:
+            return None
+
+        fields = {}
+        for axis, name in (('x', self.settings.properties['x_name']),
+                           ('y', self.settings.properties['y_name']),
+                           ('z', self.settings.properties['z_name']),
+                           ('additional_info', self.fetched_hover_expression())):
+            if not name:
+                continue
+            index = self.source_layer.fields().lookupField(name)
+            if index < 0 or (numeric_only and not self.source_layer.fields().at(index).isNumeric()):
+                return None
+            fields[axis] = name
+
+        return fields or None
+
+    def cacheable_fields(self) -> dict:
+        """
+        Returns the fields (a dict of axis to field name) to store in the column cache,
+        or None if the plot values can't be cached.
+
+        Only plots of plain numeric fields, without filters, hover info (unless it is
+        evaluated on demand), data defined properties or sampling are cached.
+        """
+        if not ColumnCache.is_enabled() or self.fetched_hover_expression():
+            return None
+        return self.plain_fields(numeric_only=True)
+
+    def columnar_fields(self) -> dict:
+        """
+        Returns the fields (a dict of axis to field name) to read with the columnar
+        reader, or None if the layer or plot values can't be read as columns.
+        """
+        fields = self.plain_fields()
+        if not fields or not ColumnarReader(self.source_layer).is_supported(fields.values()):
+            return None
+        return fields
 
     def set_visible_region(self, region: QgsReferencedRectangle):
         """
@@ -296,13 +620,46 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
         """
         Rebuilds the plot, re-fetching current values from the layer
         """
-        if self.source_layer:
-            self.fetch_values_from_layer()
+        self.stats.reset()
+        with self.stats.measure('rebuild'):
+            if self.source_layer:
+                self.fetch_values_from_layer()
 
-        self.trace = self._build_trace()
-        self.layout = self._build_layout()
+            self.trace = self._build_trace()
+            self.layout = self._build_layout()
         self.plot_built.emit()
 
+    def rebuild_in_chunks(self, chunk_size: int):
+        """
+        Progressively rebuilds the plot, re-fetching values from the layer in chunks
+        of chunk_size features.
+
+        This is a generator, which yields a (start, end) tuple for each fetched chunk.
+        The trace and layout are built from the first chunk, so that a preview can be
+        shown while the remaining values are appended (see trace_update). The final
+        trace and layout are built once all values are fetched, or when the generator
+        is closed. Unlike rebuild(), plot_built is not emitted.
+        """
+        self.stats.reset()
+        try:
+            if self.source_layer:
+                for start, end in self.fetch_values_in_chunks(chunk_size):
+                    if start == 0:
+                        self.trace = self._build_trace()
+                        self.layout = self._build_layout()
+                    yield start, end
+        finally:
+            # also when the generator is closed early, so the plot reflects the values fetched so far
+            self.trace = self._build_trace()
+            self.layout = self._build_layout()
+
+    def trace_update(self, start: int, end: int):
+        """
+        Returns the update to extend the plot trace with the values between start and end,
+        or None if the plot type can't be extended
+        """
+        return PlotFactory.PLOT_TYPES[self.settings.plot_type].trace_update(self.settings, start, end)
+
     def _build_trace(self):
         """
         Builds the final trace calling the go.xxx plotly method
@@ -316,7 +673,8 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
         """
         assert self.settings.plot_type in PlotFactory.PLOT_TYPES
 
-        return PlotFactory.PLOT_TYPES[self.settings.plot_type].create_trace(self.settings)
+        with self.stats.measure('trace'):
+            return PlotFactory.PLOT_TYPES[self.settings.plot_type].create_trace(self.settings)
 
     def _build_layout(self):
         """
@@ -330,7 +688,20 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
         """
         assert self.settings.plot_type in PlotFactory.PLOT_TYPES
 
-        return PlotFactory.PLOT_TYPES[self.settings.plot_type].create_layout(self.settings)
+        with self.stats.measure('layout'):
+            layout = PlotFactory.PLOT_TYPES[self.settings.plot_type].create_layout(self.settings)
+        if self.sampler:
+            annotations = list(layout['annotations'] or [])
+            annotations.append({'text': self.sampler.description(),
+                                'xref': 'paper',
+                                'yref': 'paper',
+                                'x': 1,
+                                'y': 1,
+                                'xanchor': 'right',
+                                'yanchor': 'bottom',
+                                'showarrow': False})
+            layout['annotations'] = annotations
+        return layout
 
     @staticmethod
     def js_callback(_):
@@ -350,6 +721,18 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
         var plotly_div = document.getElementById('ReplaceTheDiv')
         var plotly_data = plotly_div.data
 
+        // updates the traces of the plot, where traces contains new traces or the
+        // indices of the traces to keep (see OverlayFigure.update_script)
+        window.dataplotlyUpdateFigure = function(traces, layout, config){
+        var data = traces.map(function(trace){
+            return typeof trace === 'number' ? plotly_div.data[trace] : trace;
+        });
+        Plotly.react(plotly_div, data, layout, config);
+        if(window.dataplotlyResetHoverText){
+            window.dataplotlyResetHoverText();
+        }
+        }
+
         // selecting function
         plotly_div.on('plotly_selected', function(data){
         var dds = {};
@@ -476,6 +859,102 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
 
         return js_str
 
+    @staticmethod
+    def hover_text_callback():
+        """
+        Returns a string that is added to the end of figures showing plots whose hover
+        text is evaluated on demand (see hover_on_demand and hover_text_script)
+
+        WARNING! The string ReplaceTheDiv is a default string that will be
+        replaced in a second moment
+        """
+        return '''
+        <script>{}
+        </script>'''.format(PlotFactory.hover_text_script("document.getElementById('ReplaceTheDiv')"))
+
+    @staticmethod
+    def hover_text_script(plot_div: str) -> str:
+        """
+        Returns the JavaScript showing the hover text evaluated on demand in the plot
+        div returned by the plot_div JavaScript expression
+
+        When a point is hovered, its curve and point numbers are sent to the plot
+        panel, which evaluates the hover text of the feature and shows it by calling
+        dataplotlyShowHoverText. Texts are cached, so each point is only requested once.
+        The script does nothing if the page already shows hover text on demand.
+        """
+
+        js_str = '''
+        (function(){
+        if(window.dataplotlyShowHoverText){
+            return;
+        }
+        var plotly_div = ReplaceThePlotDiv
+        // "curve:point" -> hover text (or null if there isn't any)
+        var hover_texts = {};
+        var hovered = null;
+
+        var hover_label = document.createElement('div');
+        hover_label.style.cssText = 'position: fixed; display: none; pointer-events: none; z-index: 1001; ' +
+            'white-space: pre-line; font: 12px sans-serif; padding: 3px 6px; ' +
+            'background: rgba(255, 255, 255, 0.9); border: 1px solid #444;';
+        document.body.appendChild(hover_label);
+
+        function showHoverText(){
+        var text = hover_texts[hovered];
+        if(text){
+            hover_label.textContent = text.replace(/<br>/g, '\\n');
+            hover_label.style.display = 'block';
+        }
+        }
+
+        plotly_div.on('plotly_hover', function(data){
+        var pt = data.points[0];
+        hovered = pt.curveNumber + ':' + pt.pointNumber;
+        if(data.event){
+            hover_label.style.left = (data.event.clientX + 15) + 'px';
+            hover_label.style.top = (data.event.clientY + 15) + 'px';
+        }
+        if(hovered in hover_texts){
+            showHoverText();
+        }
+        else {
+            var dh = {};
+            dh["mode"] = 'hover'
+            dh["key"] = hovered
+            dh["curve"] = pt.curveNumber
+            dh["point"] = pt.pointNumber
+            window.status = JSON.stringify(dh)
+        }
+        });
+
+        plotly_div.on('plotly_unhover', function(){
+        hovered = null;
+        hover_label.style.display = 'none';
+        });
+
+        // point numbers change when the traces are updated
+        window.dataplotlyResetHoverText = function(){
+        hover_texts = {};
+        };
+
+        // fills the cache with the texts of many points, e.g. when saving the plot
+        window.dataplotlySetHoverTexts = function(texts){
+        for(var key in texts){
+            hover_texts[key] = texts[key];
+        }
+        };
+
+        window.dataplotlyShowHoverText = function(key, text){
+        hover_texts[key] = text;
+        if(key == hovered){
+            showHoverText();
+        }
+        };
+        })();'''
+
+        return js_str.replace('ReplaceThePlotDiv', plot_div)
+
     def build_html(self, config) -> str:
         """
         Creates the HTML for the plot
@@ -506,24 +985,58 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
             # finally create the Figure
             html_content  = factory.build_html()
         """
-        fig = go.Figure(data=self.trace, layout=self.layout)
+        buffer = io.StringIO()
+        self.write_html(buffer, config)
+        return buffer.getvalue()
+
+    def write_html(self, fp, config):
+        """
+        Writes the HTML for the plot to a file like object, see build_html
+        """
+        with self.stats.measure('html'):
+            self.stats.payload_chars = self._write_html(fp, self.trace, self.layout, config, self.hover_on_demand)
+
+    def _write_html(self, fp, data, layout, config, hover_on_demand: bool = False) -> int:  # pylint: disable=too-many-arguments
+        """
+        Writes the HTML of a figure made of data traces and a layout to a file like
+        object, and returns the number of characters written. If hover_on_demand is
+        True, the hover text of (some of) the plots of the figure is evaluated on demand.
 
+        The figure JSON is written by FigureSerializer straight into fp, without
+        copying the traces into a validated go.Figure or building the whole HTML
+        as a string first
+        """
+        plot_id = str(uuid.uuid4())
+        layout = FigureSerializer.to_json_value(layout)
+        size = {}
+        for dimension in ('width', 'height'):
+            value = layout.get(dimension)
+            size[dimension] = '{}px'.format(value) if isinstance(value, (int, float)) else '100%'
+        config = dict(config, showLink=False)
+
+        serializer = FigureSerializer(fp)
         # first lines of additional html with the link to the local javascript
-        raw_plot = '<head><meta charset="utf-8" /><script src="{}">' \
-                   '</script><script src="{}"></script></head>'.format(
-            self.POLY_FILL_PATH, self.PLOTLY_PATH)
-        # set some configurations
-        # call the plot method without all the javascript code
-        raw_plot += plotly.offline.plot(fig, output_type='div', include_plotlyjs=False, show_link=False,
-                                        config=config)
-        # insert callback for javascript events
-        raw_plot += self.js_callback(raw_plot)
-
-        # use regex to replace the string ReplaceTheDiv with the correct plot id generated by plotly
-        match = re.search(r'Plotly.newPlot\(\s*[\'"](.+?)[\'"]', raw_plot)
-        substr = match.group(1)
-        raw_plot = raw_plot.replace('ReplaceTheDiv', substr)
-        return raw_plot
+        serializer.write('<head><meta charset="utf-8" /><script src="{}">'
+                         '</script><script src="{}"></script></head>'.format(self.POLY_FILL_PATH, self.PLOTLY_PATH))
+        serializer.write('<div id="{}" style="height: {}; width: {};" class="plotly-graph-div"></div>'
+                         '<script type="text/javascript">window.PLOTLYENV=window.PLOTLYENV || {{}};'
+                         'Plotly.newPlot("{}", '.format(plot_id, size['height'], size['width'], plot_id))
+        with self.stats.measure('serialize'):
+            serializer.dump(data)
+            serializer.write(', ')
+            serializer.dump(layout)
+            serializer.write(', ')
+            serializer.dump(config)
+        serializer.write(')</script>')
+        if '100%' in size.values():
+            serializer.write('<script type="text/javascript">window.addEventListener("resize", function(){{'
+                             'Plotly.Plots.resize(document.getElementById("{}"));}});</script>'.format(plot_id))
+
+        # insert callback for javascript events, replacing the string ReplaceTheDiv with the plot id
+        serializer.write(self.js_callback(None).replace('ReplaceTheDiv', plot_id))
+        if hover_on_demand:
+            serializer.write(self.hover_text_callback().replace('ReplaceTheDiv', plot_id))
+        return serializer.written
 
     def build_figure(self) -> str:
         """
@@ -556,25 +1069,25 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
         }
 
         with open(self.plot_path, "w") as f:
-            f.write(self.build_html(config))
+            self.write_html(f, config)
 
         return self.plot_path
 
-    def build_figures(self, plot_type, ptrace) -> str:
+    def build_figures(self, plot_type=None, ptrace=None, layout=None, hover_on_demand=None) -> str:  # pylint: disable=unused-argument
         """
         Overlaps plots on the same map canvas
 
         params:
-            plot_type (string): 'scatter'
+            plot_type (string): deprecated and ignored, only kept for compatibility
+                with existing scripts (the layout sets e.g. the bar mode)
             ptrace (list of Plot Traces): list of all the different Plot Traces
+            layout (Layout or dict): layout of the figure (see OverlayFigure.merged_layout)
+            hover_on_demand (bool): whether the hover text of any of the plots is
+                evaluated on demand (defaults to the setting of this factory)
 
-        plot_type argument in necessary for Bar and Histogram plots when the
-        options stack is chosen.
-        In this case the layouts of the firsts plot are deleted and only the last
-        one is taken into account (so to have the stack option).
-
-        self.layout is DELETED, so the final layout is taken from the LAST plot
-        configuration added
+        If layout is not set, the layout of this factory is used, i.e. the final
+        layout is taken from the LAST plot configuration added (which includes
+        the bar mode of Bar and Histogram plots, e.g. to stack them).
 
         :return: the final html path containing the plot with the js_string for
         the interaction
@@ -585,56 +1098,31 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
             settings = PlotSettings(plot_type, plot_properties, layout_properties)
             factory = PlotFactory(settings)
             # finally create the Figures
-            path_to_output = factory.build_figures(plot_type, ptrace)
+            path_to_output = factory.build_figures(ptrace=ptrace)
         """
 
-        # assign the variables from the kwargs arguments
-        # plot_type = kwargs['plot_type']
-        # ptrace = kwargs['pl']
-
-        # check if the plot type and render the correct figure
-        if plot_type == 'bar' or 'histogram':
-            del self.layout
-            self.layout = go.Layout(
-                barmode=self.settings.layout['bar_mode']
-            )
-            figures = go.Figure(data=ptrace, layout=self.layout)
-
-        else:
-            figures = go.Figure(data=ptrace, layout=self.layout)
-
         # set some configurations
         config = {'scrollZoom': True, 'editable': True}
-        # first lines of additional html with the link to the local javascript
-        self.raw_plot = '<head><meta charset="utf-8" /><script src="{}">' \
-                        '</script><script src="{}"></script></head>'.format(
-            self.POLY_FILL_PATH, self.PLOTLY_PATH)
-        # call the plot method without all the javascript code
-        self.raw_plot += plotly.offline.plot(figures, output_type='div', include_plotlyjs=False, show_link=False,
-                                             config=config)
-        # insert callback for javascript events
-        self.raw_plot += self.js_callback(self.raw_plot)
-
-        # use regex to replace the string ReplaceTheDiv with the correct plot id generated by plotly
-        match = re.search(r'Plotly.newPlot\(\s*[\'"](.+?)[\'"]', self.raw_plot)
-        substr = match.group(1)
-        self.raw_plot = self.raw_plot.replace('ReplaceTheDiv', substr)
-
         self.plot_path = os.path.join(tempfile.gettempdir(), 'temp_plot_name.html')
         with open(self.plot_path, "w") as f:
-            f.write(self.raw_plot)
+            self._write_html(f, ptrace, self.layout if layout is None else layout, config,
+                             self.hover_on_demand if hover_on_demand is None else hover_on_demand)
 
         return self.plot_path
 
-    def build_sub_plots(self, grid, row, column, ptrace):  # pylint:disable=too-many-arguments
+    def build_sub_plots(self, row, column, ptrace, shared_xaxes=False, shared_yaxes=False):  # pylint:disable=too-many-arguments
         """
         Draws plot in different plot canvases (not overlapping)
 
         params:
-            grid (string): 'row' or 'col'. Plot are created in rows or columns
-            row (int): number of rows (if row is selected)
-            column (int): number of columns (if column is selected)
+            row (int): number of rows
+            column (int): number of columns
             ptrace (list of Plot Traces): list of all the different Plot Traces
+            shared_xaxes (bool): whether the plots of a column share their x axis
+            shared_yaxes (bool): whether the plots of a row share their y axis
+
+        Plots fill the row x column grid row by row (see SubplotGrid), so a single
+        row (or column) of plots is created with 1 row (or 1 column).
 
         :return: the final html path containing the plot with the js_string for
         the interaction
@@ -645,42 +1133,17 @@ class PlotFactory(QObject):  # pylint:disable=too-many-instance-attributes
             settings = PlotSettings(plot_type, plot_properties, layout_properties)
             factory = PlotFactory(settings)
             # finally create the Figures
-            path_to_output = factory.build_sub_plots('row', 1, gr, pl, tt)
+            path_to_output = factory.build_sub_plots(1, len(ptrace), ptrace)
         """
 
-        if grid == 'row':
-
-            fig = tools.make_subplots(rows=row, cols=column)
-
-            for i, itm in enumerate(ptrace):
-                fig.append_trace(itm, row, i + 1)
-
-        elif grid == 'col':
-
-            fig = tools.make_subplots(rows=row, cols=column)
-
-            for i, itm in enumerate(ptrace):
-                fig.append_trace(itm, i + 1, column)
+        subplot_grid = SubplotGrid(row, column, shared_xaxes, shared_yaxes)
+        data = [SubplotGrid.placed_trace(trace, subplot_grid.placement(i, trace)) for i, trace in enumerate(ptrace)]
+        layout = subplot_grid.grid_layout(ptrace, [None] * len(ptrace))
 
         # set some configurations
         config = {'scrollZoom': True, 'editable': True}
-        # first lines of additional html with the link to the local javascript
-        self.raw_plot = '<head><meta charset="utf-8" /><script src="{}"></script>' \
-                        '<script src="{}"></script></head>'.format(
-            self.POLY_FILL_PATH, self.PLOTLY_PATH)
-        # call the plot method without all the javascript code
-        self.raw_plot += plotly.offline.plot(fig, output_type='div', include_plotlyjs=False, show_link=False,
-                                             config=config)
-        # insert callback for javascript events
-        self.raw_plot += self.js_callback(self.raw_plot)
-
-        # use regex to replace the string ReplaceTheDiv with the correct plot id generated by plotly
-        match = re.search(r'Plotly.newPlot\(\s*[\'"](.+?)[\'"]', self.raw_plot)
-        substr = match.group(1)
-        self.raw_plot = self.raw_plot.replace('ReplaceTheDiv', substr)
-
         self.plot_path = os.path.join(tempfile.gettempdir(), 'temp_plot_name.html')
         with open(self.plot_path, "w") as f:
-            f.write(self.raw_plot)
+            self._write_html(f, data, layout, config)
 
         return self.plot_path
@@ -83,7 +83,12 @@ class PlotSettings:  # pylint: disable=too-many-instance-attributes
             'show_lines_check': False,
             'opacity': 1,
             'violin_side': None,
-            'show_mean_line': False
+            'show_mean_line': False,
+            'sample_mode': '',
+            'sample_size': 1000,
+            'sample_fraction': 0.1,
+            'sample_field': '',
+            'sample_seed': None
         }
 
         # layout nested dictionary
@@ -135,6 +140,9 @@ class PlotSettings:  # pylint: disable=too-many-instance-attributes
         self.z = []
         self.feature_ids = []
         self.additional_hover_text = []
+        # set by PlotFactory: if True, hover labels are evaluated on demand instead of
+        # being embedded in the trace
+        self.hover_on_demand = False
         self.data_defined_marker_sizes = []
         self.data_defined_colors = []
         self.data_defined_stroke_colors = []
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Performance statistics of plots
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import (
+    Qgis,
+    QgsMessageLog,
+    QgsSettings
+)
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class PlotStats:
+    """
+    Records the performance of the phases of building and showing a plot: the time
+    spent in each phase, feature counts, the length of the generated HTML and how much
+    the peak memory of the process increased.
+
+    Phases are:
+    - rebuild: fetching values and building the trace and layout
+    - fetch: fetching values from the source layer
+    - provider: time spent in the feature iterator, i.e. by the data provider (part of fetch)
+    - trace, layout: building the plotly trace and layout
+    - html: creating the plot HTML (and writing it to a file), including serialize
+      (writing the figure JSON)
+    - view_load: loading the plot in the web view
+
+    Stats are reset when the plot is rebuilt. They can be logged to the 'DataPlotly'
+    message log tab by enabling the 'dataplotly/log_stats' setting.
+    """
+
+    def __init__(self):
+        # phase -> (total seconds, number of calls)
+        self.timings = OrderedDict()
+        # e.g. 'features_read' -> count
+        self.counts = OrderedDict()
+        # how values were fetched, e.g. 'iterator' or 'column cache'
+        self.fetch_path = ''
+        # number of characters of the last generated HTML
+        self.payload_chars = 0
+        # peak resident memory of the process when the stats were reset, in bytes
+        self.peak_memory_start = self.process_peak_memory()
+        # increase of the peak resident memory of the process since the stats were reset, in
+        # bytes, or None if not available. Memory reused from earlier peaks isn't counted
+        self.peak_memory_increase = None
+
+    def reset(self):
+        """
+        Clears all recorded stats
+        """
+        self.timings.clear()
+        self.counts.clear()
+        self.fetch_path = ''
+        self.payload_chars = 0
+        self.peak_memory_start = self.process_peak_memory()
+        self.peak_memory_increase = None
+
+    def add_time(self, phase: str, seconds: float):
+        """
+        Adds time spent in a phase
+        """
+        total, calls = self.timings.get(phase, (0.0, 0))
+        self.timings[phase] = (total + seconds, calls + 1)
+
+    def time(self, phase: str) -> float:
+        """
+        Returns the total time spent in a phase, in seconds
+        """
+        return self.timings.get(phase, (0.0, 0))[0]
+
+    @contextmanager
+    def measure(self, phase: str):
+        """
+        Context manager measuring the time spent in a phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(phase, time.perf_counter() - start)
+            self.update_peak_memory()
+
+    def timed_iterator(self, phase: str, iterator, count_key: str = None):
+        """
+        Wraps an iterator, measuring the time spent getting its items as a phase
+        and optionally counting them
+        """
+        clock = time.perf_counter
+        elapsed = 0.0
+        count = 0
+        iterator = iter(iterator)
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    elapsed += clock() - start
+                    return
+                elapsed += clock() - start
+                count += 1
+                yield item
+        finally:
+            self.add_time(phase, elapsed)
+            if count_key:
+                self.counts[count_key] = self.counts.get(count_key, 0) + count
+
+    @staticmethod
+    def process_peak_memory():
+        """
+        Returns the peak resident memory of the process, in bytes, or None if not available
+        """
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+    def update_peak_memory(self):
+        """
+        Updates the increase of the peak memory of the process since the stats were reset
+        """
+        if self.peak_memory_start is None:
+            return
+        self.peak_memory_increase = self.process_peak_memory() - self.peak_memory_start
+
+    def to_dict(self) -> dict:
+        """
+        Returns the stats as a dict
+        """
+        return {
+            'timings': {phase: {'seconds': total, 'calls': calls} for phase, (total, calls) in self.timings.items()},
+            'counts': dict(self.counts),
+            'fetch_path': self.fetch_path,
+            'payload_chars': self.payload_chars,
+            'peak_memory_increase': self.peak_memory_increase
+        }
+
+    def summary(self) -> str:
+        """
+        Returns a human readable summary of the stats
+        """
+        lines = []
+        for phase, (total, calls) in self.timings.items():
+            lines.append(QCoreApplication.translate('DataPlotly', '{}: {:.1f} ms ({} calls)').format(
+                phase, total * 1000, calls))
+        if self.fetch_path:
+            lines.append(QCoreApplication.translate('DataPlotly', 'fetched from: {}').format(self.fetch_path))
+        for key, count in self.counts.items():
+            lines.append('{}: {}'.format(key, count))
+        if self.payload_chars:
+            lines.append(QCoreApplication.translate('DataPlotly', 'html length: {:.1f} k characters').format(
+                self.payload_chars / 1000))
+        if self.peak_memory_increase is not None:
+            lines.append(QCoreApplication.translate('DataPlotly', 'peak memory increase: {:.1f} MB').format(
+                self.peak_memory_increase / (1024 * 1024)))
+        return '\n'.join(lines)
+
+    def log(self):
+        """
+        Logs the stats to the message log, if enabled
+        """
+        if QgsSettings().value('dataplotly/log_stats', False, bool):
+            QgsMessageLog.logMessage(self.summary(), 'DataPlotly', Qgis.Info)
@@ -55,6 +55,14 @@ class HistogramFactory(PlotType):
                 )
             )]
 
+    @staticmethod
+    def trace_update(settings, start, end):
+        # bins are recomputed by plotly.js as values are appended
+        return {
+            'x': [settings.x[start:end]],
+            'y': [settings.x[start:end]]
+        }
+
     @staticmethod
     def create_layout(settings):
         layout = super(HistogramFactory, HistogramFactory).create_layout(settings)
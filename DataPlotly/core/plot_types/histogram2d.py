@@ -38,3 +38,11 @@ class Histogram2dFactory(PlotType):
                 y=settings.y,
                 colorscale=settings.properties['color_scale']
             )]
+
+    @staticmethod
+    def trace_update(settings, start, end):
+        # bins are recomputed by plotly.js as values are appended
+        return {
+            'x': [settings.x[start:end]],
+            'y': [settings.y[start:end]]
+        }
@@ -8,6 +8,7 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 """
 
+from numbers import Number
 from plotly import graph_objs
 from qgis.PyQt.QtCore import QCoreApplication
 
@@ -45,6 +46,39 @@ class PlotType:
         """
         return None
 
+    @staticmethod
+    def trace_update(settings, start: int, end: int):  # pylint: disable=W0613
+        """
+        Returns the update (as passed to Plotly.extendTraces) which appends the values
+        between start and end to a trace created with a subset of the settings values,
+        or None if the plot type doesn't support progressive updates
+        """
+        return None
+
+    @staticmethod
+    def shows_hover_text():
+        """
+        Returns True if the plot type shows the hover text (additional info) of the
+        plotted features
+        """
+        return False
+
+    @staticmethod
+    def builds_hover_labels():
+        """
+        Returns True if the hover labels of the plot type are formatted from the plotted
+        values of each point (see hover_label), which is best done on demand
+        """
+        return False
+
+    @staticmethod
+    def hover_label(settings, index: int):  # pylint: disable=W0613
+        """
+        Returns the hover label showing the plotted values of the point at index, when
+        hover labels are evaluated on demand (see PlotFactory.hover_label), or None
+        """
+        return None
+
     @staticmethod
     def create_layout(settings):
         """
@@ -70,12 +104,12 @@ class PlotType:
         # update the x and y axis and add the linear and log only if the data are numeric
         # pass if field is empty
         try:
-            if isinstance(settings.x[0], (int, float)):
+            if isinstance(settings.x[0], Number):
                 layout['xaxis'].update(type=settings.layout['x_type'])
         except:  # pylint:disable=bare-except  # noqa: F401
             pass
         try:
-            if isinstance(settings.y[0], (int, float)):
+            if isinstance(settings.y[0], Number):
                 layout['yaxis'].update(type=settings.layout['y_type'])
         except:  # pylint:disable=bare-except  # noqa: F401
             pass
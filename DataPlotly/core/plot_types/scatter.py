@@ -58,6 +58,29 @@ class ScatterPlotFactory(PlotType):
             opacity=settings.properties['opacity']
         )]
 
+    @staticmethod
+    def trace_update(settings, start, end):
+        update = {
+            'x': [settings.x[start:end]],
+            'y': [settings.y[start:end]],
+            'ids': [settings.feature_ids[start:end]]
+        }
+        if settings.additional_hover_text:
+            update['text'] = [settings.additional_hover_text[start:end]]
+        if settings.data_defined_colors:
+            update['marker.color'] = [settings.data_defined_colors[start:end]]
+        if settings.data_defined_marker_sizes:
+            update['marker.size'] = [settings.data_defined_marker_sizes[start:end]]
+        if settings.data_defined_stroke_colors:
+            update['marker.line.color'] = [settings.data_defined_stroke_colors[start:end]]
+        if settings.data_defined_stroke_widths:
+            update['marker.line.width'] = [settings.data_defined_stroke_widths[start:end]]
+        return update
+
+    @staticmethod
+    def shows_hover_text():
+        return True
+
     @staticmethod
     def create_layout(settings):
         layout = super(ScatterPlotFactory, ScatterPlotFactory).create_layout(settings)
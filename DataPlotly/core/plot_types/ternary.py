@@ -31,29 +31,32 @@ class TernaryFactory(PlotType):
     def icon():
         return QIcon(os.path.join(os.path.dirname(__file__), 'icons/scatterternary.svg'))
 
+    @staticmethod
+    def hover_template(settings) -> str:
+        """
+        Returns the template of the hover labels, showing the raw a, b and c values
+        (plotly.js would show them normalized to the sum)
+        """
+        return '<br>'.join('{}: {{}}'.format(settings.properties[name].replace('{', '{{').replace('}', '}}'))
+                           for name in ('x_name', 'y_name', 'z_name'))
+
     @staticmethod
     def create_trace(settings):
-        # prepare the hover text to display if the additional combobox is empty or not
-        # this setting is necessary to overwrite the standard hovering labels
-        if not settings.additional_hover_text:
-            text = [
-                settings.properties['x_name'] + ': {}'.format(
-                    settings.x[k]) + '<br>{}: {}'.format(
-                    settings.properties['y_name'],
-                    settings.y[k]) + '<br>{}: {}'.format(
-                    settings.properties['z_name'], settings.z[k]) for k
-                in
-                range(len(settings.x))]
+        if settings.hover_on_demand:
+            # the labels are built when points are hovered (see hover_label), so that
+            # only the values are sent to the plot view
+            hoverinfo = 'none'
+            text = None
         else:
-            text = [
-                settings.properties['x_name'] + ': {}'.format(
-                    settings.x[k]) + '<br>{}: {}'.format(
-                    settings.properties['y_name'],
-                    settings.y[k]) + '<br>{}: {}'.format(
-                    settings.properties['z_name'],
-                    settings.z[k]) + '<br>{}'.format(
-                    settings.additional_hover_text[k]) for k in
-                range(len(settings.x))]
+            # standalone plots embed the labels, followed by the additional hover text if any
+            hoverinfo = 'text'
+            template = TernaryFactory.hover_template(settings)
+            if settings.additional_hover_text:
+                template += '<br>{}'
+                text = [template.format(*values) for values in
+                        zip(settings.x, settings.y, settings.z, settings.additional_hover_text)]
+            else:
+                text = [template.format(*values) for values in zip(settings.x, settings.y, settings.z)]
 
         return [graph_objs.Scatterternary(
             a=settings.x,
@@ -62,7 +65,7 @@ class TernaryFactory(PlotType):
             name='{} + {} + {}'.format(settings.properties['x_name'],
                                        settings.properties['y_name'],
                                        settings.properties['z_name']),
-            hoverinfo='text',
+            hoverinfo=hoverinfo,
             text=text,
             mode='markers',
             marker=dict(
@@ -83,6 +86,20 @@ class TernaryFactory(PlotType):
             opacity=settings.properties['opacity']
         )]
 
+    @staticmethod
+    def shows_hover_text():
+        return True
+
+    @staticmethod
+    def builds_hover_labels():
+        return True
+
+    @staticmethod
+    def hover_label(settings, index: int):
+        if index >= min(len(settings.x), len(settings.y), len(settings.z)):
+            return None
+        return TernaryFactory.hover_template(settings).format(settings.x[index], settings.y[index], settings.z[index])
+
     @staticmethod
     def create_layout(settings):
         layout = super(TernaryFactory, TernaryFactory).create_layout(settings)
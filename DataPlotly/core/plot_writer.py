@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Writes plots to files
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import codecs
+
+from qgis.PyQt.QtCore import (
+    QRectF,
+    QSize,
+    Qt
+)
+from qgis.PyQt.QtGui import (
+    QImage,
+    QPainter
+)
+from qgis.PyQt.QtSvg import QSvgGenerator
+
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.core.static_renderer import QPainterRenderer
+
+
+class PlotWriter:
+    """
+    Writes the plot built by a PlotFactory as HTML, as a JSON figure spec or as a
+    static image, without a web engine
+    """
+
+    @staticmethod
+    def write_html(factory, path: str):
+        """
+        Writes the plot built by a factory as HTML
+        """
+        config = {'scrollZoom': True, 'editable': False}
+        with codecs.open(path, 'w', encoding='utf-8') as f:
+            factory.write_html(f, config)
+
+    @staticmethod
+    def write_json(factory, path: str):
+        """
+        Writes the figure spec of the plot built by a factory as JSON
+        """
+        ojson = {
+            'data': factory.trace,
+            'layout': factory.layout
+        }
+        with codecs.open(path, 'w', encoding='utf-8') as f:
+            FigureSerializer(f).dump(ojson)
+
+    @staticmethod
+    def supports_image(plot_type: str) -> bool:
+        """
+        Returns True if plots of the specified type can be written as static images
+        """
+        return QPainterRenderer.supports(plot_type)
+
+    @staticmethod
+    def write_image(factory, path: str, width: int, height: int) -> bool:
+        """
+        Renders the plot built by a factory as a static PNG or SVG image (depending on
+        the file extension), returning False if the image can't be written
+        """
+        rect = QRectF(0, 0, width, height)
+        if path.lower().endswith('.svg'):
+            generator = QSvgGenerator()
+            generator.setFileName(path)
+            generator.setSize(QSize(width, height))
+            generator.setViewBox(rect)
+            painter = QPainter(generator)
+            QPainterRenderer().render(factory, painter, rect)
+            return painter.end()
+
+        image = QImage(width, height, QImage.Format_ARGB32)
+        image.fill(Qt.white)
+        painter = QPainter(image)
+        QPainterRenderer().render(factory, painter, rect)
+        painter.end()
+        return image.save(path, 'PNG')
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Feature sampling for plots
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import random
+
+from qgis.PyQt.QtCore import QCoreApplication
+
+
+class FeatureSampler:
+    """
+    Decides which of the features iterated during a fetch are kept in a sample.
+
+    Features are sampled in a single pass over the layer: a fixed size sample uses
+    reservoir sampling, a fraction keeps each feature with the same probability, and a
+    stratified sample keeps a fixed size reservoir for each distinct category.
+    Samples are reproducible when a seed is set.
+    """
+
+    MODE_NONE = ''
+    MODE_COUNT = 'count'
+    MODE_FRACTION = 'fraction'
+    MODE_STRATIFIED = 'stratified'
+
+    def __init__(self, mode: str, size: int = 1000, fraction: float = 0.1, seed: int = None):
+        self.mode = mode
+        self.size = max(0, size)
+        self.fraction = fraction
+        self.random = random.Random(seed)
+        # number of features offered to the sampler
+        self.seen = 0
+        # number of features in the sample
+        self.count = 0
+        # stratum -> [number of features seen, sample indices of the stratum]
+        self.strata = {}
+
+    @staticmethod
+    def from_settings(settings):
+        """
+        Creates a sampler for plot settings, or returns None if the settings don't use sampling
+        """
+        mode = settings.properties.get('sample_mode', FeatureSampler.MODE_NONE)
+        if mode not in (FeatureSampler.MODE_COUNT, FeatureSampler.MODE_FRACTION, FeatureSampler.MODE_STRATIFIED):
+            return None
+
+        seed = settings.properties.get('sample_seed', None)
+        return FeatureSampler(mode,
+                              size=settings.properties.get('sample_size', 1000),
+                              fraction=settings.properties.get('sample_fraction', 0.1),
+                              seed=seed if seed not in (None, '') else None)
+
+    def keeps_order(self) -> bool:
+        """
+        Returns True if sampled features are only ever appended to the sample,
+        i.e. the sample is in iteration order
+        """
+        return self.mode == FeatureSampler.MODE_FRACTION
+
+    def sample_index(self, stratum=None):
+        """
+        Offers the next feature to the sampler, and returns its index in the sample.
+
+        The returned index is either the current sample size (the feature is appended),
+        the index of a previously sampled feature which it replaces, or None if the
+        feature isn't sampled.
+        """
+        self.seen += 1
+
+        if self.mode == FeatureSampler.MODE_FRACTION:
+            if self.random.random() >= self.fraction:
+                return None
+            self.count += 1
+            return self.count - 1
+
+        if self.mode == FeatureSampler.MODE_STRATIFIED:
+            stratum_state = self.strata.setdefault(stratum, [0, []])
+            stratum_state[0] += 1
+            seen = stratum_state[0]
+            indices = stratum_state[1]
+        else:
+            seen = self.seen
+            indices = None
+
+        if seen <= self.size:
+            self.count += 1
+            if indices is not None:
+                indices.append(self.count - 1)
+            return self.count - 1
+
+        j = self.random.randrange(seen)
+        if j >= self.size:
+            return None
+        return indices[j] if indices is not None else j
+
+    def description(self) -> str:
+        """
+        Returns a short description of the sample, e.g. for plot annotations
+        """
+        return QCoreApplication.translate('DataPlotly', 'Sampled {} of {}').format(self.count, self.seen)
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Spatial filtering of layer features
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from collections import OrderedDict
+
+from qgis.core import (
+    QgsFeatureRequest,
+    QgsGeometry,
+    QgsSpatialIndex,
+    QgsVectorLayer
+)
+
+
+class SpatialFilter:
+    """
+    Filters the features of a layer by a polygon region.
+
+    The envelopes of the layer features are stored in a spatial index, which is
+    cached for each layer until the layer is modified. Only the indexes of the
+    MAX_INDEXES most recently filtered layers are kept. Features are classified
+    against the prepared region using their envelopes only: features whose
+    envelope is fully inside the region are accepted, features whose envelope
+    doesn't touch the region are rejected, and exact (GEOS) intersection tests
+    are only run for the remaining boundary features.
+    """
+
+    MAX_INDEXES = 10
+
+    # layer id -> (spatial index, dict of feature id -> envelope), least recently used first
+    _indexes = OrderedDict()
+    # ids of the layers whose changes are connected to invalidate
+    _connected_layers = set()
+
+    def __init__(self, layer: QgsVectorLayer):
+        self.layer = layer
+
+    @staticmethod
+    def invalidate(layer_id: str):
+        """
+        Discards the cached index for a layer
+        """
+        SpatialFilter._indexes.pop(layer_id, None)
+
+    @staticmethod
+    def layer_deleted(layer_id: str):
+        """
+        Discards the cached index for a deleted layer, and forgets the layer
+        """
+        SpatialFilter.invalidate(layer_id)
+        SpatialFilter._connected_layers.discard(layer_id)
+
+    def index(self):
+        """
+        Returns the (cached) spatial index and feature envelopes for the layer
+        """
+        layer_id = self.layer.id()
+        if layer_id in SpatialFilter._indexes:
+            SpatialFilter._indexes.move_to_end(layer_id)
+            return SpatialFilter._indexes[layer_id]
+
+        index = QgsSpatialIndex()
+        envelopes = {}
+        for f in self.layer.getFeatures(QgsFeatureRequest().setNoAttributes()):
+            if not f.hasGeometry():
+                continue
+            envelope = f.geometry().boundingBox()
+            index.addFeature(f.id(), envelope)
+            envelopes[f.id()] = envelope
+
+        SpatialFilter._indexes[layer_id] = (index, envelopes)
+        while len(SpatialFilter._indexes) > SpatialFilter.MAX_INDEXES:
+            SpatialFilter._indexes.popitem(last=False)
+
+        # the signals of a layer are only connected once, whatever the number of rebuilds
+        if layer_id not in SpatialFilter._connected_layers:
+            SpatialFilter._connected_layers.add(layer_id)
+
+            def invalidate(*_):
+                SpatialFilter.invalidate(layer_id)
+
+            self.layer.layerModified.connect(invalidate)
+            self.layer.dataChanged.connect(invalidate)
+            self.layer.subsetStringChanged.connect(invalidate)
+            self.layer.willBeDeleted.connect(lambda: SpatialFilter.layer_deleted(layer_id))
+
+        return index, envelopes
+
+    def classify(self, region: QgsGeometry):
+        """
+        Classifies the layer features against a region (in the layer CRS).
+
+        Returns a tuple of the ids of features fully inside the region, and the ids
+        of features on the region boundary (which need an exact test). All other
+        features are outside the region.
+        """
+        index, envelopes = self.index()
+
+        engine = QgsGeometry.createGeometryEngine(region.constGet())
+        engine.prepareGeometry()
+
+        inside = set()
+        boundary = set()
+        for fid in index.intersects(region.boundingBox()):
+            envelope = QgsGeometry.fromRect(envelopes[fid])
+            if engine.contains(envelope.constGet()):
+                inside.add(fid)
+            elif engine.intersects(envelope.constGet()):
+                boundary.add(fid)
+
+        return inside, boundary
+
+    def filter_ids(self, region: QgsGeometry) -> set:
+        """
+        Returns the ids of all features intersecting the region (in the layer CRS)
+        """
+        inside, boundary = self.classify(region)
+        if not boundary:
+            return inside
+
+        engine = QgsGeometry.createGeometryEngine(region.constGet())
+        engine.prepareGeometry()
+
+        request = QgsFeatureRequest().setFilterFids(list(boundary)).setNoAttributes()
+        for f in self.layer.getFeatures(request):
+            if f.hasGeometry() and engine.intersects(f.geometry().constGet()):
+                inside.add(f.id())
+
+        return inside
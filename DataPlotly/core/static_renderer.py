@@ -0,0 +1,532 @@
+# -*- coding: utf-8 -*-
+"""
+Static plot rendering without a web engine
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import math
+from collections import OrderedDict
+from numbers import Number
+
+from qgis.PyQt.QtCore import (
+    Qt,
+    QRectF,
+    QPointF
+)
+from qgis.PyQt.QtGui import (
+    QColor,
+    QPen,
+    QBrush,
+    QFont,
+    QPainter,
+    QPolygonF
+)
+
+# default plotly trace colors
+DEFAULT_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                  '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+
+def spec_value(spec, key, default=None):
+    """
+    Returns the value of a property from a trace or layout spec, or the default
+    value if the property is not set
+    """
+    if spec is None:
+        return default
+    try:
+        value = spec[key]
+    except (KeyError, ValueError, TypeError):
+        return default
+    return default if value is None else value
+
+
+def is_numeric(values) -> bool:
+    """
+    Returns True if all the values are numbers
+    """
+    return len(values) > 0 and all(isinstance(v, Number) and not isinstance(v, bool) for v in values)
+
+
+def nice_step(raw_step: float) -> float:
+    """
+    Rounds a tick step to 1, 2 or 5 times a power of ten
+    """
+    if raw_step <= 0:
+        return 1
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    for factor in (1, 2, 5):
+        if raw_step <= factor * magnitude:
+            return factor * magnitude
+    return 10 * magnitude
+
+
+class Axis:
+    """
+    Maps data values to painter coordinates along a numeric or category axis
+    """
+
+    def __init__(self, start: float, end: float):
+        self.start = start
+        self.end = end
+        self.categories = None
+        self.minimum = 0.0
+        self.maximum = 1.0
+        self.ticks = []
+
+    def set_values(self, values, include_zero=False):
+        """
+        Sets the range of the axis so that all values are visible
+        """
+        if not is_numeric(values):
+            self.categories = OrderedDict()
+            for v in values:
+                self.categories.setdefault(str(v), len(self.categories))
+            self.minimum = -0.5
+            self.maximum = len(self.categories) - 0.5
+            self.ticks = list(range(len(self.categories)))
+            return
+
+        minimum = min(values) if values else 0
+        maximum = max(values) if values else 1
+        if include_zero:
+            minimum = min(minimum, 0)
+            maximum = max(maximum, 0)
+        if minimum == maximum:
+            minimum -= 1
+            maximum += 1
+
+        step = nice_step((maximum - minimum) / 5)
+        self.minimum = math.floor(minimum / step) * step
+        self.maximum = math.ceil(maximum / step) * step
+        count = int(round((self.maximum - self.minimum) / step))
+        self.ticks = [self.minimum + i * step for i in range(count + 1)]
+
+    def map(self, value) -> float:
+        """
+        Maps a data value to a painter coordinate
+        """
+        if self.categories is not None:
+            value = self.categories.get(str(value), 0)
+        return self.start + (value - self.minimum) / (self.maximum - self.minimum) * (self.end - self.start)
+
+    def unit_length(self) -> float:
+        """
+        Returns the length in painter coordinates of one data unit, i.e. of the
+        spacing between categories
+        """
+        return abs(self.end - self.start) / (self.maximum - self.minimum)
+
+    def tick_labels(self):
+        """
+        Returns a list of (painter coordinate, label) for the axis ticks
+        """
+        if self.categories is not None:
+            return [(self.map(label), label) for label in self.categories]
+        return [(self.map(t), '{:g}'.format(round(t, 10))) for t in self.ticks]
+
+
+class StaticRenderer:
+    """
+    Base class for static renderers, which draw the plot built by a PlotFactory
+    without a web engine
+    """
+
+    @staticmethod
+    def supports(plot_type: str) -> bool:  # pylint: disable=unused-argument
+        """
+        Returns True if the renderer can draw plots of the specified type
+        """
+        return False
+
+    def render(self, factory, painter: QPainter, rect: QRectF):  # pylint: disable=W0613
+        """
+        Renders the plot built by the factory to the painter, within the specified
+        rectangle. Painter units are CSS pixels, as used by the plot settings.
+        """
+        return None
+
+
+class QPainterRenderer(StaticRenderer):
+    """
+    Renders the most common plot types directly with QPainter, giving fast and
+    deterministic vector output
+    """
+
+    SUPPORTED_TYPES = ('scatter', 'bar', 'histogram', 'box', 'pie')
+
+    FONT_SIZE = 12
+    TITLE_FONT_SIZE = 17
+
+    @staticmethod
+    def supports(plot_type: str) -> bool:
+        return plot_type in QPainterRenderer.SUPPORTED_TYPES
+
+    def render(self, factory, painter: QPainter, rect: QRectF):
+        settings = factory.settings
+        trace = factory.trace[0] if factory.trace else None
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, True)
+
+        margin_x = min(80.0, rect.width() * 0.15)
+        margin_top = min(100.0, rect.height() * 0.2)
+        margin_bottom = min(80.0, rect.height() * 0.15)
+        plot_rect = rect.adjusted(margin_x, margin_top, -margin_x, -margin_bottom)
+
+        if settings.plot_type == 'pie':
+            self.render_pie(trace, painter, plot_rect)
+        else:
+            x_axis = Axis(plot_rect.left(), plot_rect.right())
+            y_axis = Axis(plot_rect.bottom(), plot_rect.top())
+            if settings.layout['x_inv'] == 'reversed':
+                x_axis.start, x_axis.end = x_axis.end, x_axis.start
+            if settings.layout['y_inv'] == 'reversed':
+                y_axis.start, y_axis.end = y_axis.end, y_axis.start
+
+            painter.setClipRect(plot_rect.adjusted(-1, -1, 1, 1))
+            if settings.plot_type == 'scatter':
+                self.render_scatter(trace, painter, x_axis, y_axis)
+            elif settings.plot_type == 'bar':
+                self.render_bar(trace, painter, x_axis, y_axis)
+            elif settings.plot_type == 'histogram':
+                self.render_histogram(settings, trace, painter, x_axis, y_axis)
+            elif settings.plot_type == 'box':
+                self.render_box(trace, painter, x_axis, y_axis)
+            painter.setClipping(False)
+
+            self.render_axes(settings, painter, plot_rect, x_axis, y_axis)
+
+        if settings.layout['title']:
+            font = QFont()
+            font.setPixelSize(self.TITLE_FONT_SIZE)
+            painter.setFont(font)
+            painter.setPen(QColor('#444444'))
+            painter.drawText(QRectF(rect.left(), rect.top(), rect.width(), margin_top),
+                             Qt.AlignCenter, settings.layout['title'])
+
+        painter.restore()
+
+    @staticmethod
+    def color_list(color, count, default):
+        """
+        Returns a list of count QColors, from a single color or a list of colors
+        """
+        if isinstance(color, (list, tuple)):
+            colors = [QColor(c) for c in color]
+            if len(colors) >= count:
+                return colors
+            return colors + [QColor(default)] * (count - len(colors))
+        return [QColor(color if isinstance(color, str) else default)] * count
+
+    @staticmethod
+    def value_list(value, count, default):
+        """
+        Returns a list of count numbers, from a single number or a list of numbers
+        """
+        if isinstance(value, (list, tuple)):
+            return [v if isinstance(v, Number) else default for v in value] + [default] * (count - len(value))
+        return [value if isinstance(value, Number) else default] * count
+
+    def render_axes(self, settings, painter, plot_rect, x_axis, y_axis):  # pylint: disable=too-many-arguments
+        """
+        Renders the axis lines, tick labels and titles
+        """
+        font = QFont()
+        font.setPixelSize(self.FONT_SIZE)
+        painter.setFont(font)
+
+        painter.setPen(QPen(QColor('#eeeeee'), 1))
+        for y, _ in y_axis.tick_labels():
+            painter.drawLine(QPointF(plot_rect.left(), y), QPointF(plot_rect.right(), y))
+
+        painter.setPen(QPen(QColor('#444444'), 1))
+        painter.drawLine(plot_rect.bottomLeft(), plot_rect.bottomRight())
+        painter.drawLine(plot_rect.bottomLeft(), plot_rect.topLeft())
+
+        label_width = 200.0
+        for x, label in x_axis.tick_labels():
+            painter.drawText(QRectF(x - label_width / 2, plot_rect.bottom() + 4, label_width, self.FONT_SIZE * 1.5),
+                             Qt.AlignHCenter | Qt.AlignTop, label)
+        for y, label in y_axis.tick_labels():
+            painter.drawText(QRectF(plot_rect.left() - label_width - 6, y - self.FONT_SIZE, label_width,
+                                    self.FONT_SIZE * 2),
+                             Qt.AlignRight | Qt.AlignVCenter, label)
+
+        if settings.properties['box_orientation'] == 'h' and settings.plot_type in ('bar', 'box', 'histogram'):
+            x_title = settings.layout['y_title']
+            y_title = settings.layout['x_title']
+        else:
+            x_title = settings.layout['x_title']
+            y_title = settings.layout['y_title']
+
+        if x_title:
+            painter.drawText(QRectF(plot_rect.left(), plot_rect.bottom() + self.FONT_SIZE * 2,
+                                    plot_rect.width(), self.FONT_SIZE * 2),
+                             Qt.AlignCenter, x_title)
+        if y_title:
+            painter.save()
+            painter.translate(plot_rect.left() - self.FONT_SIZE * 4.5, plot_rect.center().y())
+            painter.rotate(-90)
+            painter.drawText(QRectF(-plot_rect.height() / 2, -self.FONT_SIZE, plot_rect.height(),
+                                    self.FONT_SIZE * 2),
+                             Qt.AlignCenter, y_title)
+            painter.restore()
+
+    def render_scatter(self, trace, painter, x_axis, y_axis):
+        """
+        Renders a scatter plot trace
+        """
+        x = list(spec_value(trace, 'x', []))
+        y = list(spec_value(trace, 'y', []))
+        count = min(len(x), len(y))
+        x_axis.set_values(x[:count])
+        y_axis.set_values(y[:count])
+
+        marker = spec_value(trace, 'marker', {})
+        line = spec_value(trace, 'line', {})
+        mode = spec_value(trace, 'mode', 'markers')
+        painter.setOpacity(spec_value(trace, 'opacity', 1))
+
+        points = [QPointF(x_axis.map(x[i]), y_axis.map(y[i])) for i in range(count)]
+
+        if 'lines' in mode and count > 1:
+            # the line takes the marker color, unless markers are colored by feature
+            line_color = spec_value(marker, 'color', DEFAULT_COLORS[0])
+            if not isinstance(line_color, str):
+                line_color = DEFAULT_COLORS[0]
+            painter.setPen(QPen(QColor(line_color), spec_value(line, 'width', 2)))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawPolyline(QPolygonF(points))
+
+        if 'markers' in mode:
+            colors = self.color_list(spec_value(marker, 'color', DEFAULT_COLORS[0]), count, DEFAULT_COLORS[0])
+            sizes = self.value_list(spec_value(marker, 'size', 6), count, 6)
+            marker_line = spec_value(marker, 'line', {})
+            stroke_colors = self.color_list(spec_value(marker_line, 'color', '#444444'), count, '#444444')
+            stroke_widths = self.value_list(spec_value(marker_line, 'width', 0), count, 0)
+            for i, point in enumerate(points):
+                painter.setBrush(QBrush(colors[i]))
+                painter.setPen(QPen(stroke_colors[i], stroke_widths[i]) if stroke_widths[i] > 0 else Qt.NoPen)
+                radius = sizes[i] / 2
+                painter.drawEllipse(point, radius, radius)
+
+        painter.setOpacity(1)
+
+    def render_bars(self, painter, categories, values, horizontal, category_axis, value_axis, colors, stroke):  # pylint: disable=too-many-arguments
+        """
+        Renders a list of bars, one per category
+        """
+        bar_width = 0.8 * abs(category_axis.map(1) - category_axis.map(0)) if category_axis.categories is not None \
+            else 0.8 * abs(category_axis.end - category_axis.start) / max(len(categories), 1)
+        zero = value_axis.map(0)
+        for i, (category, value) in enumerate(zip(categories, values)):
+            center = category_axis.map(category)
+            end = value_axis.map(value)
+            if horizontal:
+                bar = QRectF(QPointF(min(zero, end), center - bar_width / 2), QPointF(max(zero, end), center + bar_width / 2))
+            else:
+                bar = QRectF(QPointF(center - bar_width / 2, min(zero, end)), QPointF(center + bar_width / 2, max(zero, end)))
+            painter.setBrush(QBrush(colors[i]))
+            painter.setPen(stroke)
+            painter.drawRect(bar)
+
+    def render_bar(self, trace, painter, x_axis, y_axis):
+        """
+        Renders a bar plot trace
+        """
+        x = list(spec_value(trace, 'x', []))
+        y = list(spec_value(trace, 'y', []))
+        count = min(len(x), len(y))
+        horizontal = spec_value(trace, 'orientation', 'v') == 'h'
+        categories, values = (y[:count], x[:count]) if horizontal else (x[:count], y[:count])
+
+        category_axis, value_axis = (y_axis, x_axis) if horizontal else (x_axis, y_axis)
+        category_axis.set_values(categories)
+        value_axis.set_values(values, include_zero=True)
+
+        marker = spec_value(trace, 'marker', {})
+        marker_line = spec_value(marker, 'line', {})
+        colors = self.color_list(spec_value(marker, 'color', DEFAULT_COLORS[0]), count, DEFAULT_COLORS[0])
+        stroke_width = spec_value(marker_line, 'width', 0)
+        stroke = QPen(QColor(spec_value(marker_line, 'color', '#444444')), stroke_width) \
+            if isinstance(stroke_width, Number) and stroke_width > 0 else QPen(Qt.NoPen)
+
+        painter.setOpacity(spec_value(trace, 'opacity', 1))
+        self.render_bars(painter, categories, values, horizontal, category_axis, value_axis, colors, stroke)
+        painter.setOpacity(1)
+
+    def render_histogram(self, settings, trace, painter, x_axis, y_axis):  # pylint: disable=too-many-locals,too-many-arguments
+        """
+        Renders a histogram trace
+        """
+        values = [v for v in settings.x if isinstance(v, Number)]
+        horizontal = spec_value(trace, 'orientation', 'v') == 'h'
+        value_axis, count_axis = (y_axis, x_axis) if horizontal else (x_axis, y_axis)
+
+        bins = settings.properties['bins'] or int(math.ceil(math.log2(max(len(values), 1)))) + 1
+        minimum = min(values) if values else 0
+        maximum = max(values) if values else 1
+        width = (maximum - minimum) / bins if maximum > minimum else 1
+        counts = [0] * bins
+        for v in values:
+            counts[min(int((v - minimum) / width), bins - 1)] += 1
+
+        if settings.properties['cumulative']:
+            if settings.properties['invert_hist'] == 'decreasing':
+                counts = [sum(counts[i:]) for i in range(bins)]
+            else:
+                counts = [sum(counts[:i + 1]) for i in range(bins)]
+        if settings.properties['normalization'] in ('probability', 'percent') and values:
+            factor = 100.0 if settings.properties['normalization'] == 'percent' else 1.0
+            counts = [c * factor / len(values) for c in counts]
+
+        edges = [minimum + i * width for i in range(bins + 1)]
+        value_axis.set_values(edges)
+        count_axis.set_values(counts, include_zero=True)
+
+        marker = spec_value(trace, 'marker', {})
+        marker_line = spec_value(marker, 'line', {})
+        color = QColor(spec_value(marker, 'color', DEFAULT_COLORS[0]))
+        stroke_width = spec_value(marker_line, 'width', 0)
+        stroke = QPen(QColor(spec_value(marker_line, 'color', '#444444')), stroke_width) \
+            if isinstance(stroke_width, Number) and stroke_width > 0 else QPen(Qt.NoPen)
+
+        painter.setOpacity(spec_value(trace, 'opacity', 1))
+        painter.setBrush(QBrush(color))
+        painter.setPen(stroke)
+        zero = count_axis.map(0)
+        for i, count in enumerate(counts):
+            start = value_axis.map(edges[i])
+            end = value_axis.map(edges[i + 1])
+            top = count_axis.map(count)
+            if horizontal:
+                painter.drawRect(QRectF(QPointF(min(zero, top), min(start, end)), QPointF(max(zero, top), max(start, end))))
+            else:
+                painter.drawRect(QRectF(QPointF(min(start, end), min(zero, top)), QPointF(max(start, end), max(zero, top))))
+        painter.setOpacity(1)
+
+    def render_box(self, trace, painter, x_axis, y_axis):  # pylint: disable=too-many-locals
+        """
+        Renders a box plot trace
+        """
+        horizontal = spec_value(trace, 'orientation', 'v') == 'h'
+        x = list(spec_value(trace, 'x', []))
+        y = list(spec_value(trace, 'y', []))
+        groups, values = (y, x) if horizontal else (x, y)
+        values = [v for v in values if isinstance(v, Number)]
+        if not groups or len(groups) != len(values):
+            groups = [spec_value(trace, 'name', '') or ''] * len(values)
+
+        grouped = OrderedDict()
+        for group, value in zip(groups, values):
+            grouped.setdefault(group, []).append(value)
+
+        group_axis, value_axis = (y_axis, x_axis) if horizontal else (x_axis, y_axis)
+        group_axis.set_values(list(grouped.keys()))
+        value_axis.set_values(values)
+
+        fill = QColor(spec_value(trace, 'fillcolor', DEFAULT_COLORS[0]))
+        line = spec_value(trace, 'line', {})
+        pen = QPen(QColor(spec_value(line, 'color', DEFAULT_COLORS[0])), spec_value(line, 'width', 2))
+        # as plotly does, boxes are half as wide as the (smallest) spacing between groups
+        spacing = 1
+        if group_axis.categories is None and len(grouped) > 1:
+            positions = sorted(grouped.keys())
+            spacing = min(b - a for a, b in zip(positions, positions[1:]))
+        box_width = 0.5 * spacing * group_axis.unit_length()
+
+        painter.setOpacity(spec_value(trace, 'opacity', 1))
+        for group, group_values in grouped.items():
+            group_values.sort()
+            q1 = quantile(group_values, 0.25)
+            median = quantile(group_values, 0.5)
+            q3 = quantile(group_values, 0.75)
+            iqr = q3 - q1
+            low = min(v for v in group_values if v >= q1 - 1.5 * iqr)
+            high = max(v for v in group_values if v <= q3 + 1.5 * iqr)
+
+            center = group_axis.map(group)
+
+            def point(position, value, center=center):
+                value = value_axis.map(value)
+                return QPointF(value, center + position) if horizontal else QPointF(center + position, value)
+
+            painter.setPen(pen)
+            painter.setBrush(QBrush(fill))
+            painter.drawRect(QRectF(point(-box_width / 2, q1), point(box_width / 2, q3)).normalized())
+            painter.drawLine(point(-box_width / 2, median), point(box_width / 2, median))
+            painter.drawLine(point(0, q1), point(0, low))
+            painter.drawLine(point(0, q3), point(0, high))
+            painter.drawLine(point(-box_width / 4, low), point(box_width / 4, low))
+            painter.drawLine(point(-box_width / 4, high), point(box_width / 4, high))
+        painter.setOpacity(1)
+
+    def render_pie(self, trace, painter, plot_rect):
+        """
+        Renders a pie chart trace
+        """
+        labels = list(spec_value(trace, 'labels', []))
+        values = list(spec_value(trace, 'values', []))
+
+        # as plotly does, values with the same label are summed
+        sums = OrderedDict()
+        for label, value in zip(labels, values):
+            if isinstance(value, Number) and value > 0:
+                sums[str(label)] = sums.get(str(label), 0) + value
+        total = sum(sums.values())
+        if not total:
+            return
+
+        size = min(plot_rect.width(), plot_rect.height())
+        pie_rect = QRectF(plot_rect.center().x() - size / 2, plot_rect.center().y() - size / 2, size, size)
+
+        font = QFont()
+        font.setPixelSize(self.FONT_SIZE)
+        painter.setFont(font)
+
+        # plotly sorts slices by value and draws them clockwise from 12 o'clock
+        start = 90 * 16
+        for i, (label, value) in enumerate(sorted(sums.items(), key=lambda item: -item[1])):
+            span = -int(round(value / total * 360 * 16))
+            painter.setPen(QPen(QColor('#ffffff'), 1))
+            painter.setBrush(QBrush(QColor(DEFAULT_COLORS[i % len(DEFAULT_COLORS)])))
+            painter.drawPie(pie_rect, start, span)
+
+            middle = math.radians((start + span / 2) / 16)
+            label_pos = QPointF(pie_rect.center().x() + math.cos(middle) * size * 0.35,
+                                pie_rect.center().y() - math.sin(middle) * size * 0.35)
+            painter.setPen(QColor('#ffffff'))
+            painter.drawText(QRectF(label_pos.x() - 50, label_pos.y() - self.FONT_SIZE, 100, self.FONT_SIZE * 2),
+                             Qt.AlignCenter, '{:.1f}%'.format(100 * value / total))
+            start += span
+
+        legend_top = plot_rect.top()
+        for i, label in enumerate(sorted(sums, key=lambda name: -sums[name])):
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QBrush(QColor(DEFAULT_COLORS[i % len(DEFAULT_COLORS)])))
+            painter.drawRect(QRectF(plot_rect.right() + 10, legend_top + i * self.FONT_SIZE * 1.6,
+                                    self.FONT_SIZE, self.FONT_SIZE))
+            painter.setPen(QColor('#444444'))
+            painter.drawText(QPointF(plot_rect.right() + 14 + self.FONT_SIZE,
+                                     legend_top + i * self.FONT_SIZE * 1.6 + self.FONT_SIZE * 0.9), label)
+
+
+def quantile(sorted_values, fraction):
+    """
+    Returns the (linearly interpolated) quantile of a sorted list of values
+    """
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+# registry of available static renderers
+STATIC_RENDERERS = {
+    'qpainter': QPainterRenderer
+}
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Plots arranged in a grid of subplots
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.core.overlay_figure import OverlayFigure
+
+
+class SubplotGrid(OverlayFigure):
+    """
+    Composes the plots of several factories in a grid of rows x columns subplots.
+
+    Plots fill the cells row by row, and each cell may show any plot type: cartesian
+    plots get their own x and y axes (or axes shared by the cells of a column or row),
+    pie plots are placed in the domain of their cell, and ternary and polar plots in a
+    ternary or polar subplot of their cell. Plots beyond the last cell are not shown.
+
+    The cell domains and axes are computed once for the grid shape. As traces only
+    refer to the axes or subplot of their cell, and the grid layout is sent along
+    with the changed traces, a shown grid is updated incrementally like an overlay
+    figure (see OverlayFigure.update_script), even when cells are added.
+    """
+
+    # trace types which are not drawn on cartesian axes -> their subplot layout key
+    SUBPLOT_TYPES = {
+        'scatterternary': 'ternary',
+        'scatterpolar': 'polar'
+    }
+
+    # layout keys which are set for each cell instead of for the whole figure
+    CELL_LAYOUT_KEYS = ('xaxis', 'yaxis', 'ternary', 'polar')
+
+    def __init__(self, rows: int = 1, columns: int = 1, shared_xaxes: bool = False,  # pylint: disable=too-many-arguments
+                 shared_yaxes: bool = False, horizontal_spacing: float = None, vertical_spacing: float = None):
+        super().__init__()
+        self.shared_xaxes = shared_xaxes
+        self.shared_yaxes = shared_yaxes
+        self.horizontal_spacing = horizontal_spacing
+        self.vertical_spacing = vertical_spacing
+        self.rows = 0
+        self.columns = 0
+        # (x domain, y domain) of each cell, row by row
+        self.domains = []
+        self.set_shape(rows, columns)
+
+    def set_shape(self, rows: int, columns: int):
+        """
+        Sets the number of rows and columns of the grid, computing the cell domains
+
+        The spacing between cells defaults to the one of plotly's make_subplots.
+        """
+        self.rows = max(1, rows)
+        self.columns = max(1, columns)
+        horizontal_spacing = 0.2 / self.columns if self.horizontal_spacing is None else self.horizontal_spacing
+        vertical_spacing = 0.3 / self.rows if self.vertical_spacing is None else self.vertical_spacing
+
+        width = (1 - horizontal_spacing * (self.columns - 1)) / self.columns
+        height = (1 - vertical_spacing * (self.rows - 1)) / self.rows
+        self.domains = []
+        for row in range(self.rows):
+            top = 1 - row * (height + vertical_spacing)
+            for column in range(self.columns):
+                left = column * (width + horizontal_spacing)
+                self.domains.append(([left, left + width], [top - height, top]))
+
+    def cell_count(self) -> int:
+        """
+        Returns the number of cells of the grid
+        """
+        return self.rows * self.columns
+
+    def axis_ids(self, index: int) -> tuple:
+        """
+        Returns the number of the x and y axes of the cartesian plot in a cell
+        """
+        row, column = divmod(index, self.columns)
+        x_id = column + 1 if self.shared_xaxes else index + 1
+        y_id = row + 1 if self.shared_yaxes else index + 1
+        return x_id, y_id
+
+    @staticmethod
+    def axis_name(letter: str, axis_id: int) -> str:
+        """
+        Returns the name of an axis as referenced by traces, e.g. 'x' or 'y2'
+        """
+        return letter if axis_id == 1 else '{}{}'.format(letter, axis_id)
+
+    @staticmethod
+    def axis_layout_key(letter: str, axis_id: int) -> str:
+        """
+        Returns the layout key of an axis, e.g. 'xaxis' or 'yaxis2'
+        """
+        return '{}axis'.format(letter) if axis_id == 1 else '{}axis{}'.format(letter, axis_id)
+
+    @staticmethod
+    def subplot_name(name: str, index: int) -> str:
+        """
+        Returns the name of a ternary or polar subplot of a cell, e.g. 'ternary' or 'polar3'
+        """
+        return name if index == 0 else '{}{}'.format(name, index + 1)
+
+    @staticmethod
+    def trace_type(trace) -> str:
+        """
+        Returns the type of a trace
+        """
+        return FigureSerializer.to_json_value(trace).get('type', 'scatter')
+
+    def placement(self, index: int, trace) -> dict:
+        if index >= self.cell_count():
+            return {'visible': False}
+
+        trace_type = self.trace_type(trace)
+        if trace_type == 'pie':
+            x_domain, y_domain = self.domains[index]
+            return {'domain': {'x': x_domain, 'y': y_domain}}
+        if trace_type in self.SUBPLOT_TYPES:
+            return {'subplot': self.subplot_name(self.SUBPLOT_TYPES[trace_type], index)}
+
+        x_id, y_id = self.axis_ids(index)
+        return {'xaxis': self.axis_name('x', x_id), 'yaxis': self.axis_name('y', y_id)}
+
+    def grid_layout(self, traces, layouts) -> dict:
+        """
+        Returns the layout of a grid showing traces, where layouts are the layouts of
+        the plots of the traces (or None)
+
+        The figure settings (e.g. title or legend) are merged from the layouts like for
+        overlaid plots, while the axes, ternary and polar settings of each plot are set
+        for the axes or subplot of its cell.
+        """
+        layout = {}
+        for plot_layout in layouts:
+            if plot_layout is not None:
+                layout.update(FigureSerializer.to_json_value(plot_layout))
+        for key in self.CELL_LAYOUT_KEYS:
+            layout.pop(key, None)
+
+        # the cells showing cartesian plots, which have axes
+        cartesian = [index for index, trace in enumerate(traces[:self.cell_count()])
+                     if self.trace_type(trace) != 'pie' and self.trace_type(trace) not in self.SUBPLOT_TYPES]
+
+        for index, (trace, plot_layout) in enumerate(zip(traces[:self.cell_count()], layouts)):
+            plot_layout = FigureSerializer.to_json_value(plot_layout) if plot_layout is not None else {}
+            trace_type = self.trace_type(trace)
+            x_domain, y_domain = self.domains[index]
+
+            if trace_type == 'pie':
+                continue
+            if trace_type in self.SUBPLOT_TYPES:
+                name = self.SUBPLOT_TYPES[trace_type]
+                subplot = dict(FigureSerializer.to_json_value(plot_layout.get(name) or {}))
+                subplot['domain'] = {'x': x_domain, 'y': y_domain}
+                layout[self.subplot_name(name, index)] = subplot
+                continue
+
+            row, column = divmod(index, self.columns)
+            x_id, y_id = self.axis_ids(index)
+            x_axis = dict(FigureSerializer.to_json_value(plot_layout.get('xaxis') or {}))
+            y_axis = dict(FigureSerializer.to_json_value(plot_layout.get('yaxis') or {}))
+
+            # shared axes span the column (or row), and are drawn along its lowest (or leftmost)
+            # cartesian plot, as empty cells and other plot types have no axes to anchor to
+            x_anchor = max(i for i in cartesian if i % self.columns == column) if self.shared_xaxes else index
+            y_anchor = min(i for i in cartesian if i // self.columns == row) if self.shared_yaxes else index
+            x_axis['domain'] = x_domain
+            x_axis['anchor'] = self.axis_name('y', self.axis_ids(x_anchor)[1])
+            y_axis['domain'] = y_domain
+            y_axis['anchor'] = self.axis_name('x', self.axis_ids(y_anchor)[0])
+
+            layout[self.axis_layout_key('x', x_id)] = x_axis
+            layout[self.axis_layout_key('y', y_id)] = y_axis
+        return layout
+
+    def figure_layout(self, factories) -> dict:
+        return self.grid_layout([factory.trace[0] for factory in factories.values()],
+                                [factory.layout for factory in factories.values()])
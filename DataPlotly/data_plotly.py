@@ -143,6 +143,7 @@ class DataPlotly:  # pylint: disable=too-many-instance-attributes
         self.menu = None
         self.toolbar.deleteLater()
         self.toolbar = None
+        self.dock_widget.main_panel.dispose_plot_factories()
 
         # Remove processing provider
         QgsApplication.processingRegistry().removeProvider(self.provider)
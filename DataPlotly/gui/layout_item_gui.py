@@ -9,6 +9,10 @@ the Free Software Foundation; either version 2 of the License, or
 
 from qgis.PyQt.QtCore import QCoreApplication
 from qgis.PyQt.QtWidgets import (
+    QCheckBox,
+    QComboBox,
+    QHBoxLayout,
+    QLabel,
     QPushButton,
     QVBoxLayout
 )
@@ -40,6 +44,23 @@ class PlotLayoutItemWidget(QgsLayoutItemBaseWidget):
         vl.addWidget(self.plot_properties_button)
         self.plot_properties_button.clicked.connect(self.show_properties)
 
+        self.prefetch_atlas_check = QCheckBox(self.tr('Prefetch features for all atlas pages'))
+        self.prefetch_atlas_check.setToolTip(
+            self.tr('Loads the plot values once for the whole atlas, instead of querying the layer on each page'))
+        self.prefetch_atlas_check.setChecked(self.plot_item.prefetch_atlas)
+        vl.addWidget(self.prefetch_atlas_check)
+        self.prefetch_atlas_check.toggled.connect(self.prefetch_atlas_toggled)
+
+        renderer_layout = QHBoxLayout()
+        renderer_layout.addWidget(QLabel(self.tr('Rendering')))
+        self.renderer_combo = QComboBox()
+        self.renderer_combo.addItem(self.tr('Web Engine'), '')
+        self.renderer_combo.addItem(self.tr('Native (Scatter, Bar, Histogram, Box and Pie Plots)'), 'qpainter')
+        self.renderer_combo.setCurrentIndex(self.renderer_combo.findData(self.plot_item.static_renderer))
+        renderer_layout.addWidget(self.renderer_combo, 1)
+        vl.addLayout(renderer_layout)
+        self.renderer_combo.currentIndexChanged.connect(self.renderer_changed)
+
         self.panel = None
         self.setPanelTitle(self.tr('Plot Properties'))
         self.item_properties_widget = QgsLayoutItemPropertiesWidget(self, layout_object)
@@ -111,6 +132,21 @@ class PlotLayoutItemWidget(QgsLayoutItemBaseWidget):
         self.plot_item.filter_by_atlas = bool(value)
         self.plot_item.update()
 
+    def prefetch_atlas_toggled(self, value):
+        """
+        Triggered when the prefetch atlas option is toggled
+        """
+        self.plot_item.prefetch_atlas = bool(value)
+        self.plot_item.update()
+
+    def renderer_changed(self):
+        """
+        Triggered when the static renderer is changed
+        """
+        self.plot_item.static_renderer = self.renderer_combo.currentData()
+        self.plot_item.invalidateCache()
+        self.plot_item.update()
+
     def linked_map_changed(self, linked_map):
         """
         Triggered when the linked map is changed
@@ -125,6 +161,14 @@ class PlotLayoutItemWidget(QgsLayoutItemBaseWidget):
         self.plot_item = item
         self.item_properties_widget.setItem(item)
 
+        self.prefetch_atlas_check.blockSignals(True)
+        self.prefetch_atlas_check.setChecked(item.prefetch_atlas)
+        self.prefetch_atlas_check.blockSignals(False)
+
+        self.renderer_combo.blockSignals(True)
+        self.renderer_combo.setCurrentIndex(self.renderer_combo.findData(item.static_renderer))
+        self.renderer_combo.blockSignals(False)
+
         if self.panel is not None:
             self.panel.set_settings(self.plot_item.plot_settings)
 
@@ -22,6 +22,7 @@
 """
 
 import json
+import time
 from collections import OrderedDict
 from shutil import copyfile
 from functools import partial
@@ -29,6 +30,7 @@ from functools import partial
 from qgis.PyQt import uic
 from qgis.PyQt.QtWidgets import (
     QListWidgetItem,
+    QPushButton,
     QVBoxLayout,
     QFileDialog,
     QMenu
@@ -52,7 +54,6 @@ from qgis.PyQt.QtWebKitWidgets import (
 )
 
 from qgis.core import (
-    Qgis,
     QgsNetworkAccessManager,
     QgsFeatureRequest,
     QgsMapLayerProxyModel,
@@ -61,7 +62,8 @@ from qgis.core import (
     QgsReferencedRectangle,
     QgsExpressionContextGenerator,
     QgsPropertyCollection,
-    QgsLayoutItemRegistry
+    QgsLayoutItemRegistry,
+    QgsSettings
 )
 from qgis.gui import (
     QgsPanelWidget,
@@ -70,9 +72,13 @@ from qgis.gui import (
 )
 from qgis.utils import iface
 
+from DataPlotly.core.overlay_figure import OverlayFigure
 from DataPlotly.core.plot_factory import PlotFactory
 from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.sampling import FeatureSampler
+from DataPlotly.core.subplot_grid import SubplotGrid
 from DataPlotly.gui.gui_utils import GuiUtils
+from DataPlotly.gui.plot_streamer import PlotStreamer
 
 WIDGET, _ = uic.loadUiType(GuiUtils.get_ui_file_path('dataplotly_dockwidget_base.ui'))
 
@@ -182,6 +188,7 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         self.plot_combo.currentIndexChanged.connect(self.refreshWidgets)
         self.plot_combo.currentIndexChanged.connect(self.helpPage)
         self.subcombo.currentIndexChanged.connect(self.refreshWidgets2)
+        self.radio_grid.toggled.connect(self.refreshWidgets2)
         self.marker_type_combo.currentIndexChanged.connect(self.refreshWidgets3)
 
         self.mGroupBox_2.collapsedStateChanged.connect(self.refreshWidgets)
@@ -189,6 +196,15 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         # fill the layer combobox with vector layers
         self.layer_combo.setFilters(QgsMapLayerProxyModel.VectorLayer)
 
+        # sampling of the plotted features
+        self.sample_mode_combo.addItem(self.tr('All features'), FeatureSampler.MODE_NONE)
+        self.sample_mode_combo.addItem(self.tr('Random sample of fixed size'), FeatureSampler.MODE_COUNT)
+        self.sample_mode_combo.addItem(self.tr('Random fraction of features'), FeatureSampler.MODE_FRACTION)
+        self.sample_mode_combo.addItem(self.tr('Stratified sample (fixed size per category)'), FeatureSampler.MODE_STRATIFIED)
+        self.sample_mode_combo.currentIndexChanged.connect(self.update_sampling_widgets)
+        self.sample_seed_spin.setSpecialValueText(self.tr('Not set'))
+        self.update_sampling_widgets()
+
         # connect the combo boxes to the setLegend function
         self.x_combo.fieldChanged.connect(self.setLegend)
         self.y_combo.fieldChanged.connect(self.setLegend)
@@ -228,6 +244,18 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         plot_view_settings.setAttribute(QWebSettings.Accelerated2dCanvasEnabled, True)
         self.layoutw.addWidget(self.plot_view)
 
+        # plots of large layers are shown progressively, and can be canceled while fetching
+        self.plot_streamer = None
+        self.cancel_streaming_btn = QPushButton(self.tr('Cancel'))
+        self.cancel_streaming_btn.setVisible(False)
+        self.cancel_streaming_btn.clicked.connect(self.cancel_streaming)
+        self.layoutw.insertWidget(0, self.cancel_streaming_btn)
+
+        # performance stats of the shown plot, completed with the view load time
+        self.diagnostics_factory = None
+        self.view_load_start = None
+        self.plot_view.loadFinished.connect(self.plot_view_loaded)
+
         # get the plot type from the combobox
         self.ptype = self.plot_combo.currentData()
 
@@ -257,6 +285,17 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
 
         self.pid = None
         self.plot_path = None
+        # True when raw_plot_text doesn't show the html of the current plot yet
+        self.raw_plot_text_stale = False
+        # figures of overlaid plots (the 'single' plot mode with several plots) and of subplots,
+        # which are updated in the view once shown and loaded (see show_figure)
+        self.overlay = OverlayFigure()
+        self.subplot_grid = SubplotGrid()
+        # the figure shown in the view, if any
+        self.shown_figure = None
+        self.figure_loaded = False
+        # True when the html file of the shown figure is outdated
+        self.figure_file_stale = False
         self.plot_url = None
         self.plot_file = None
 
@@ -293,6 +332,8 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         elif row > 1:
             self.stackedPlotWidget.setCurrentIndex(row - 1)
 
+        self.load_raw_plot_text()
+
     def registerExpressionContextGenerator(self, generator: QgsExpressionContextGenerator):
         """
         Register the panel's expression context generator with all relevant children
@@ -301,6 +342,7 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         self.y_combo.registerExpressionContextGenerator(generator)
         self.z_combo.registerExpressionContextGenerator(generator)
         self.additional_info_combo.registerExpressionContextGenerator(generator)
+        self.sample_field_combo.registerExpressionContextGenerator(generator)
 
         buttons = self.findChildren(QgsPropertyOverrideButton)
         for button in buttons:
@@ -385,6 +427,20 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
             self.color_scale_data_defined_in_check.setVisible(False)
             self.color_scale_data_defined_in_invert_check.setVisible(False)
 
+    def update_sampling_widgets(self):
+        """
+        Shows the sampling widgets relevant to the current sampling mode
+        """
+        mode = self.sample_mode_combo.currentData()
+        for widget in (self.sample_size_label, self.sample_size_spin):
+            widget.setVisible(mode in (FeatureSampler.MODE_COUNT, FeatureSampler.MODE_STRATIFIED))
+        for widget in (self.sample_fraction_label, self.sample_fraction_spin):
+            widget.setVisible(mode == FeatureSampler.MODE_FRACTION)
+        for widget in (self.sample_field_label, self.sample_field_combo):
+            widget.setVisible(mode == FeatureSampler.MODE_STRATIFIED)
+        for widget in (self.sample_seed_label, self.sample_seed_spin):
+            widget.setVisible(mode != FeatureSampler.MODE_NONE)
+
     def selected_layer_changed(self, layer):
         """
         Trigger actions after selected layer changes
@@ -393,6 +449,7 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         self.y_combo.setLayer(layer)
         self.z_combo.setLayer(layer)
         self.additional_info_combo.setLayer(layer)
+        self.sample_field_combo.setLayer(layer)
 
         buttons = self.findChildren(QgsPropertyOverrideButton)
         for button in buttons:
@@ -402,8 +459,9 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         """
         Triggered when a layer is about to be removed
         """
-        self.plot_factories = {k: v for k, v in self.plot_factories.items() if
-                               not v.source_layer or v.source_layer.id() != layer_id}
+        for pid, factory in list(self.plot_factories.items()):
+            if factory.source_layer and factory.source_layer.id() == layer_id:
+                self.plot_factories.pop(pid).dispose()
 
     def getJSmessage(self, status):
         """
@@ -438,6 +496,10 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
                 else:
                     self.layer_combo.currentLayer().selectByIds(dic['tid'])
 
+            # if a point is hovered in a plot with hover text evaluated on demand
+            elif dic['mode'] == 'hover':
+                self.show_hover_text(dic)
+
             # if a clicking event is performed depending on the plot type
             elif dic["mode"] == 'clicking':
                 if dic['type'] == 'scatter':
@@ -468,6 +530,22 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         except:  # pylint: disable=bare-except # noqa: F401
             pass
 
+    def show_hover_text(self, hover: dict):
+        """
+        Evaluates the hover text of a hovered feature and passes it to the plot view,
+        for plots whose hover text is evaluated on demand (see PlotFactory.hover_text_callback)
+
+        The curve number of the hovered point matches the order of the plot factories,
+        as each factory adds a single trace to the figure
+        """
+        text = None
+        factories = list(self.plot_factories.values())
+        if hover['curve'] < len(factories):
+            text = factories[hover['curve']].hover_label(hover['point'])
+
+        self.plot_view.page().mainFrame().evaluateJavaScript(
+            'dataplotlyShowHoverText({}, {})'.format(json.dumps(hover['key']), json.dumps(text)))
+
     def helpPage(self):
         """
         change the page of the manual according to the plot type selected and
@@ -493,12 +571,14 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         just reload the plot view controlling the check state
         """
         if self.live_update_check.isChecked():
-            self.plot_view.reload()
+            self.reloadPlotCanvas2()
 
     def reloadPlotCanvas2(self):
         """
         just reload the plot view
         """
+        self.write_stale_figure()
+        self.figure_loaded = False
         self.plot_view.reload()
 
     def refreshListWidget(self):
@@ -814,20 +894,21 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
 
     def refreshWidgets2(self):
         """
-        just refresh the UI to make the radiobuttons visible when SubPlots
+        just refresh the UI to make the radiobuttons and grid settings visible when SubPlots
         """
 
-        # enable radio buttons for subplots
-        if self.subcombo.currentData() == 'subplots':
-            self.radio_rows.setEnabled(True)
-            self.radio_rows.setVisible(True)
-            self.radio_columns.setEnabled(True)
-            self.radio_columns.setVisible(True)
-        else:
-            self.radio_rows.setEnabled(False)
-            self.radio_rows.setVisible(False)
-            self.radio_columns.setEnabled(False)
-            self.radio_columns.setVisible(False)
+        # enable radio buttons and grid settings for subplots
+        subplots = self.subcombo.currentData() == 'subplots'
+        for widget in (self.radio_rows, self.radio_columns, self.radio_grid,
+                       self.shared_xaxes_check, self.shared_yaxes_check):
+            widget.setEnabled(subplots)
+            widget.setVisible(subplots)
+
+        # the number of rows and columns is only set for grids
+        for widget in (self.subplot_rows_label, self.subplot_rows_spin,
+                       self.subplot_columns_label, self.subplot_columns_spin):
+            widget.setEnabled(subplots and self.radio_grid.isChecked())
+            widget.setVisible(subplots)
 
     def refreshWidgets3(self):
         """
@@ -922,7 +1003,12 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
                            'point_combo': self.point_combo.currentText(),
                            'line_combo': self.line_combo.currentText(),
                            'contour_type_combo': self.contour_type_combo.currentText(),
-                           'show_lines_check': self.show_lines_check.isChecked()
+                           'show_lines_check': self.show_lines_check.isChecked(),
+                           'sample_mode': self.sample_mode_combo.currentData(),
+                           'sample_size': self.sample_size_spin.value(),
+                           'sample_fraction': self.sample_fraction_spin.value(),
+                           'sample_field': self.sample_field_combo.expression(),
+                           'sample_seed': self.sample_seed_spin.value() if self.sample_seed_spin.value() else None
                            }
 
         if self.in_color_defined_button.isActive():
@@ -980,6 +1066,12 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         self.set_layer_id(settings.source_layer_id)
         self.selected_feature_check.setChecked(settings.properties.get('selected_features_only', False))
         self.visible_feature_check.setChecked(settings.properties.get('visible_features_only', False))
+        self.sample_mode_combo.setCurrentIndex(
+            self.sample_mode_combo.findData(settings.properties.get('sample_mode', FeatureSampler.MODE_NONE)))
+        self.sample_size_spin.setValue(settings.properties.get('sample_size', 1000))
+        self.sample_fraction_spin.setValue(settings.properties.get('sample_fraction', 0.1))
+        self.sample_field_combo.setExpression(settings.properties.get('sample_field', ''))
+        self.sample_seed_spin.setValue(settings.properties.get('sample_seed', None) or 0)
 
         self.data_defined_properties = settings.data_defined_properties
         buttons = self.findChildren(QgsPropertyOverrideButton)
@@ -1033,9 +1125,11 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         self.bar_gap.setValue(settings.layout['bargaps'])
         self.show_legend_check.setChecked(settings.layout['legend'])
 
-    def create_plot_factory(self) -> PlotFactory:
+    def create_plot_factory(self, build: bool = True) -> PlotFactory:
         """
         Creates a PlotFactory based on the settings defined in the dialog
+
+        If build is False, the plot is not built by the factory (see PlotFactory.rebuild_in_chunks)
         """
         settings = self.get_settings()
 
@@ -1044,8 +1138,13 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
             visible_region = QgsReferencedRectangle(self.iface.mapCanvas().extent(),
                                                     self.iface.mapCanvas().mapSettings().destinationCrs())
 
+        # the hover text of large layers can be evaluated when features are hovered, instead of for every feature,
+        # and so are the labels of plot types which format them from the plotted values
+        hover_on_demand = QgsSettings().value('dataplotly/hover_on_demand', False, bool) or \
+            PlotFactory.PLOT_TYPES[settings.plot_type].builds_hover_labels()
+
         # plot instance
-        plot_factory = PlotFactory(settings, visible_region=visible_region)
+        plot_factory = PlotFactory(settings, visible_region=visible_region, build=build, hover_on_demand=hover_on_demand)
 
         # unique name for each plot trace (name is idx_plot, e.g. 1_scatter)
         self.pid = ('{}_{}'.format(str(self.idx), settings.plot_type))
@@ -1076,6 +1175,11 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         """
         Refreshes the plot built by the specified factory
         """
+        self.diagnostics_factory = factory
+        if self.shown_figure is not None and factory in self.plot_factories.values():
+            self.show_figure(self.shown_figure)
+            return
+
         self.plot_path = factory.build_figure()
         self.refreshPlotView()
 
@@ -1087,8 +1191,14 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         to create the plot instance with all the properties taken from the UI
         """
 
+        self.cancel_streaming()
+
+        # a single plot of a large layer is shown progressively
+        stream = self.subcombo.currentData() == 'single' and not self.plot_factories and self.use_streaming()
+
         # call the method to build all the Plot plotProperties
-        plot_factory = self.create_plot_factory()
+        plot_factory = self.create_plot_factory(build=not stream)
+        self.diagnostics_factory = plot_factory
 
         # set the correct index page of the widget
         self.stackedPlotWidget.setCurrentIndex(1)
@@ -1097,48 +1207,136 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
 
         if self.subcombo.currentData() == 'single':
 
+            if stream:
+                self.stream_plot(plot_factory)
+                return
+
             # plot single plot, check the object dictionary length
             if len(self.plot_factories) <= 1:
                 self.plot_path = plot_factory.build_figure()
 
             # to plot many plots in the same figure
             else:
-                # plot list ready to be called within go.Figure
-                pl = []
-
-                for _, v in self.plot_factories.items():
-                    pl.append(v.trace[0])
-
-                self.plot_path = plot_factory.build_figures(self.ptype, pl)
+                self.show_figure(self.overlay)
+                return
 
         # choice to draw subplots instead depending on the combobox
         elif self.subcombo.currentData() == 'subplots':
-            try:
-                gr = len(self.plot_factories)
-                pl = []
-
-                for _, v in self.plot_factories.items():
-                    pl.append(v.trace[0])
+            gr = len(self.plot_factories)
 
-                # plot in single row and many columns
-                if self.radio_rows.isChecked():
+            # plot in single row and many columns
+            if self.radio_rows.isChecked():
+                self.subplot_grid.set_shape(1, gr)
 
-                    self.plot_path = plot_factory.build_sub_plots('row', 1, gr, pl)
+            # plot in a grid of rows x columns, plots beyond the last cell aren't shown
+            elif self.radio_grid.isChecked():
+                self.subplot_grid.set_shape(self.subplot_rows_spin.value(), self.subplot_columns_spin.value())
 
-                # plot in single column and many rows
-                elif self.radio_columns.isChecked():
+            # plot in single column and many rows
+            else:
+                self.subplot_grid.set_shape(gr, 1)
 
-                    self.plot_path = plot_factory.build_sub_plots('col', gr, 1, pl)
-            except:  # pylint: disable=bare-except  # noqa: F401
-                if self.message_bar:
-                    self.message_bar.pushMessage(
-                        self.tr("{} plot is not compatible for subplotting\n see ".format(self.ptype)),
-                        Qgis.MessageLevel(2), duration=5)
-                return
+            self.subplot_grid.shared_xaxes = self.shared_xaxes_check.isChecked()
+            self.subplot_grid.shared_yaxes = self.shared_yaxes_check.isChecked()
+            self.show_figure(self.subplot_grid)
+            return
 
         # connect to simple function that reloads the view
         self.refreshPlotView()
 
+    def show_figure(self, figure: OverlayFigure):
+        """
+        Shows the plots of all factories in a figure (overlaid or in subplots)
+
+        If the figure is already shown, only the traces which were added, removed or
+        rebuilt are updated in the view, instead of loading the whole figure again
+        """
+        if self.figure_loaded and figure is self.shown_figure:
+            self.plot_view.page().mainFrame().evaluateJavaScript(figure.update_script(self.plot_factories))
+            self.figure_file_stale = True
+            self.refresh_raw_plot_text()
+            return
+
+        self.figure_file_stale = False
+        self.plot_path = figure.build(self.plot_factories)
+        self.refreshPlotView(figure)
+
+    def write_stale_figure(self):
+        """
+        Writes the html of the shown figure again, if it was updated in the view since
+        the html was written
+        """
+        if self.figure_file_stale:
+            self.figure_file_stale = False
+            self.plot_path = self.shown_figure.build(self.plot_factories)
+
+    def reset_figure(self):
+        """
+        Forgets the figure shown in the view, when another plot (or none) is shown
+        """
+        if self.shown_figure is not None:
+            self.shown_figure.clear()
+        self.shown_figure = None
+        self.figure_loaded = False
+        self.figure_file_stale = False
+
+    def use_streaming(self) -> bool:
+        """
+        Returns True if the plot of the current layer should be shown progressively
+        """
+        layer = self.layer_combo.currentLayer()
+        if not layer:
+            return False
+        threshold = QgsSettings().value('dataplotly/streaming_threshold', 100000, int)
+        return layer.featureCount() >= threshold
+
+    def stream_plot(self, factory: PlotFactory):
+        """
+        Progressively shows the plot of the specified factory while its values are fetched
+        """
+        chunk_size = QgsSettings().value('dataplotly/streaming_chunk_size', 20000, int)
+        self.plot_streamer = PlotStreamer(factory, self.plot_view, chunk_size, self)
+        self.plot_streamer.preview_ready.connect(self.show_streamed_preview)
+        self.plot_streamer.progress.connect(self.streaming_progress)
+        self.plot_streamer.finished.connect(partial(self.streaming_finished, factory))
+        self.cancel_streaming_btn.setText(self.tr('Cancel'))
+        self.cancel_streaming_btn.setVisible(True)
+        self.plot_streamer.start()
+
+    def show_streamed_preview(self, plot_path: str):
+        """
+        Shows the preview of a progressively built plot
+        """
+        self.plot_path = plot_path
+        self.refreshPlotView()
+
+    def streaming_progress(self, count: int):
+        """
+        Shows the number of features fetched for a progressively built plot
+        """
+        self.cancel_streaming_btn.setText(self.tr('Cancel ({} features fetched)').format(count))
+
+    def streaming_finished(self, factory: PlotFactory, _):
+        """
+        Triggered when all values of a progressively built plot are fetched, or fetching was canceled
+        """
+        self.plot_streamer = None
+        self.cancel_streaming_btn.setVisible(False)
+
+        self.plot_path = factory.build_figure()
+        if factory.trace_update(0, 0) is None:
+            # the plot type can't be extended, so the view shows the preview only
+            self.refreshPlotView()
+        else:
+            self.refresh_raw_plot_text()
+
+    def cancel_streaming(self):
+        """
+        Stops fetching the values of a progressively built plot
+        """
+        if self.plot_streamer:
+            self.plot_streamer.cancel()
+
     def UpdatePlot(self):
         """
         updates only the LAST plot created
@@ -1147,40 +1345,100 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
         """
         if self.mode == DataPlotlyPanelWidget.MODE_CANVAS:
             plot_to_update = (sorted(self.plot_factories.keys())[-1])
-            del self.plot_factories[plot_to_update]
+            self.plot_factories.pop(plot_to_update).dispose()
 
             self.create_plot()
         else:
             self.widgetChanged.emit()
 
-    def refreshPlotView(self):
+    def refreshPlotView(self, figure: OverlayFigure = None):
         """
         just refresh the view, if the reload method is called immediately after
         the view creation it won't reload the page
+
+        figure is set if the plot is a figure of several plots (see show_figure)
         """
+        if figure is not self.shown_figure:
+            self.reset_figure()
+        self.shown_figure = figure
+        self.figure_loaded = False
 
         self.plot_url = QUrl.fromLocalFile(self.plot_path)
+        self.view_load_start = time.perf_counter()
         self.plot_view.load(self.plot_url)
         self.layoutw.addWidget(self.plot_view)
 
+        self.refresh_raw_plot_text()
+
+    def plot_view_loaded(self, _):
+        """
+        Triggered when a plot is loaded in the view, completing its performance stats
+        """
+        self.figure_loaded = self.shown_figure is not None
+
+        if self.view_load_start is None or self.diagnostics_factory is None:
+            return
+
+        stats = self.diagnostics_factory.stats
+        stats.add_time('view_load', time.perf_counter() - self.view_load_start)
+        stats.update_peak_memory()
+        self.view_load_start = None
+        self.diagnostics_text.setPlainText(stats.summary())
+        stats.log()
+
+    def refresh_raw_plot_text(self):
+        """
+        Shows the html of the current plot in the raw text view
+
+        The html is only read once the raw text view is shown, so that the
+        panel doesn't keep a copy of the html of large plots otherwise
+        """
         self.raw_plot_text.clear()
+        self.raw_plot_text_stale = True
+        self.load_raw_plot_text()
+
+    def load_raw_plot_text(self):
+        """
+        Reads the html of the current plot into the raw text view, if the view
+        is shown and outdated
+        """
+        if not self.raw_plot_text_stale or not self.plot_path \
+                or self.stackedPlotWidget.currentWidget() != self.code_stackpage:
+            return
+
+        self.raw_plot_text_stale = False
+        self.write_stale_figure()
         with open(self.plot_path, 'r') as myfile:
             plot_text = myfile.read()
 
         self.raw_plot_text.setPlainText(plot_text)
 
+    def dispose_plot_factories(self):
+        """
+        Removes all plots, so that they are no longer rebuilt when their layers change
+        """
+        for factory in self.plot_factories.values():
+            factory.dispose()
+        self.plot_factories = {}
+
     def clearPlotView(self):
         """
         clear the content of the QWebView by loading an empty url and clear the
         raw text of the QPlainTextEdit
         """
 
-        self.plot_factories = {}
+        self.cancel_streaming()
+        self.dispose_plot_factories()
+        self.diagnostics_factory = None
+        self.view_load_start = None
+        self.reset_figure()
 
         try:
             self.plot_view.load(QUrl(''))
             self.layoutw.addWidget(self.plot_view)
             self.raw_plot_text.clear()
+            self.raw_plot_text_stale = False
+            self.diagnostics_text.clear()
             if self.mode == DataPlotlyPanelWidget.MODE_CANVAS:
                 # disable the Update Plot Button
                 self.update_btn.setEnabled(False)
@@ -1224,7 +1482,18 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
 
         plot_file = QgsFileUtils.ensureFileNameHasExtension(plot_file, ['html'])
 
+        self.write_stale_figure()
         copyfile(self.plot_path, plot_file)
+
+        # the saved plot can't evaluate hover labels on demand, so embed the labels of all points
+        hover_labels = {}
+        for curve, factory in enumerate(self.plot_factories.values()):
+            if factory.hover_on_demand:
+                hover_labels.update(factory.hover_labels(curve))
+        if hover_labels:
+            with open(plot_file, 'a') as f:
+                f.write('<script type="text/javascript">dataplotlySetHoverTexts({});</script>'.format(
+                    json.dumps(hover_labels)))
         if self.message_bar:
             self.message_bar.pushSuccess(self.tr('DataPlotly'),
                                          self.tr('Saved plot to <a href="{}">{}</a>').format(
@@ -1292,6 +1561,7 @@ class DataPlotlyPanelWidget(QgsPanelWidget, WIDGET):  # pylint: disable=too-many
 
         standalone_plot_path = factory.build_figure()
         standalone_plot_url = QUrl.fromLocalFile(standalone_plot_path)
+        self.reset_figure()
 
         self.plot_view.load(standalone_plot_url)
         self.layoutw.addWidget(self.plot_view)
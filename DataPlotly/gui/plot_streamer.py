@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""Progressive plot display
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    QTimer,
+    pyqtSignal
+)
+
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.core.plot_factory import PlotFactory
+
+
+class PlotStreamer(QObject):
+    """
+    Progressively shows a plot in a web view while its values are fetched.
+
+    Values are fetched in chunks from the event loop, so the interface stays responsive.
+    A preview plot is shown as soon as the first chunk is available, and the following
+    chunks are appended to the displayed plot with Plotly.extendTraces (for plot types
+    which support it, see PlotType.trace_update).
+
+    While streaming, the factory isn't rebuilt when its source layer is modified (or its
+    selection changes), as this would replace the values being appended: streaming is
+    restarted instead, and the factory is rebuilt on layer changes again once it stops.
+    """
+
+    # emitted with the path of the preview plot, once the first chunk is fetched
+    preview_ready = pyqtSignal(str)
+    # emitted with the number of features fetched so far
+    progress = pyqtSignal(int)
+    # emitted when streaming stops, with False if it was canceled
+    finished = pyqtSignal(bool)
+
+    def __init__(self, factory: PlotFactory, view, chunk_size: int, parent=None):
+        super().__init__(parent)
+        self.factory = factory
+        self.view = view
+        self.chunk_size = chunk_size
+        self.chunks = factory.rebuild_in_chunks(chunk_size)
+        self.extendable = factory.trace_update(0, 0) is not None
+
+        # number of values fetched, and appended to the displayed plot
+        self.fetched = 0
+        self.displayed = 0
+        self.previewed = False
+        self.loaded = False
+        self.complete = False
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.next_chunk)
+        self.view.loadFinished.connect(self.preview_loaded)
+
+        # the factory is rebuilt on layer changes once streaming stops, see disconnect_layer
+        self.reconnect_factory = factory.connected
+        factory.dispose()
+        self.layer = factory.source_layer
+        if self.layer:
+            self.layer.layerModified.connect(self.restart)
+            if factory.selected_features_only:
+                self.layer.selectionChanged.connect(self.restart)
+
+    def start(self):
+        """
+        Starts fetching values
+        """
+        self.timer.start()
+
+    def is_running(self) -> bool:
+        """
+        Returns True if values are still being fetched
+        """
+        return self.timer.isActive()
+
+    def cancel(self):
+        """
+        Stops fetching values, keeping the values fetched so far in the plot
+        """
+        if not self.is_running():
+            return
+        self.append_values()
+        self.stop()
+        self.finished.emit(False)
+
+    def stop(self):
+        """
+        Stops the streamer, without emitting finished
+        """
+        self.timer.stop()
+        self.chunks.close()
+        self.disconnect_view()
+        self.disconnect_layer()
+
+    def restart(self):
+        """
+        Fetches values again from the first feature, when the source layer is modified
+        or its selection changes while streaming
+        """
+        self.chunks.close()
+        self.chunks = self.factory.rebuild_in_chunks(self.chunk_size)
+        self.fetched = 0
+        self.displayed = 0
+        self.previewed = False
+        self.loaded = False
+        self.complete = False
+        self.timer.start()
+
+    def disconnect_layer(self):
+        """
+        Stops listening to the source layer, and lets the factory be rebuilt on layer
+        changes again
+        """
+        if self.layer:
+            try:
+                self.layer.layerModified.disconnect(self.restart)
+                if self.factory.selected_features_only:
+                    self.layer.selectionChanged.disconnect(self.restart)
+            except (TypeError, RuntimeError):
+                # the layer was already deleted
+                pass
+            self.layer = None
+        if self.reconnect_factory:
+            self.reconnect_factory = False
+            self.factory.connect_source_layer()
+
+    def disconnect_view(self):
+        """
+        Stops listening to the view
+        """
+        try:
+            self.view.loadFinished.disconnect(self.preview_loaded)
+        except TypeError:
+            pass
+
+    def next_chunk(self):
+        """
+        Fetches the next chunk of values
+        """
+        try:
+            start, end = next(self.chunks)
+        except StopIteration:
+            self.timer.stop()
+            if self.extendable and self.previewed and not self.loaded:
+                # finish once the remaining values are appended to the preview
+                self.complete = True
+                return
+            self.append_values()
+            self.disconnect_view()
+            self.disconnect_layer()
+            self.finished.emit(True)
+            return
+
+        self.fetched = end
+        self.progress.emit(end)
+        if start == 0:
+            self.displayed = end
+            self.previewed = True
+            self.preview_ready.emit(self.factory.build_figure())
+        else:
+            self.append_values()
+
+    def preview_loaded(self, _):
+        """
+        Triggered when the preview plot has been loaded in the view
+        """
+        if not self.previewed:
+            # an earlier page finished loading
+            return
+        self.loaded = True
+        self.append_values()
+        if self.complete:
+            self.disconnect_view()
+            self.disconnect_layer()
+            self.finished.emit(True)
+
+    def append_values(self):
+        """
+        Appends values fetched since the last update to the displayed plot
+        """
+        if not self.extendable or not self.loaded or self.displayed >= self.fetched:
+            return
+
+        update = self.factory.trace_update(self.displayed, self.fetched)
+        self.displayed = self.fetched
+        self.view.page().mainFrame().evaluateJavaScript(
+            "Plotly.extendTraces(document.getElementsByClassName('plotly-graph-div')[0], {}, [0]);".format(
+                FigureSerializer.dumps(update)))
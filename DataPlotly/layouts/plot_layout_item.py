@@ -7,45 +7,52 @@ the Free Software Foundation; either version 2 of the License, or
 (at your option) any later version.
 """
 
+from collections import OrderedDict
+from functools import partial
+
 from qgis.PyQt.QtCore import (
-    Qt,
     QCoreApplication,
     QRectF,
-    QSize,
-    QUrl,
-    QEventLoop,
-    QTimer
+    QSize
+)
+from qgis.PyQt.QtGui import (
+    QPainter,
+    QPicture
 )
-from qgis.PyQt.QtGui import QPalette
 from qgis.PyQt.QtWidgets import QGraphicsItem
+from qgis.PyQt.QtXml import QDomDocument
 
 from qgis.core import (
+    QgsExpression,
+    QgsFeature,
+    QgsGeometry,
+    QgsProject,
+    QgsProperty,
     QgsLayoutItem,
     QgsLayoutItemRegistry,
-    QgsLayoutItemAbstractMetadata,
-    QgsNetworkAccessManager,
-    QgsMessageLog,
-    QgsGeometry
+    QgsLayoutItemAbstractMetadata
 )
-from qgis.PyQt.QtWebKitWidgets import QWebPage
 
 from DataPlotly.core.plot_settings import PlotSettings
 from DataPlotly.core.plot_factory import PlotFactory, FilterRegion
+from DataPlotly.core.atlas_prefetch import AtlasPrefetch
+from DataPlotly.core.static_renderer import STATIC_RENDERERS
+from DataPlotly.layouts.plot_prerenderer import PlotPreRenderer
+from DataPlotly.layouts.plot_render_host import (
+    PlotRenderHost,
+    ZOOM_FACTOR
+)
 from DataPlotly.gui.gui_utils import GuiUtils
 
 ITEM_TYPE = QgsLayoutItemRegistry.PluginItem + 1337
 
 
-class LoggingWebPage(QWebPage):
-
-    def __init__(self, parent=None):
-        super().__init__(parent)
+class PlotLayoutItem(QgsLayoutItem):
 
-    def javaScriptConsoleMessage(self, message, lineNumber, source):
-        QgsMessageLog.logMessage('{}:{} {}'.format(source, lineNumber, message), 'DataPlotly')
+    # maximum number of rendered plots kept in memory for each item
+    RENDER_CACHE_SIZE = 16
 
-
-class PlotLayoutItem(QgsLayoutItem):
+    PLOT_CONFIG = {'displayModeBar': False, 'staticPlot': True}
 
     def __init__(self, layout):
         super().__init__(layout)
@@ -53,26 +60,34 @@ class PlotLayoutItem(QgsLayoutItem):
         self.plot_settings = PlotSettings()
         self.linked_map_uuid = ''
         self.linked_map = None
+        self.source_layer = None
+        self.data_revision = 0
+
+        # rendered plots, stored as QPicture objects keyed by plot_cache_key
+        self.render_cache = OrderedDict()
+        # picture drawn while the preview of the current content is rendered
+        self.preview_picture = None
+        # job id and cache key of the preview being rendered
+        self.preview_job = None
+        self.preview_job_key = None
 
         self.filter_by_map = False
         self.filter_by_atlas = False
+        self.prefetch_atlas = False
+        self.atlas_prefetch = None
+        # static renderer used instead of the web engine, see STATIC_RENDERERS
+        self.static_renderer = ''
 
-        self.web_page = LoggingWebPage(self)
-        self.web_page.setNetworkAccessManager(QgsNetworkAccessManager.instance())
-
-        # This makes the background transparent. (copied from QgsLayoutItemLabel)
-        palette = self.web_page.palette()
-        palette.setBrush(QPalette.Base, Qt.transparent)
-        self.web_page.setPalette(palette)
-        self.web_page.mainFrame().setZoomFactor(10.0)
-        self.web_page.mainFrame().setScrollBarPolicy(Qt.Horizontal, Qt.ScrollBarAlwaysOff)
-        self.web_page.mainFrame().setScrollBarPolicy(Qt.Vertical, Qt.ScrollBarAlwaysOff)
-
-        self.web_page.loadFinished.connect(self.loading_html_finished)
-        self.html_loaded = False
         self.html_units_to_layout_units = self.calculate_html_units_to_layout_units()
 
-        self.sizePositionChanged.connect(self.refresh)
+        self.prerenderer = None
+        atlas = self.layout().atlas() if self.layout() and hasattr(self.layout(), 'atlas') else None
+        if atlas:
+            atlas.renderBegun.connect(self.atlas_render_begun)
+            atlas.renderEnded.connect(self.atlas_render_ended)
+            atlas.featureChanged.connect(self.atlas_feature_changed)
+
+        self.sizePositionChanged.connect(self.invalidateCache)
 
     def type(self):
         return ITEM_TYPE
@@ -121,12 +136,72 @@ class PlotLayoutItem(QgsLayoutItem):
         Sets the plot settings to show in the item
         """
         self.plot_settings = settings
-        self.html_loaded = False
+        self.reset_atlas_prefetch()
+        self.update_source_layer()
         self.invalidateCache()
 
+    def update_source_layer(self):
+        """
+        Connects to the source layer of the current plot settings, so that cached
+        renders are discarded whenever the layer data changes
+        """
+        layer = QgsProject.instance().mapLayer(
+            self.plot_settings.source_layer_id) if self.plot_settings.source_layer_id else None
+        if layer == self.source_layer:
+            return
+
+        if self.source_layer:
+            try:
+                self.source_layer.dataChanged.disconnect(self.source_data_changed)
+                self.source_layer.selectionChanged.disconnect(self.source_selection_changed)
+            except (RuntimeError, TypeError):
+                # c++ object already gone!
+                pass
+
+        self.source_layer = layer
+        if self.source_layer:
+            self.source_layer.dataChanged.connect(self.source_data_changed)
+            self.source_layer.selectionChanged.connect(self.source_selection_changed)
+
+    def source_data_changed(self):
+        """
+        Triggered when the data in the source layer changes
+        """
+        self.data_revision += 1
+        self.reset_atlas_prefetch()
+        self.render_cache.clear()
+        self.invalidateCache()
+        self.update()
+
+    def source_selection_changed(self):
+        """
+        Triggered when the selection in the source layer changes
+        """
+        if self.plot_settings.properties['selected_features_only']:
+            self.source_data_changed()
+
+    def reset_atlas_prefetch(self):
+        """
+        Discards the values prefetched for atlas pages
+        """
+        if self.atlas_prefetch is not None:
+            self.atlas_prefetch.dispose()
+            self.atlas_prefetch = None
+
     def draw(self, context):
-        if not self.html_loaded:
-            self.load_content()
+        polygon_filter = self.filter_region()
+        key = self.plot_cache_key(polygon_filter)
+
+        picture = self.render_cache.get(key)
+        if picture is not None:
+            self.render_cache.move_to_end(key)
+        elif self.static_renderer_class():
+            picture = self.render_static(polygon_filter)
+            self.store_render(key, picture)
+        else:
+            picture = self.render_plot(polygon_filter, key)
+        if picture is not None:
+            self.preview_picture = picture
 
         # almost a direct copy from QgsLayoutItemLabel!
         painter = context.renderContext().painter()
@@ -135,10 +210,15 @@ class PlotLayoutItem(QgsLayoutItem):
         # painter is scaled to dots, so scale back to layout units
         painter.scale(context.renderContext().scaleFactor() / self.html_units_to_layout_units,
                       context.renderContext().scaleFactor() / self.html_units_to_layout_units)
-        self.web_page.mainFrame().render(painter)
+        if picture is not None:
+            painter.drawPicture(0, 0, picture)
         painter.restore()
 
-    def create_plot(self):
+    def filter_region(self):
+        """
+        Returns the region used to filter the plot features, or None if
+        the plot is not filtered
+        """
         if self.linked_map and self.filter_by_map:
             polygon_filter = FilterRegion(QgsGeometry.fromQPolygonF(self.linked_map.visibleExtentPolygon()),
                                           self.linked_map.crs())
@@ -150,21 +230,207 @@ class PlotLayoutItem(QgsLayoutItem):
             polygon_filter = None
             self.plot_settings.properties['visible_features_only'] = False
 
-        factory = PlotFactory(self.plot_settings, self, polygon_filter=polygon_filter)
-        config = {'displayModeBar': False, 'staticPlot': True}
-        return factory.build_html(config)
+        return polygon_filter
+
+    def plot_cache_key(self, polygon_filter=None):
+        """
+        Returns a key identifying the rendered content of the item: the plot
+        settings, the item size, the filter geometry, the source data revision
+        and the expression context values the plot depends on
+        """
+        document = QDomDocument()
+        document.appendChild(self.plot_settings.write_xml(document))
+
+        filter_key = ''
+        if polygon_filter is not None:
+            filter_key = '{}:{}'.format(polygon_filter.crs().authid(), polygon_filter.geometry.asWkt())
+
+        return (document.toString(),
+                round(self.rect().width(), 6),
+                round(self.rect().height(), 6),
+                filter_key,
+                self.data_revision,
+                self.static_renderer,
+                self.expression_context_key())
+
+    def expression_context_variables(self) -> set:
+        """
+        Returns the names of the expression context variables referenced by the plot
+        expressions and expression based data defined properties
+        """
+        expressions = [self.plot_settings.properties['x_name'],
+                       self.plot_settings.properties['y_name'],
+                       self.plot_settings.properties['z_name'],
+                       self.plot_settings.layout['additional_info_expression']]
+        properties = self.plot_settings.data_defined_properties
+        for key in properties.propertyKeys():
+            prop = properties.property(key)
+            if prop.isActive() and prop.propertyType() == QgsProperty.ExpressionBasedProperty:
+                expressions.append(prop.expressionString())
+
+        variables = set()
+        for expression in expressions:
+            if expression:
+                variables.update(QgsExpression(expression).referencedVariables())
+        return variables
+
+    def depends_on_expression_context(self) -> bool:
+        """
+        Returns True if the plot depends on the expression context, i.e. if it uses
+        variables or data defined properties, which may change with the atlas feature
+        """
+        return bool(self.expression_context_variables()) or \
+            self.plot_settings.data_defined_properties.hasActiveProperties()
+
+    def expression_context_key(self):
+        """
+        Returns a key identifying the expression context values the plot depends on,
+        besides the layer data: the current atlas feature and the values of the
+        variables referenced by the plot expressions, if the plot uses any variables
+        or data defined properties (or None otherwise)
+        """
+        variables = self.expression_context_variables()
+        if not variables and not self.plot_settings.data_defined_properties.hasActiveProperties():
+            return None
+
+        atlas_key = None
+        report_context = self.layout().reportContext()
+        if report_context.layer() and report_context.feature().isValid():
+            atlas_key = (report_context.layer().id(), report_context.feature().id())
+
+        context = self.createExpressionContext()
+        values = []
+        for name in sorted(variables):
+            value = context.variable(name)
+            if isinstance(value, QgsFeature):
+                value = value.id()
+            elif isinstance(value, QgsGeometry):
+                value = value.asWkt()
+            values.append((name, str(value)))
+        return atlas_key, tuple(values)
+
+    def atlas_feature_key(self):
+        """
+        Returns a key identifying the current atlas feature, if the plot is
+        filtered by the atlas feature, or None otherwise
+        """
+        if (self.linked_map and self.filter_by_map) or not self.filter_by_atlas:
+            return None
 
-    def load_content(self):
-        self.html_loaded = False
-        base_url = QUrl.fromLocalFile(self.layout().project().absoluteFilePath())
-        self.web_page.setViewportSize(QSize(self.rect().width() * self.html_units_to_layout_units,
-                                            self.rect().height() * self.html_units_to_layout_units))
-        self.web_page.mainFrame().setHtml(self.create_plot(), base_url)
+        context = self.layout().reportContext()
+        if not context.layer() or not context.feature().isValid():
+            return None
+
+        return context.layer().id(), context.feature().id()
+
+    def create_plot_factory(self, polygon_filter=None, atlas_key=None):
+        """
+        Creates the factory for the plot, filtered by the specified region
+
+        The factory only builds the plot once: the item discards its renders itself
+        when the source layer changes (see source_data_changed)
+        """
+        if atlas_key is None and self.prefetch_atlas:
+            atlas_key = self.atlas_feature_key()
+        if self.prefetch_atlas and atlas_key is not None and polygon_filter is not None and AtlasPrefetch.is_supported(self.plot_settings):
+            if self.atlas_prefetch is None:
+                self.atlas_prefetch = AtlasPrefetch(self.plot_settings, self)
+            return PlotFactory(self.atlas_prefetch.settings_for_region(atlas_key, polygon_filter), hover_on_demand=True)
+
+        # static plots show no hover labels, so they are never evaluated
+        factory = PlotFactory(self.plot_settings, self, polygon_filter=polygon_filter, hover_on_demand=True)
+        factory.dispose()
+        return factory
+
+    def create_plot(self, polygon_filter=None, atlas_key=None):
+        factory = self.create_plot_factory(polygon_filter, atlas_key)
+        return factory.build_html(self.PLOT_CONFIG)
+
+    def viewport_size(self) -> QSize:
+        """
+        Returns the size of the web page viewport rendering the plot
+        """
+        return QSize(int(self.rect().width() * self.html_units_to_layout_units),
+                     int(self.rect().height() * self.html_units_to_layout_units))
+
+    def render_plot(self, polygon_filter, key):
+        """
+        Renders the plot to a picture using the shared render host, and stores it in
+        the render cache with the specified key
+
+        When exporting the layout, this blocks until the plot is rendered and returns the
+        picture (or None if rendering timed out). Previews are never blocked: the plot is
+        rendered in the background and the item is redrawn once it is ready, while the
+        previously rendered picture (or None) is returned meanwhile.
+        """
+        host = PlotRenderHost.instance()
+        if not self.layout().renderContext().isPreviewRender():
+            factory = self.create_plot_factory(polygon_filter)
+            picture = host.render_picture(factory, self.PLOT_CONFIG, self.viewport_size())
+            if picture is not None:
+                # keep a vector copy of the rendered plot, so that further redraws
+                # (e.g. when scrolling or zooming the layout) don't need rendering again
+                self.store_render(key, picture)
+            return picture
+
+        if self.preview_job_key != key or not host.pending([self.preview_job]):
+            # the content changed since the preview render started
+            if self.preview_job is not None:
+                host.cancel([self.preview_job])
+            factory = self.create_plot_factory(polygon_filter)
+            self.preview_job_key = key
+            self.preview_job = host.render(factory, self.PLOT_CONFIG, self.viewport_size(),
+                                           partial(self.preview_rendered, key))
+        return self.preview_picture
+
+    def preview_rendered(self, key, picture):
+        """
+        Triggered when the preview of the plot has been rendered in the background
+        """
+        self.preview_job = None
+        self.preview_job_key = None
+        self.store_render(key, picture)
+        self.preview_picture = picture
+        try:
+            self.invalidateCache()
+            self.update()
+        except RuntimeError:
+            # c++ object already gone!
+            pass
+
+    def static_renderer_class(self):
+        """
+        Returns the static renderer class to use for the plot, or None if the
+        plot should be rendered by the web engine
+        """
+        renderer_class = STATIC_RENDERERS.get(self.static_renderer)
+        if renderer_class and renderer_class.supports(self.plot_settings.plot_type):
+            return renderer_class
+        return None
+
+    def render_static(self, polygon_filter=None, atlas_key=None):
+        """
+        Renders the plot to a picture using the static renderer, using the
+        same units as the web engine renders
+        """
+        factory = self.create_plot_factory(polygon_filter, atlas_key)
+        pixels_per_layout_unit = self.html_units_to_layout_units / ZOOM_FACTOR
+
+        picture = QPicture()
+        painter = QPainter(picture)
+        painter.scale(ZOOM_FACTOR, ZOOM_FACTOR)
+        self.static_renderer_class()().render(factory, painter,
+                                              QRectF(0, 0, self.rect().width() * pixels_per_layout_unit,
+                                                     self.rect().height() * pixels_per_layout_unit))
+        painter.end()
+        return picture
 
     def writePropertiesToElement(self, element, document, _):
         element.appendChild(self.plot_settings.write_xml(document))
         element.setAttribute('filter_by_map', 1 if self.filter_by_map else 0)
         element.setAttribute('filter_by_atlas', 1 if self.filter_by_atlas else 0)
+        element.setAttribute('prefetch_atlas', 1 if self.prefetch_atlas else 0)
+        element.setAttribute('static_renderer', self.static_renderer)
         element.setAttribute('linked_map', self.linked_map.uuid() if self.linked_map else '')
         return True
 
@@ -173,10 +439,14 @@ class PlotLayoutItem(QgsLayoutItem):
 
         self.filter_by_map = bool(int(element.attribute('filter_by_map', '0')))
         self.filter_by_atlas = bool(int(element.attribute('filter_by_atlas', '0')))
+        self.prefetch_atlas = bool(int(element.attribute('prefetch_atlas', '0')))
+        self.static_renderer = element.attribute('static_renderer', '')
         self.linked_map_uuid = element.attribute('linked_map')
         self.disconnect_current_map()
+        self.update_source_layer()
 
-        self.html_loaded = False
+        self.reset_atlas_prefetch()
+        self.render_cache.clear()
         self.invalidateCache()
         return res
 
@@ -188,21 +458,58 @@ class PlotLayoutItem(QgsLayoutItem):
             if map:
                 self.set_linked_map(map)
 
-    def loading_html_finished(self):
-        self.html_loaded = True
-        self.invalidateCache()
-        self.update()
+    def store_render(self, key, picture):
+        """
+        Stores a rendered plot picture in the render cache
+        """
+        self.render_cache[key] = picture
+        self.render_cache.move_to_end(key)
+        while len(self.render_cache) > self.RENDER_CACHE_SIZE:
+            self.render_cache.popitem(last=False)
+
+    def atlas_render_begun(self):
+        """
+        Triggered when an atlas export begins, pre-renders the first atlas pages
+        """
+        if not self.filter_by_atlas or not self.prefetch_atlas or (self.linked_map and self.filter_by_map):
+            return
+
+        if not AtlasPrefetch.is_supported(self.plot_settings):
+            return
+
+        # plots depending on the expression context are built with the context of the current
+        # page, and keyed on it (see expression_context_key), so other pages can't be rendered ahead
+        if self.depends_on_expression_context():
+            return
+
+        self.prerenderer = PlotPreRenderer(self)
+        self.prerenderer.render_ahead(None)
+
+    def atlas_feature_changed(self, feature):
+        """
+        Triggered when the current atlas feature changes
+        """
+        if self.prerenderer:
+            self.prerenderer.render_ahead(feature.id())
+
+    def atlas_render_ended(self):
+        """
+        Triggered when an atlas export ends
+        """
+        self.prerenderer = None
 
     def refresh(self):
         super().refresh()
-        self.html_loaded = False
+        # force a new render, e.g. when the data changed in a way the cache key doesn't track
+        self.data_revision += 1
+        self.reset_atlas_prefetch()
+        self.render_cache.clear()
         self.invalidateCache()
 
     def map_extent_changed(self):
         if not self.linked_map or not self.filter_by_map:
             return
 
-        self.html_loaded = False
         self.invalidateCache()
 
         self.update()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Atlas plot pre-rendering
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+from functools import partial
+
+from qgis.PyQt.QtCore import QObject
+from qgis.core import (
+    NULL,
+    QgsSettings,
+    QgsExpression,
+    QgsExpressionContext,
+    QgsExpressionContextUtils,
+    QgsFeatureRequest
+)
+
+from DataPlotly.core.plot_factory import FilterRegion
+from DataPlotly.layouts.plot_render_host import PlotRenderHost
+
+
+class PlotPreRenderer(QObject):
+    """
+    Pre-renders the plot of a layout item for the upcoming pages of an atlas export.
+
+    The plots of several atlas pages are rendered at once by the shared render host
+    (see PlotRenderHost). The rendered pictures are stored in the item's render cache,
+    so that when the exporter reaches a page the item only has to draw the finished
+    picture. pool_size (the 'dataplotly/prerender_pool_size' setting) sets how many
+    pages are rendered ahead.
+    """
+
+    # maximum time (in ms) to wait for a single plot to render
+    RENDER_TIMEOUT = PlotRenderHost.RENDER_TIMEOUT
+
+    def __init__(self, item, pool_size: int = None):
+        super().__init__()
+        self.item = item
+        if pool_size is None:
+            pool_size = QgsSettings().value('dataplotly/prerender_pool_size', 4, int)
+        self.pool_size = max(1, pool_size)
+        # number of pages rendered ahead of the current atlas page
+        self.window = max(1, min(self.pool_size * 2, item.RENDER_CACHE_SIZE // 2))
+
+        self.queue = []
+
+        self.coverage_layer = None
+        self.features = self.atlas_features()
+        self.positions = {fid: i for i, (fid, _) in enumerate(self.features)}
+        self.rendered_until = 0
+
+    def atlas_features(self) -> list:
+        """
+        Returns the ids and geometries of the atlas features, in atlas order
+        """
+        atlas = self.item.layout().atlas()
+        self.coverage_layer = atlas.coverageLayer()
+        if not self.coverage_layer:
+            return []
+
+        context = QgsExpressionContext()
+        context.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(self.coverage_layer))
+
+        request = QgsFeatureRequest()
+        if atlas.filterFeatures() and atlas.filterExpression():
+            request.setFilterExpression(atlas.filterExpression())
+            request.setExpressionContext(context)
+
+        sort_expression = None
+        if atlas.sortFeatures() and atlas.sortExpression():
+            sort_expression = QgsExpression(atlas.sortExpression())
+            sort_expression.prepare(context)
+
+        features = []
+        for f in self.coverage_layer.getFeatures(request):
+            sort_value = None
+            if sort_expression:
+                context.setFeature(f)
+                sort_value = sort_expression.evaluate(context)
+                if sort_value == NULL:
+                    sort_value = None
+            features.append((sort_value, f.id(), f.geometry()))
+
+        if sort_expression:
+            # a different order only affects which pages are rendered ahead, not the output
+            try:
+                features.sort(key=lambda f: (f[0] is None, f[0] if f[0] is not None else 0),
+                              reverse=not atlas.sortAscending())
+            except TypeError:
+                features.sort(key=lambda f: str(f[0]), reverse=not atlas.sortAscending())
+
+        return [(fid, geometry) for _, fid, geometry in features]
+
+    def render_ahead(self, feature_id=None):
+        """
+        Renders the plots for the pages following the atlas feature with the
+        specified id (or the first pages, if no id is specified)
+        """
+        position = 0 if feature_id is None else self.positions.get(feature_id)
+        if position is None or position + self.pool_size < self.rendered_until:
+            return
+
+        end = min(position + self.window, len(self.features))
+        batch = self.features[max(position, self.rendered_until):end]
+        self.rendered_until = end
+
+        # plots for atlas pages are always filtered to the atlas feature
+        self.item.plot_settings.properties['visible_features_only'] = True
+        for fid, geometry in batch:
+            region = FilterRegion(geometry, self.coverage_layer.crs())
+            key = self.item.plot_cache_key(region)
+            if key in self.item.render_cache:
+                continue
+            self.queue.append((key, region, (self.coverage_layer.id(), fid)))
+
+        self.run()
+
+    def run(self):
+        """
+        Renders all queued plots, blocking until they are finished
+        """
+        if not self.queue:
+            return
+
+        host = PlotRenderHost.instance()
+        jobs = []
+        for key, region, atlas_key in self.queue:
+            if self.item.static_renderer_class():
+                # no need for the web page
+                self.item.store_render(key, self.item.render_static(region, atlas_key))
+                continue
+            factory = self.item.create_plot_factory(region, atlas_key)
+            jobs.append(host.render(factory, self.item.PLOT_CONFIG, self.item.viewport_size(),
+                                    partial(self.item.store_render, key)))
+        self.queue = []
+
+        host.wait(jobs, self.RENDER_TIMEOUT * (1 + len(jobs) // host.pool_size))
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""Shared plot rendering for layout items
+
+.. note:: This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+"""
+
+import io
+from functools import partial
+
+from qgis.PyQt.QtCore import (
+    Qt,
+    QCoreApplication,
+    QEventLoop,
+    QObject,
+    QTimer,
+    QUrl,
+    pyqtSignal
+)
+from qgis.PyQt.QtGui import (
+    QPalette,
+    QPainter,
+    QPicture
+)
+from qgis.PyQt.QtWebKitWidgets import QWebPage
+from qgis.core import (
+    QgsMessageLog,
+    QgsNetworkAccessManager,
+    QgsSettings
+)
+
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.core.plot_factory import PlotFactory
+
+# zoom factor of the web pages rendering plots
+ZOOM_FACTOR = 10.0
+
+# status message prefix set by the host page once a plot is drawn
+RENDERED_PREFIX = 'dataplotly-rendered:'
+
+HOST_HTML = '''<head><meta charset="utf-8" /><script src="{}"></script><script src="{}"></script></head>
+<div id="plot" style="height: 100%; width: 100%;" class="plotly-graph-div"></div>
+<script type="text/javascript">
+function dataplotlyRender(jobId, data, layout, config) {{
+    var div = document.getElementById('plot');
+    var done = function() {{ window.status = '{}' + jobId; }};
+    try {{
+        Plotly.purge(div);
+        Plotly.newPlot(div, data, layout, config).then(done, done);
+    }} catch (e) {{
+        console.log(e);
+        done();
+    }}
+}}
+</script>'''.format(PlotFactory.POLY_FILL_PATH, PlotFactory.PLOTLY_PATH, RENDERED_PREFIX)
+
+
+class LoggingWebPage(QWebPage):
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+    def javaScriptConsoleMessage(self, message, lineNumber, source):
+        QgsMessageLog.logMessage('{}:{} {}'.format(source, lineNumber, message), 'DataPlotly')
+
+
+def create_web_page(parent=None) -> LoggingWebPage:
+    """
+    Creates a new web page suitable for rendering plots
+    """
+    web_page = LoggingWebPage(parent)
+    web_page.setNetworkAccessManager(QgsNetworkAccessManager.instance())
+
+    # This makes the background transparent. (copied from QgsLayoutItemLabel)
+    palette = web_page.palette()
+    palette.setBrush(QPalette.Base, Qt.transparent)
+    web_page.setPalette(palette)
+    web_page.mainFrame().setZoomFactor(ZOOM_FACTOR)
+    web_page.mainFrame().setScrollBarPolicy(Qt.Horizontal, Qt.ScrollBarAlwaysOff)
+    web_page.mainFrame().setScrollBarPolicy(Qt.Vertical, Qt.ScrollBarAlwaysOff)
+    return web_page
+
+
+def render_to_picture(web_page) -> QPicture:
+    """
+    Renders the content of a web page to a (vector) picture
+    """
+    picture = QPicture()
+    painter = QPainter(picture)
+    web_page.mainFrame().render(painter)
+    painter.end()
+    return picture
+
+
+class PlotRenderHost(QObject):
+    """
+    Renders plots of layout items to pictures, using a pool of off-screen web pages
+    shared by all items.
+
+    Each page loads plotly.js once, and then draws any number of figures on request,
+    instead of every item parsing plotly.js in its own page and keeping its own
+    JavaScript heap. Pages are created when needed, up to the pool size set by the
+    'dataplotly/render_pool_size' setting, so several plots (e.g. of upcoming atlas
+    pages) can be rendered at once.
+
+    Rendering is asynchronous: render() returns at once, and the picture is passed to
+    the job callback and emitted with job_rendered when the plot is drawn. Only exports
+    and the atlas prerenderer should block on jobs, with render_picture() or wait().
+    """
+
+    # maximum time (in ms) to wait for a single plot to render
+    RENDER_TIMEOUT = 10000
+
+    # emitted with the id of a job and the rendered picture once it is rendered
+    job_rendered = pyqtSignal(int, QPicture)
+
+    # emitted with the id of a job once it is rendered or canceled
+    job_finished = pyqtSignal(int)
+
+    _instance = None
+
+    def __init__(self, pool_size: int = None, parent=None):
+        super().__init__(parent)
+        if pool_size is None:
+            pool_size = QgsSettings().value('dataplotly/render_pool_size', 4, int)
+        self.pool_size = max(1, pool_size)
+
+        self.pages = []
+        # pages which have loaded plotly.js
+        self.ready = set()
+        # page -> (job id, callback) of the plot being drawn
+        self.busy = {}
+        # (job id, script, viewport size, callback) of plots waiting for a page
+        self.queue = []
+        self.last_job_id = 0
+
+    @staticmethod
+    def instance() -> 'PlotRenderHost':
+        """
+        Returns the render host shared by all layout items
+        """
+        if PlotRenderHost._instance is None:
+            PlotRenderHost._instance = PlotRenderHost(parent=QCoreApplication.instance())
+        return PlotRenderHost._instance
+
+    @staticmethod
+    def plot_script(job_id: int, factory: PlotFactory, config: dict) -> str:
+        """
+        Returns the JavaScript drawing the plot built by a factory in a host page
+        """
+        buffer = io.StringIO()
+        serializer = FigureSerializer(buffer)
+        with factory.stats.measure('serialize'):
+            serializer.write('dataplotlyRender({}, '.format(job_id))
+            serializer.dump(factory.trace)
+            serializer.write(', ')
+            serializer.dump(factory.layout)
+            serializer.write(', ')
+            serializer.dump(config)
+            serializer.write(');')
+        return buffer.getvalue()
+
+    def render(self, factory: PlotFactory, config: dict, size, callback=None) -> int:
+        """
+        Queues rendering the plot built by a factory in a page of the specified viewport
+        size, and returns the id of the job without waiting for it. callback (if set) is
+        called with the rendered picture. Jobs which aren't drawn within RENDER_TIMEOUT ms
+        of starting are canceled.
+        """
+        self.last_job_id += 1
+        job_id = self.last_job_id
+        self.queue.append((job_id, self.plot_script(job_id, factory, config), size, callback))
+        self.start_jobs()
+        return job_id
+
+    def render_picture(self, factory: PlotFactory, config: dict, size, timeout: int = RENDER_TIMEOUT):
+        """
+        Renders the plot built by a factory, blocking until it is finished, and returns
+        the rendered picture (or None if rendering timed out)
+
+        This runs a nested event loop, so it must only be used when a picture is required
+        at once, e.g. when exporting a layout, and never when drawing previews.
+        """
+        pictures = []
+        job_id = self.render(factory, config, size, pictures.append)
+        self.wait([job_id], timeout)
+        return pictures[0] if pictures else None
+
+    def pending(self, job_ids) -> set:
+        """
+        Returns the ids of the specified jobs which are not finished
+        """
+        job_ids = set(job_ids)
+        queued = {job[0] for job in self.queue}
+        drawing = {job_id for job_id, _ in self.busy.values()}
+        return job_ids & (queued | drawing)
+
+    def wait(self, job_ids, timeout: int):
+        """
+        Waits until the specified jobs are finished, canceling them after timeout ms
+        """
+        if not self.pending(job_ids):
+            return
+
+        loop = QEventLoop()
+
+        def job_finished(_):
+            if not self.pending(job_ids):
+                loop.quit()
+
+        self.job_finished.connect(job_finished)
+        QTimer.singleShot(timeout, loop.quit)
+        loop.exec_(QEventLoop.ExcludeUserInputEvents)
+        self.job_finished.disconnect(job_finished)
+
+        self.cancel(self.pending(job_ids))
+
+    def cancel(self, job_ids):
+        """
+        Cancels the specified jobs, freeing their pages
+        """
+        job_ids = self.pending(job_ids)
+        if not job_ids:
+            return
+        self.queue = [job for job in self.queue if job[0] not in job_ids]
+        for page, (job_id, _) in list(self.busy.items()):
+            if job_id in job_ids:
+                # a late message for the canceled job is ignored
+                del self.busy[page]
+        for job_id in job_ids:
+            self.job_finished.emit(job_id)
+        self.start_jobs()
+
+    def start_jobs(self):
+        """
+        Starts queued jobs in idle pages, creating pages if needed
+        """
+        for page in self.pages:
+            if not self.queue:
+                return
+            if page in self.ready and page not in self.busy:
+                self.start_job(page, self.queue.pop(0))
+
+        loading = len(self.pages) - len(self.ready)
+        if len(self.queue) > loading and len(self.pages) < self.pool_size:
+            self.create_page()
+
+    def create_page(self):
+        """
+        Creates a page of the pool, which loads plotly.js
+        """
+        page = create_web_page(self)
+        page.loadFinished.connect(partial(self.page_loaded, page))
+        page.statusBarMessage.connect(partial(self.status_changed, page))
+        self.pages.append(page)
+        page.mainFrame().setHtml(HOST_HTML, QUrl(PlotFactory.PLOTLY_PATH))
+
+    def start_job(self, page, job):
+        """
+        Starts drawing a plot in a page
+        """
+        job_id, script, size, callback = job
+        self.busy[page] = (job_id, callback)
+        page.setViewportSize(size)
+        page.mainFrame().evaluateJavaScript(script)
+        # don't keep the page forever if the plot is never drawn
+        QTimer.singleShot(self.RENDER_TIMEOUT, partial(self.cancel, [job_id]))
+
+    def page_loaded(self, page, _):
+        """
+        Triggered when a page has loaded plotly.js
+        """
+        self.ready.add(page)
+        self.start_jobs()
+
+    def status_changed(self, page, message: str):
+        """
+        Triggered when the status of a page changes, i.e. when a plot has been drawn
+        """
+        if not message.startswith(RENDERED_PREFIX) or page not in self.busy:
+            return
+        job_id, callback = self.busy[page]
+        if message != RENDERED_PREFIX + str(job_id):
+            return
+
+        del self.busy[page]
+        picture = render_to_picture(page)
+        if callback is not None:
+            callback(picture)
+        self.job_rendered.emit(job_id, picture)
+        self.job_finished.emit(job_id)
+        self.start_jobs()
@@ -21,30 +21,37 @@
 """
 
 import os
-from shutil import copyfile
-import json
-import codecs
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from qgis.core import (
-    QgsProcessingUtils,
+    QgsExpression,
+    QgsFeature,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsProcessingMultiStepFeedback,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFolderDestination,
+    QgsWkbTypes,
     QgsProcessingException,
-    QgsProcessingAlgorithm,
     QgsProcessingParameterFeatureSource,
-    QgsProcessingParameterField,
+    QgsProcessingParameterExpression,
     QgsProcessingParameterString,
     QgsProcessingParameterEnum,
+    QgsProcessingParameterNumber,
     QgsProcessingParameterFileDestination,
-    QgsProcessingOutputHtml,
-    QgsProcessingOutputFile,
-    QgsSettings,
-    QgsFeatureRequest
+    QgsFeatureRequest,
+    NULL
 )
 
-from qgis.PyQt.QtCore import QCoreApplication
+from qgis.PyQt.QtCore import QCoreApplication, QDate, QDateTime, QThread, QTime, QVariant, Qt
 
 from processing.algs.qgis.QgisAlgorithm import QgisAlgorithm
 from DataPlotly.core.plot_factory import PlotFactory
 from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_writer import PlotWriter
 
 
 class DataPlotlyProcessingPlot(QgisAlgorithm):
@@ -59,17 +66,24 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
     INPUT = 'INPUT'
     PLOT_TYPE = 'PLOT_TYPE'
     PLOT_TITLE = 'PLOT_TITLE'
+    # new plot types are appended, so that the indices of existing options don't change
     PLOT_TYPE_OPTIONS = ['scatter', 'box', 'bar', 'histogram', 'pie', '2dhistogram', 'polar', 'contour']
-    X_MANDATORY = ['scatter', 'bar', 'histogram', '2dhistogram', 'polar', 'contour']
-    Y_MANDATORY = ['scatter', 'box', 'bar', 'pie', '2dhistogram', 'polar', 'contour']
+    PLOT_TYPE_OPTIONS += sorted(set(PlotFactory.PLOT_TYPES) - set(PLOT_TYPE_OPTIONS))
+    X_MANDATORY = ['scatter', 'bar', 'histogram', '2dhistogram', 'polar', 'contour', 'ternary']
+    Y_MANDATORY = ['scatter', 'box', 'bar', 'pie', '2dhistogram', 'polar', 'contour', 'ternary', 'violin']
+    Z_MANDATORY = ['ternary']
     XFIELD = 'XFIELD'
     YFIELD = 'YFIELD'
+    ZFIELD = 'ZFIELD'
     IN_COLOR = 'IN_COLOR'
     IN_COLOR_OPTIONS = ['Black', 'Blue', 'Brown', 'Cyan', 'DarkBlue', 'Grey', 'Green', 'LightBlue', 'Lime', 'Magenta',
                         'Maroon', 'Olive', 'Orange', 'Purple', 'Red', 'Silver', 'White', 'Yellow']
     IN_COLOR_HTML = 'IN_COLOR_HTML'
+    IMAGE_WIDTH = 'IMAGE_WIDTH'
+    IMAGE_HEIGHT = 'IMAGE_HEIGHT'
     OUTPUT_HTML_FILE = 'OUTPUT_HTML_FILE'
     OUTPUT_JSON_FILE = 'OUTPUT_JSON_FILE'
+    OUTPUT_IMAGE_FILE = 'OUTPUT_IMAGE_FILE'
 
     def __init__(self):
         super().__init__()
@@ -84,7 +98,39 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
         return QCoreApplication.translate(context, string)
 
     def initAlgorithm(self, config=None):
+        self.add_plot_parameters()
 
+        self.addParameter(
+            QgsProcessingParameterFileDestination(self.OUTPUT_HTML_FILE,
+                                                  self.tr('HTML File'),
+                                                  self.tr('HTML files (*.html)')
+                                                  )
+        )
+
+        # Add an file to return a response in JSON format
+        self.addParameter(
+            QgsProcessingParameterFileDestination(self.OUTPUT_JSON_FILE,
+                                                  self.tr('JSON file'),
+                                                  self.tr('JSON Files (*.json)'),
+                                                  optional=True,
+                                                  createByDefault=False
+                                                  )
+        )
+
+        # Static image, for the plot types supported by the static renderer
+        self.addParameter(
+            QgsProcessingParameterFileDestination(self.OUTPUT_IMAGE_FILE,
+                                                  self.tr('Image file'),
+                                                  self.tr('PNG files (*.png);;SVG files (*.svg)'),
+                                                  optional=True,
+                                                  createByDefault=False
+                                                  )
+        )
+
+    def add_plot_parameters(self):
+        """
+        Adds the parameters defining the plot, shared by the plot algorithms
+        """
         self.addParameter(
             QgsProcessingParameterFeatureSource(
                 self.INPUT,
@@ -109,21 +155,28 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
         )
 
         self.addParameter(
-            QgsProcessingParameterField(
+            QgsProcessingParameterExpression(
                 self.XFIELD,
                 self.tr('X Field'),
                 parentLayerParameterName=self.INPUT,
-                type=QgsProcessingParameterField.Any,
                 optional=True
             )
         )
 
         self.addParameter(
-            QgsProcessingParameterField(
+            QgsProcessingParameterExpression(
                 self.YFIELD,
                 self.tr('Y Field'),
                 parentLayerParameterName=self.INPUT,
-                type=QgsProcessingParameterField.Any,
+                optional=True
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterExpression(
+                self.ZFIELD,
+                self.tr('Z Field'),
+                parentLayerParameterName=self.INPUT,
                 optional=True
             )
         )
@@ -147,18 +200,21 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
         )
 
         self.addParameter(
-            QgsProcessingParameterFileDestination(self.OUTPUT_HTML_FILE,
-                                                  self.tr('HTML File'),
-                                                  self.tr('HTML files (*.html)')
-                                                  )
+            QgsProcessingParameterNumber(
+                self.IMAGE_WIDTH,
+                self.tr('Image width (pixels)'),
+                minValue=1,
+                defaultValue=800
+            )
         )
 
-        # Add an file to return a response in JSON format
         self.addParameter(
-            QgsProcessingParameterFileDestination(self.OUTPUT_JSON_FILE,
-                                                  self.tr('JSON file'),
-                                                  self.tr('JSON Files (*.json)')
-                                                  )
+            QgsProcessingParameterNumber(
+                self.IMAGE_HEIGHT,
+                self.tr('Image height (pixels)'),
+                minValue=1,
+                defaultValue=600
+            )
         )
 
     def name(self):
@@ -178,67 +234,114 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
     def groupId(self):
         return 'plots'
 
-    def processAlgorithm(self, parameters, context, feedback):
+    def prepare_expression(self, source, text, context):
         """
-        :param parameters:
-        :param context:
+        Returns a prepared expression for a field name or expression text, and
+        its title (the field alias or the expression itself)
         """
+        fields = source.fields()
+        index = fields.lookupField(text)
+        if index >= 0:
+            title = fields.at(index).alias() or fields.at(index).name()
+            text = QgsExpression.quotedColumnRef(fields.at(index).name())
+        else:
+            title = text
+
+        expression = QgsExpression(text)
+        if expression.hasParserError():
+            raise QgsProcessingException(
+                self.tr('Invalid expression {}: {}').format(title, expression.parserErrorString()))
+        expression.prepare(context)
+        return expression, title
+
+    def fetch_values(self, source, expressions, context, feedback):
+        """
+        Fetches the feature ids and the values of the expressions from the source,
+        in a single pass. Features with a NULL value for any expression are skipped.
 
-        layer = self.parameterAsSource(parameters, self.INPUT, context)
-        fields = layer.fields()
-
-        xfieldname = self.parameterAsString(parameters, self.XFIELD, context)
-        yfieldname = self.parameterAsString(parameters, self.YFIELD, context)
+        Returns None if the algorithm was canceled.
+        """
+        request = QgsFeatureRequest()
+        attributes = set()
+        needs_geometry = False
+        for expression in expressions:
+            attributes.update(expression.referencedColumns())
+            needs_geometry = needs_geometry or expression.needsGeometry()
+        request.setSubsetOfAttributes(attributes, source.fields())
+        if not needs_geometry:
+            request.setFlags(QgsFeatureRequest.NoGeometry)
+
+        feature_ids = []
+        columns = [[] for _ in expressions]
+        total = 100.0 / source.featureCount() if source.featureCount() else 0
+        for current, f in enumerate(source.getFeatures(request)):
+            if feedback.isCanceled():
+                return None
+
+            context.setFeature(f)
+            values = [expression.evaluate(context) for expression in expressions]
+            if not any(v == NULL or v is None for v in values):
+                feature_ids.append(f.id())
+                for column, value in zip(columns, values):
+                    column.append(value)
+
+            feedback.setProgress(int(current * total))
+
+        return feature_ids, columns
+
+    def prepare_inputs(self, parameters, context, feedback):
+        """
+        Checks and prepares the source and axes of the plot.
 
-        outputHtmlFile = self.parameterAsFileOutput(parameters, self.OUTPUT_HTML_FILE, context)
-        outputJsonFile = self.parameterAsFileOutput(parameters, self.OUTPUT_JSON_FILE, context)
+        Returns the source, plot type, the plotted axes, their prepared expressions
+        and titles, and the expression context.
+        """
+        source = self.parameterAsSource(parameters, self.INPUT, context)
+        if source is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+
+        field_names = {
+            'x': self.parameterAsExpression(parameters, self.XFIELD, context),
+            'y': self.parameterAsExpression(parameters, self.YFIELD, context),
+            'z': self.parameterAsExpression(parameters, self.ZFIELD, context)
+        }
 
-        plot_type = 'bar'
         plot_type_input = self.parameterAsInt(parameters, self.PLOT_TYPE, context)
         plot_type = self.PLOT_TYPE_OPTIONS[plot_type_input]
 
-        plot_title = self.parameterAsString(parameters, self.PLOT_TITLE, context)
-
-        in_color_input = self.parameterAsInt(parameters, self.IN_COLOR, context)
-        in_color_hex = self.IN_COLOR_OPTIONS[in_color_input]
-        in_color_html = self.parameterAsString(parameters, self.IN_COLOR_HTML, context)
-
         # Some controls
         msg = []
-        if plot_type in self.X_MANDATORY and not xfieldname:
+        if plot_type in self.X_MANDATORY and not field_names['x']:
             msg.append(self.tr("The chosen plot type needs a X field !"))
-        if plot_type in self.Y_MANDATORY and not yfieldname:
+        if plot_type in self.Y_MANDATORY and not field_names['y']:
             msg.append(self.tr("The chosen plot type needs a Y field !"))
+        if plot_type in self.Z_MANDATORY and not field_names['z']:
+            msg.append(self.tr("The chosen plot type needs a Z field !"))
         if msg:
             feedback.reportError(' '.join(msg))
-            raise QgsProcessingException(msg)
-
-        # Build needed dictionary
-        settings = PlotSettings(plot_type)
-        properties = {}
-
-        # Add X dimension
-        x_title = ''
-        if xfieldname:
-            # get field index for x
-            idxX = layer.fields().lookupField(xfieldname)
-            # get list of values for x
-            x_var = [i[xfieldname] for i in layer.getFeatures(
-                QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([idxX]))]
-            fieldTypeX = fields[idxX].type()
-            x_title = fields[idxX].alias() or xfieldname
-            properties.x = x_var
-
-        # Add Y dimension
-        y_title = ''
-        if yfieldname:
-            # get field index for y
-            idxY = layer.fields().lookupField(yfieldname)
-            # get list of values for y
-            y_var = [i[yfieldname] for i in layer.getFeatures(
-                QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry).setSubsetOfAttributes([idxY]))]
-            y_title = fields[idxY].alias() or yfieldname
-            properties.y = y_var
+            raise QgsProcessingException(' '.join(msg))
+
+        expression_context = self.createExpressionContext(parameters, context, source)
+        axes = [axis for axis in ('x', 'y', 'z') if field_names[axis]]
+        expressions = []
+        titles = {}
+        for axis in axes:
+            expression, titles[axis] = self.prepare_expression(source, field_names[axis], expression_context)
+            expressions.append(expression)
+
+        return source, plot_type, axes, expressions, titles, expression_context
+
+    def create_settings(self, parameters, context, plot_type, titles, default_title):  # pylint: disable=too-many-arguments
+        """
+        Creates the settings of a plot, without values
+        """
+        plot_title = self.parameterAsString(parameters, self.PLOT_TITLE, context)
+
+        in_color_input = self.parameterAsInt(parameters, self.IN_COLOR, context)
+        in_color_hex = self.IN_COLOR_OPTIONS[in_color_input]
+        in_color_html = self.parameterAsString(parameters, self.IN_COLOR_HTML, context)
+
+        properties = {'{}_name'.format(axis): title for axis, title in titles.items()}
 
         # Draw only markers for scatter plot
         if plot_type in ['scatter', 'polar']:
@@ -249,14 +352,40 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
 
         # Add layout
         layout = {
-            'title': plot_title or layer.sourceName()
+            'title': plot_title or default_title
         }
-        if plot_type in self.X_MANDATORY:
-            layout['x_title'] = x_title
-        if plot_type in self.Y_MANDATORY:
-            layout['y_title'] = y_title
+        if 'x' in titles:
+            layout['x_title'] = titles['x']
+        if 'y' in titles:
+            layout['y_title'] = titles['y']
+        if 'z' in titles:
+            layout['z_title'] = titles['z']
+
+        return PlotSettings(plot_type, properties=properties, layout=layout)
+
+    def processAlgorithm(self, parameters, context, feedback):
+        """
+        :param parameters:
+        :param context:
+        """
+
+        source, plot_type, axes, expressions, titles, expression_context = self.prepare_inputs(
+            parameters, context, feedback)
+
+        outputHtmlFile = self.parameterAsFileOutput(parameters, self.OUTPUT_HTML_FILE, context)
+        outputJsonFile = self.parameterAsFileOutput(parameters, self.OUTPUT_JSON_FILE, context)
+        outputImageFile = self.parameterAsFileOutput(parameters, self.OUTPUT_IMAGE_FILE, context)
 
-        settings = PlotSettings(plot_type, properties=properties, layout=layout)
+        # a single pass over the source for all the axes
+        fetched = self.fetch_values(source, expressions, expression_context, feedback)
+        if fetched is None:
+            return {}
+        feature_ids, columns = fetched
+
+        settings = self.create_settings(parameters, context, plot_type, titles, source.sourceName())
+        settings.feature_ids = feature_ids
+        for axis, column in zip(axes, columns):
+            setattr(settings, axis, column)
 
         # Create plot instance
         factory = PlotFactory(settings)
@@ -264,25 +393,203 @@ class DataPlotlyProcessingPlot(QgisAlgorithm):
         # Prepare results
         results = {
             self.OUTPUT_HTML_FILE: None,
-            self.OUTPUT_JSON_FILE: None
+            self.OUTPUT_JSON_FILE: None,
+            self.OUTPUT_IMAGE_FILE: None
         }
 
         # Save plot as HTML
         if outputHtmlFile:
-            standalone_plot_path = factory.build_figure()
-            if os.path.isfile(standalone_plot_path):
-                # html file output
-                copyfile(standalone_plot_path, outputHtmlFile)
-                results[self.OUTPUT_HTML_FILE] = outputHtmlFile
+            PlotWriter.write_html(factory, outputHtmlFile)
+            results[self.OUTPUT_HTML_FILE] = outputHtmlFile
 
         # Save plot as JSON
         if outputJsonFile:
-            ojson = {
-                'data': trace,
-                'layout': plot_layout
-            }
-            with codecs.open(outputJsonFile, 'w', encoding='utf-8') as f:
-                f.write(json.dumps(ojson))
-                results[self.OUTPUT_JSON_FILE] = outputJsonFile
+            PlotWriter.write_json(factory, outputJsonFile)
+            results[self.OUTPUT_JSON_FILE] = outputJsonFile
+
+        # Save plot as a static image
+        if outputImageFile:
+            if not PlotWriter.supports_image(plot_type):
+                feedback.reportError(
+                    self.tr('Static images are not available for {} plots').format(plot_type))
+            elif PlotWriter.write_image(factory, outputImageFile,
+                                        self.parameterAsInt(parameters, self.IMAGE_WIDTH, context),
+                                        self.parameterAsInt(parameters, self.IMAGE_HEIGHT, context)):
+                results[self.OUTPUT_IMAGE_FILE] = outputImageFile
+            else:
+                feedback.reportError(self.tr('Could not write image {}').format(outputImageFile))
 
         return results
+
+
+class DataPlotlyProcessingSmallMultiples(DataPlotlyProcessingPlot):
+    """
+    Create one plot per category of a group-by field or expression
+    """
+
+    GROUP_BY = 'GROUP_BY'
+    OUTPUT_FORMATS = 'OUTPUT_FORMATS'
+    OUTPUT_FORMAT_OPTIONS = ['HTML', 'JSON', 'SVG']
+    OUTPUT_FOLDER = 'OUTPUT_FOLDER'
+    OUTPUT = 'OUTPUT'
+
+    def initAlgorithm(self, config=None):
+        self.add_plot_parameters()
+
+        self.addParameter(
+            QgsProcessingParameterExpression(
+                self.GROUP_BY,
+                self.tr('Group by'),
+                parentLayerParameterName=self.INPUT
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.OUTPUT_FORMATS,
+                self.tr('Output formats'),
+                options=self.OUTPUT_FORMAT_OPTIONS,
+                allowMultiple=True,
+                defaultValue=[0]
+            )
+        )
+
+        self.addParameter(
+            QgsProcessingParameterFolderDestination(
+                self.OUTPUT_FOLDER,
+                self.tr('Output folder')
+            )
+        )
+
+        # one row per group, with the paths of the written files
+        self.addParameter(
+            QgsProcessingParameterFeatureSink(
+                self.OUTPUT,
+                self.tr('Plot index')
+            )
+        )
+
+    def name(self):
+        return 'build_small_multiples'
+
+    def displayName(self):
+        return self.tr('Build small multiples')
+
+    def shortDescription(self):
+        return self.tr('Creates one plot for each category of a field or expression')
+
+    @staticmethod
+    def group_name(value) -> str:
+        """
+        Returns the name of the group of a group-by value
+        """
+        if isinstance(value, (QDate, QDateTime, QTime)):
+            return value.toString(Qt.ISODate)
+        return str(value)
+
+    @staticmethod
+    def file_name(index: int, group: str) -> str:
+        """
+        Returns a unique file name (without extension) for a group
+        """
+        return '{:04d}_{}'.format(index, re.sub(r'[^\w\-]+', '_', group).strip('_')[:50])
+
+    def processAlgorithm(self, parameters, context, feedback):  # pylint: disable=too-many-locals
+        """
+        :param parameters:
+        :param context:
+        """
+
+        source, plot_type, axes, expressions, titles, expression_context = self.prepare_inputs(
+            parameters, context, feedback)
+
+        group_expression, group_title = self.prepare_expression(
+            source, self.parameterAsExpression(parameters, self.GROUP_BY, context), expression_context)
+
+        formats = [self.OUTPUT_FORMAT_OPTIONS[i] for i in self.parameterAsEnums(parameters, self.OUTPUT_FORMATS, context)]
+        if 'SVG' in formats and not PlotWriter.supports_image(plot_type):
+            feedback.reportError(self.tr('Static images are not available for {} plots').format(plot_type))
+            formats.remove('SVG')
+
+        folder = self.parameterAsString(parameters, self.OUTPUT_FOLDER, context)
+        os.makedirs(folder, exist_ok=True)
+        width = self.parameterAsInt(parameters, self.IMAGE_WIDTH, context)
+        height = self.parameterAsInt(parameters, self.IMAGE_HEIGHT, context)
+
+        fields = QgsFields()
+        fields.append(QgsField('group', QVariant.String))
+        fields.append(QgsField('count', QVariant.Int))
+        for output_format in self.OUTPUT_FORMAT_OPTIONS:
+            fields.append(QgsField(output_format.lower(), QVariant.String))
+        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT, context, fields,
+                                               QgsWkbTypes.NoGeometry, source.sourceCrs())
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, self.OUTPUT))
+
+        multi_step_feedback = QgsProcessingMultiStepFeedback(2, feedback)
+
+        # a single pass over the source for all the axes and the groups. Features
+        # with a NULL group are skipped, like features with NULL values
+        fetched = self.fetch_values(source, expressions + [group_expression], expression_context, multi_step_feedback)
+        if fetched is None:
+            return {}
+        feature_ids, columns = fetched
+        groups = columns.pop()
+
+        # group -> (feature ids, columns)
+        partitions = OrderedDict()
+        for i, group in enumerate(groups):
+            partition = partitions.setdefault(self.group_name(group), ([], [[] for _ in axes]))
+            partition[0].append(feature_ids[i])
+            for partition_column, column in zip(partition[1], columns):
+                partition_column.append(column[i])
+
+        multi_step_feedback.setCurrentStep(1)
+
+        # the settings are created here, as the processing context can't be used from other threads
+        group_settings = []
+        for group, partition in partitions.items():
+            settings = self.create_settings(parameters, context, plot_type, titles,
+                                            '{}: {}'.format(group_title, group))
+            settings.feature_ids = partition[0]
+            for axis, column in zip(axes, partition[1]):
+                setattr(settings, axis, column)
+            group_settings.append(settings)
+
+        def write_group(index, group, settings):
+            if feedback.isCanceled():
+                return None
+
+            factory = PlotFactory(settings)
+
+            paths = {}
+            base_path = os.path.join(folder, self.file_name(index, group))
+            if 'HTML' in formats:
+                paths['HTML'] = base_path + '.html'
+                PlotWriter.write_html(factory, paths['HTML'])
+            if 'JSON' in formats:
+                paths['JSON'] = base_path + '.json'
+                PlotWriter.write_json(factory, paths['JSON'])
+            if 'SVG' in formats:
+                paths['SVG'] = base_path + '.svg'
+                if not PlotWriter.write_image(factory, paths['SVG'], width, height):
+                    del paths['SVG']
+            return paths
+
+        # plots are independent of each other, so they are built and written in parallel
+        total = 100.0 / len(partitions) if partitions else 0
+        with ThreadPoolExecutor(max_workers=max(1, QThread.idealThreadCount())) as executor:
+            futures = [executor.submit(write_group, index, group, settings)
+                       for index, (group, settings) in enumerate(zip(partitions, group_settings))]
+            for current, (future, (group, partition)) in enumerate(zip(futures, partitions.items())):
+                paths = future.result()
+                if paths is None:
+                    break
+
+                f = QgsFeature(fields)
+                f.setAttributes([group, len(partition[0])] +
+                                [paths.get(output_format) for output_format in self.OUTPUT_FORMAT_OPTIONS])
+                sink.addFeature(f, QgsFeatureSink.FastInsert)
+                multi_step_feedback.setProgress(int(current * total))
+
+        return {self.OUTPUT_FOLDER: folder, self.OUTPUT: dest_id}
@@ -21,7 +21,7 @@
  ***************************************************************************/
 """
 from qgis.core import QgsProcessingProvider
-from DataPlotly.processing.dataplotly_algorithms import DataPlotlyProcessingPlot
+from DataPlotly.processing.dataplotly_algorithms import DataPlotlyProcessingPlot, DataPlotlyProcessingSmallMultiples
 from DataPlotly.gui.gui_utils import GuiUtils
 
 
@@ -79,3 +79,4 @@ class DataPlotlyProvider(QgsProcessingProvider):
         cleared before calling this method.
         """
         self.addAlgorithm(DataPlotlyProcessingPlot())
+        self.addAlgorithm(DataPlotlyProcessingSmallMultiples())
@@ -0,0 +1,76 @@
+# coding=utf-8
+"""Atlas prefetch test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsGeometry,
+    QgsCoordinateReferenceSystem
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_factory import PlotFactory, FilterRegion
+from DataPlotly.core.atlas_prefetch import AtlasPrefetch
+
+
+class DataPlotlyAtlasPrefetch(unittest.TestCase):
+    """Test atlas prefetching"""
+
+    def test_prefetch(self):
+        """
+        Test that prefetched values match the values fetched for each region
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        vl1.setSubsetString('id < 10')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.layout['additional_info_expression'] = 'id'
+        self.assertTrue(AtlasPrefetch.is_supported(settings))
+
+        prefetch = AtlasPrefetch(settings)
+        regions = [FilterRegion(QgsGeometry.fromWkt('Polygon((10.1 43.5, 10.8 43.5, 10.8 43.85, 10.1 43.85, 10.1 43.5))'),
+                                QgsCoordinateReferenceSystem(4326)),
+                   FilterRegion(QgsGeometry.fromWkt('Polygon((10.6 43.1, 12 43.1, 12 43.8, 10.6 43.8, 10.6 43.1))'),
+                                QgsCoordinateReferenceSystem(4326)),
+                   FilterRegion(QgsGeometry.fromWkt('Polygon((1167379 5310986, 1367180 5310986, 1367180 5391728, 1167379 5391728, 1167379 5310986))'),
+                                QgsCoordinateReferenceSystem(3857))]
+
+        for key, region in enumerate(regions):
+            page_settings = prefetch.settings_for_region(key, region)
+
+            settings.properties['visible_features_only'] = True
+            factory = PlotFactory(settings, polygon_filter=FilterRegion(QgsGeometry(region.geometry), region.crs()))
+            self.assertEqual(page_settings.x, factory.settings.x)
+            self.assertEqual(page_settings.y, factory.settings.y)
+            self.assertEqual(page_settings.feature_ids, factory.settings.feature_ids)
+            self.assertEqual(page_settings.additional_hover_text, factory.settings.additional_hover_text)
+            self.assertTrue(page_settings.x)
+
+        # cached partitions
+        self.assertEqual(list(prefetch.partitions.keys()), [0, 1, 2])
+
+        # atlas dependent expressions can't be prefetched
+        settings.properties['y_name'] = '"ca" * @atlas_featureid'
+        self.assertFalse(AtlasPrefetch.is_supported(settings))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyAtlasPrefetch)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
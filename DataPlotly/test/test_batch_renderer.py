@@ -0,0 +1,116 @@
+# coding=utf-8
+"""Batch renderer test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from qgis.PyQt.QtGui import QImage
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsProperty
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.batch_renderer import BatchRenderer
+from DataPlotly.test.utilities import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class DataPlotlyBatchRenderer(unittest.TestCase):
+    """Test headless batch rendering"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.layer_path = os.path.join(os.path.dirname(__file__), 'test_layer.shp')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_used_fields(self):
+        """
+        Test collecting the fields used by plots
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        scatter = PlotSettings('scatter')
+        scatter.properties['x_name'] = 'so4'
+        scatter.properties['y_name'] = '"ca" * 2'
+        self.assertEqual(BatchRenderer.used_field_names(vl1, [scatter]), ({'so4', 'ca'}, False))
+
+        bar = PlotSettings('bar')
+        bar.properties['x_name'] = 'profo'
+        bar.properties['y_name'] = '$area'
+        self.assertEqual(BatchRenderer.used_field_names(vl1, [scatter, bar]), ({'so4', 'ca', 'profo'}, True))
+
+        scatter.data_defined_properties.setProperty(PlotSettings.PROPERTY_COLOR, QgsProperty.fromField('mg'))
+        self.assertEqual(BatchRenderer.used_field_names(vl1, [scatter])[0], {'so4', 'ca', 'mg'})
+
+    def test_render(self):
+        """
+        Test rendering settings files
+        """
+        settings_files = []
+        for plot_type in ('scatter', 'bar'):
+            settings = PlotSettings(plot_type)
+            settings.properties['x_name'] = 'so4'
+            settings.properties['y_name'] = 'ca'
+            settings_file = os.path.join(self.temp_dir, '{}.xml'.format(plot_type))
+            self.assertTrue(settings.write_to_file(settings_file))
+            settings_files.append(settings_file)
+
+        output_dir = os.path.join(self.temp_dir, 'output')
+        layers = len(QgsProject.instance().mapLayers())
+        renderer = BatchRenderer(output_dir, formats=('html', 'json', 'png'), processes=1)
+        results = renderer.run(settings_files, layer_path=self.layer_path)
+        # snapshot layers are released
+        self.assertEqual(len(QgsProject.instance().mapLayers()), layers)
+
+        self.assertEqual(len(results), 2)
+        for settings_file, paths, error in results:
+            self.assertIsNone(error, settings_file)
+            self.assertEqual([os.path.splitext(p)[1] for p in paths], ['.html', '.json', '.png'])
+            self.assertTrue(all(os.path.isfile(p) for p in paths))
+            self.assertFalse(QImage(paths[2]).isNull())
+
+        with open(os.path.join(output_dir, 'scatter.json')) as f:
+            figure = json.load(f)
+        self.assertEqual(figure['data'][0]['x'][:3], [98, 88, 267])
+
+    def test_feature_ids(self):
+        """
+        Test that snapshots keep the feature ids and name of the source layer
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        settings = PlotSettings('scatter')
+        settings.properties['x_name'] = '$id'
+        settings.properties['y_name'] = 'ca'
+        settings.layout['additional_info_expression'] = '@layer_name'
+        settings_file = os.path.join(self.temp_dir, 'ids.xml')
+        self.assertTrue(settings.write_to_file(settings_file))
+
+        output_dir = os.path.join(self.temp_dir, 'output')
+        renderer = BatchRenderer(output_dir, formats=('json',), processes=1)
+        (_, paths, error), = renderer.run([settings_file], layer_path=self.layer_path)
+        self.assertIsNone(error)
+
+        with open(paths[0]) as f:
+            figure = json.load(f)
+        feature_ids = [f.id() for f in vl1.getFeatures()]
+        self.assertEqual(figure['data'][0]['x'], feature_ids)
+        self.assertEqual([int(i) for i in figure['data'][0]['ids']], feature_ids)
+        self.assertIn('test_layer', figure['data'][0]['text'][0])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyBatchRenderer)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
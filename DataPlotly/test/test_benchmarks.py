@@ -0,0 +1,137 @@
+# coding=utf-8
+"""Benchmark suite test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+from qgis.core import QgsProject
+from DataPlotly.benchmarks.layers import create_memory_layer, create_geopackage_layer
+from DataPlotly.benchmarks.suite import BenchmarkSuite, parse_thresholds
+from DataPlotly.core.columnar_reader import ColumnarReader
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.test.utilities import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+# maximum peak memory allocated while building a plot, in bytes per plotted feature
+MEMORY_BUDGETS = {
+    'ternary': 8192
+}
+DEFAULT_MEMORY_BUDGET = 4096
+
+
+class DataPlotlyBenchmarks(unittest.TestCase):
+    """Test the benchmark suite"""
+
+    def test_layers(self):
+        """
+        Test creating synthetic layers
+        """
+        layer = create_memory_layer(25)
+        self.assertEqual(layer.featureCount(), 25)
+        self.assertEqual(layer.fields().names(), ['int_value', 'double_value', 'ratio', 'category', 'label', 'date'])
+        # layers are reproducible
+        self.assertEqual([f.attributes() for f in layer.getFeatures()],
+                         [f.attributes() for f in create_memory_layer(25).getFeatures()])
+
+        temp_dir = tempfile.mkdtemp()
+        try:
+            layer = create_geopackage_layer(os.path.join(temp_dir, 'synthetic.gpkg'), 25)
+            self.assertTrue(layer.isValid())
+            self.assertEqual(layer.featureCount(), 25)
+        finally:
+            del layer
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def test_suite(self):
+        """
+        Test running the benchmarks
+        """
+        results = BenchmarkSuite(sizes=[200], providers=['memory'], repeat=1, measure_memory=False,
+                                 serializer_size=0, columnar_size=0).run()
+        self.assertEqual(set(results['results']), {'memory/200/{}'.format(t) for t in PlotFactory.PLOT_TYPES})
+        for key, result in results['results'].items():
+            for phase in ('fetch', 'trace', 'layout', 'html'):
+                self.assertIsNotNone(result[phase], key)
+            self.assertEqual(result['features'], 200, key)
+        self.assertIsNotNone(results['results']['memory/200/scatter']['selection'])
+        self.assertIsNone(results['results']['memory/200/contour']['selection'])
+        self.assertIsNone(results['results']['memory/200/contour']['peak_memory'])
+        self.assertIsNone(results['serializer'])
+        self.assertIsNone(results['columnar'])
+
+    def test_serializer(self):
+        """
+        Test benchmarking the figure serializer
+        """
+        result = BenchmarkSuite(repeat=1).run_serializer(1000)
+        self.assertEqual(result['values'], 1000)
+        self.assertGreater(result['plotly'], 0)
+        self.assertGreater(result['serializer'], 0)
+        self.assertEqual(result['speedup'], result['plotly'] / result['serializer'])
+
+    @unittest.skipIf(not ColumnarReader.is_available(), 'columnar reading is not available')
+    def test_columnar(self):
+        """
+        Test benchmarking the columnar reader
+        """
+        result = BenchmarkSuite(repeat=1).run_columnar(1000)
+        if result is None:
+            self.skipTest('FlatGeobuf is not available')
+        self.assertEqual(result['values'], 1000)
+        self.assertGreater(result['iterator'], 0)
+        self.assertGreater(result['columnar'], 0)
+        self.assertEqual(result['speedup'], result['iterator'] / result['columnar'])
+        # the setting disabling the columnar reader is restored
+        self.assertTrue(ColumnarReader.is_available())
+
+    def test_memory(self):
+        """
+        Test the peak memory of building each plot type
+        """
+        layer = create_memory_layer(2000)
+        QgsProject.instance().addMapLayer(layer, False)
+        try:
+            suite = BenchmarkSuite(repeat=1)
+            for plot_type in PlotFactory.PLOT_TYPES:
+                peak, features = suite.memory_usage(layer, plot_type)
+                self.assertEqual(features, 2000, plot_type)
+                self.assertGreater(peak, 0, plot_type)
+                self.assertLess(peak / features, MEMORY_BUDGETS.get(plot_type, DEFAULT_MEMORY_BUDGET), plot_type)
+
+            result = suite.run_plot(layer, 'scatter')
+            self.assertGreater(result['peak_memory'], 0)
+            self.assertEqual(result['memory_per_feature'], result['peak_memory'] / 2000)
+        finally:
+            QgsProject.instance().removeMapLayer(layer.id())
+
+    def test_compare(self):
+        """
+        Test detecting regressions
+        """
+        baseline = {'results': {'a': {'fetch': 1.0, 'trace': 0.001, 'html': 1.0, 'selection': None}}}
+        current = {'results': {'a': {'fetch': 1.3, 'trace': 0.004, 'html': 1.1, 'selection': 1.0},
+                               'b': {'fetch': 2.0}}}
+        self.assertEqual(BenchmarkSuite.compare(baseline, current), [('a', 'fetch', 1.0, 1.3)])
+        self.assertEqual(BenchmarkSuite.compare(baseline, current, {'fetch': 0.5}), [])
+        self.assertEqual(BenchmarkSuite.compare(baseline, current, default_threshold=0.05),
+                         [('a', 'fetch', 1.0, 1.3), ('a', 'html', 1.0, 1.1)])
+
+        baseline = {'results': {'a': {'peak_memory': 1000000}, 'b': {'peak_memory': 100000}}}
+        current = {'results': {'a': {'peak_memory': 1500000}, 'b': {'peak_memory': 150000}}}
+        self.assertEqual(BenchmarkSuite.compare(baseline, current), [('a', 'peak_memory', 1000000, 1500000)])
+        self.assertEqual(parse_thresholds(['0.1', 'fetch=0.5']), (0.1, {'fetch': 0.5}))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyBenchmarks)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
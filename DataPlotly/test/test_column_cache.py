@@ -0,0 +1,161 @@
+# coding=utf-8
+"""Column cache test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+import glob
+import shutil
+import tempfile
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsSettings
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.column_cache import ColumnCache, numpy
+
+
+@unittest.skipIf(numpy is None, 'numpy is not available')
+class DataPlotlyColumnCache(unittest.TestCase):
+    """Test the persistent column cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        for file in glob.glob(os.path.join(os.path.dirname(__file__), 'test_layer.*')):
+            shutil.copy(file, self.temp_dir)
+        self.layer_path = os.path.join(self.temp_dir, 'test_layer.shp')
+        QgsSettings().setValue('dataplotly/column_cache', True)
+
+    def tearDown(self):
+        QgsSettings().remove('dataplotly/column_cache')
+        ColumnCache().clear()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_store_load(self):
+        """
+        Test storing and loading columns
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+
+        cache = ColumnCache(os.path.join(self.temp_dir, 'cache'))
+        fields = {'x': 'so4', 'y': 'ca'}
+        self.assertIsNone(cache.load(vl1, fields))
+
+        cache.store(vl1, fields, [1, 2, 3], {'x': [98, 88, 267], 'y': [81.87, 22.26, 74.16]})
+        feature_ids, columns = cache.load(vl1, fields)
+        self.assertEqual(feature_ids, [1, 2, 3])
+        self.assertIsInstance(columns['x'], numpy.memmap)
+        self.assertEqual(columns['x'].tolist(), [98, 88, 267])
+        self.assertEqual(columns['y'].tolist(), [81.87, 22.26, 74.16])
+
+        # entries depend on fields and subset
+        self.assertIsNone(cache.load(vl1, {'x': 'so4', 'y': 'mg'}))
+        vl1.setSubsetString('id < 10')
+        self.assertIsNone(cache.load(vl1, fields))
+        vl1.setSubsetString('')
+        self.assertIsNotNone(cache.load(vl1, fields))
+
+        # changing the source invalidates entries
+        stat = os.stat(self.layer_path.replace('.shp', '.dbf'))
+        os.utime(self.layer_path.replace('.shp', '.dbf'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(cache.load(vl1, fields))
+
+        # only numeric columns are cached
+        cache.store(vl1, fields, [1], {'x': ['a'], 'y': [1]})
+        self.assertIsNone(cache.load(vl1, fields))
+
+    def test_prune(self):
+        """
+        Test that entries of previous versions of the data are removed
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+
+        cache = ColumnCache(os.path.join(self.temp_dir, 'cache'))
+        fields = {'x': 'so4', 'y': 'ca'}
+        cache.store(vl1, fields, [1, 2, 3], {'x': [98, 88, 267], 'y': [81.87, 22.26, 74.16]})
+        cache.store(vl1, {'x': 'so4', 'y': 'mg'}, [1], {'x': [98], 'y': [1]})
+        self.assertEqual(len(cache.entries()), 2)
+
+        stat = os.stat(self.layer_path.replace('.shp', '.dbf'))
+        os.utime(self.layer_path.replace('.shp', '.dbf'), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        cache.store(vl1, fields, [1, 2], {'x': [98, 88], 'y': [81.87, 22.26]})
+        # the entry of the other fields is kept
+        self.assertEqual(len(cache.entries()), 2)
+        self.assertIn(cache.entry_path(vl1, fields), cache.entries())
+        self.assertEqual(cache.load(vl1, fields)[0], [1, 2])
+
+    def test_evict(self):
+        """
+        Test that the least recently used entries are removed when the cache is full
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+
+        cache = ColumnCache(os.path.join(self.temp_dir, 'cache'))
+        first = {'x': 'so4', 'y': 'ca'}
+        second = {'x': 'so4', 'y': 'mg'}
+        third = {'x': 'ca', 'y': 'mg'}
+        values = {'x': list(range(1000)), 'y': list(range(1000))}
+        cache.store(vl1, first, list(range(1000)), values)
+        cache.store(vl1, second, list(range(1000)), values)
+        entry_size = cache.entry_size(cache.entry_path(vl1, first))
+
+        # the first entry is used after the second one
+        os.utime(cache.entry_path(vl1, second), (0, 0))
+        self.assertIsNotNone(cache.load(vl1, first))
+
+        cache.max_size = entry_size * 2
+        cache.store(vl1, third, list(range(1000)), values)
+        self.assertIsNotNone(cache.load(vl1, first))
+        self.assertIsNone(cache.load(vl1, second))
+        self.assertIsNotNone(cache.load(vl1, third))
+
+    def test_factory(self):
+        """
+        Test that plots use cached columns
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+
+        factory = PlotFactory(settings)
+        self.assertIsInstance(factory.settings.x, list)
+        x = list(factory.settings.x)
+        y = list(factory.settings.y)
+        feature_ids = list(factory.settings.feature_ids)
+
+        factory = PlotFactory(settings)
+        self.assertIsInstance(factory.settings.x, numpy.memmap)
+        self.assertEqual(factory.settings.x.tolist(), x)
+        self.assertEqual(factory.settings.y.tolist(), y)
+        self.assertEqual(factory.settings.feature_ids, feature_ids)
+
+        # expressions and hover info are not cached
+        settings.layout['additional_info_expression'] = 'id'
+        self.assertIsNone(PlotFactory(settings).cacheable_fields())
+        settings.layout['additional_info_expression'] = ''
+        settings.properties['x_name'] = '"so4" * 2'
+        self.assertIsNone(PlotFactory(settings).cacheable_fields())
+
+        QgsProject.instance().removeMapLayer(vl1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyColumnCache)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
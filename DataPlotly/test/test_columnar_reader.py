@@ -0,0 +1,97 @@
+# coding=utf-8
+"""Columnar reader test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsVectorFileWriter,
+    QgsSettings
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.columnar_reader import ColumnarReader
+
+
+@unittest.skipIf(not ColumnarReader.is_available(), 'columnar reading is not available')
+class DataPlotlyColumnarReader(unittest.TestCase):
+    """Test reading columnar files"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        source = QgsVectorLayer(os.path.join(os.path.dirname(__file__), 'test_layer.shp'), 'test_layer', 'ogr')
+        self.layer_path = os.path.join(self.temp_dir, 'test_layer.fgb')
+        options = QgsVectorFileWriter.SaveVectorOptions()
+        options.driverName = 'FlatGeobuf'
+        error = QgsVectorFileWriter.writeAsVectorFormat(source, self.layer_path, options)
+        if isinstance(error, tuple):
+            error = error[0]
+        if error != QgsVectorFileWriter.NoError:
+            self.skipTest('FlatGeobuf is not available')
+
+    def tearDown(self):
+        QgsSettings().remove('dataplotly/columnar_reader')
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def fetch(self, settings):
+        """
+        Fetches plot values, returning the feature ids, x, y and hover values
+        """
+        factory = PlotFactory(settings)
+        return (factory.settings.feature_ids, factory.settings.x, factory.settings.y,
+                factory.settings.additional_hover_text)
+
+    def test_reader(self):
+        """
+        Test that columnar reads match the feature iterator
+        """
+        vl1 = QgsVectorLayer(self.layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.layout['additional_info_expression'] = 'profo'
+
+        factory = PlotFactory(settings, build=False)
+        self.assertEqual(factory.columnar_fields(), {'x': 'so4', 'y': 'ca', 'additional_info': 'profo'})
+
+        columnar = self.fetch(settings)
+
+        QgsSettings().setValue('dataplotly/columnar_reader', False)
+        self.assertIsNone(factory.columnar_fields())
+        iterated = self.fetch(settings)
+
+        self.assertEqual(columnar[0], iterated[0])
+        self.assertEqual(columnar[1], iterated[1])
+        self.assertEqual(columnar[2], iterated[2])
+        self.assertEqual([v if v else None for v in columnar[3]], [v if v else None for v in iterated[3]])
+
+        # subset strings are applied
+        QgsSettings().remove('dataplotly/columnar_reader')
+        vl1.setSubsetString('id < 10')
+        self.assertEqual(self.fetch(settings)[1], [98, 88, 267, 329, 319, 137, 350, 151, 203])
+
+        # expressions use the feature iterator
+        settings.properties['x_name'] = '"so4" * 2'
+        self.assertIsNone(PlotFactory(settings, build=False).columnar_fields())
+
+        QgsProject.instance().removeMapLayer(vl1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyColumnarReader)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
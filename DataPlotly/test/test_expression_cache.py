@@ -0,0 +1,78 @@
+# coding=utf-8
+"""Expression cache test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsField,
+    QgsFeature,
+    QgsExpressionContext,
+    QgsExpressionContextUtils
+)
+from qgis.PyQt.QtCore import QVariant
+from DataPlotly.core.expression_cache import ExpressionCache
+
+
+class DataPlotlyExpressionCache(unittest.TestCase):
+    """Test expression caching"""
+
+    def test_cache(self):
+        """
+        Test that expressions are cached until the layer fields change
+        """
+        layer = QgsVectorLayer('Point?field=a:integer&field=b:double', 'test', 'memory')
+        self.assertTrue(layer.isValid())
+
+        cached = ExpressionCache.cached_expression(layer, '"a" * 2 + "b"')
+        self.assertIs(ExpressionCache.cached_expression(layer, '"a" * 2 + "b"'), cached)
+        self.assertEqual(cached.field_index, -1)
+        self.assertEqual(cached.referenced_columns, {'a', 'b'})
+        self.assertFalse(cached.needs_geometry)
+        self.assertTrue(ExpressionCache.cached_expression(layer, '$x').needs_geometry)
+
+        field = ExpressionCache.cached_expression(layer, 'b')
+        self.assertIsNone(field.expression)
+        self.assertEqual(field.field_index, 1)
+
+        # each fetch gets its own prepared copy
+        context = QgsExpressionContext()
+        context.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes([3, 0.5])
+        context.setFeature(feature)
+        expression, needs_geometry, columns, index = ExpressionCache.field_or_expression(layer, '"a" * 2 + "b"', context)
+        self.assertIsNot(expression, cached.expression)
+        self.assertEqual(expression.evaluate(context), 6.5)
+        self.assertFalse(needs_geometry)
+        self.assertEqual(columns, {'a', 'b'})
+        self.assertEqual(index, -1)
+
+        self.assertEqual(ExpressionCache.field_or_expression(layer, 'b', context), (None, False, {'b'}, 1))
+
+        # changing fields invalidates the cache
+        layer.dataProvider().addAttributes([QgsField('c', QVariant.Int)])
+        layer.updateFields()
+        self.assertIsNot(ExpressionCache.cached_expression(layer, '"a" * 2 + "b"'), cached)
+        self.assertIsNone(ExpressionCache.cached_expression(layer, 'c').expression)
+
+        # the layer signals are connected once, and the layer is forgotten once deleted
+        self.assertIn(layer.id(), ExpressionCache._connected_layers)  # pylint: disable=protected-access
+        layer_id = layer.id()
+        QgsProject.instance().addMapLayer(layer)
+        QgsProject.instance().removeMapLayer(layer_id)
+        self.assertNotIn(layer_id, ExpressionCache._caches)  # pylint: disable=protected-access
+        self.assertNotIn(layer_id, ExpressionCache._connected_layers)  # pylint: disable=protected-access
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyExpressionCache)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,109 @@
+# coding=utf-8
+"""Figure serializer test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import datetime
+import io
+import json
+import plotly.graph_objs as go
+from plotly.utils import PlotlyJSONEncoder
+from qgis.PyQt.QtCore import (
+    QDate,
+    QDateTime,
+    QTime
+)
+from qgis.core import NULL
+from DataPlotly.core.figure_serializer import FigureSerializer
+from DataPlotly.test.utilities import get_qgis_app
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class DataPlotlyFigureSerializer(unittest.TestCase):
+    """Test the figure serializer"""
+
+    def assertSameJson(self, value):  # pylint: disable=invalid-name
+        """
+        Checks that a value is serialized like plotly's encoder does
+        """
+        self.assertEqual(json.loads(FigureSerializer.dumps(value)),
+                         json.loads(json.dumps(value, cls=PlotlyJSONEncoder)))
+
+    def test_plotly_objects(self):
+        """
+        Test serializing traces and layouts
+        """
+        traces = [go.Scatter(x=[1, 2.5, float('nan'), 4], y=[1, 2, 3, float('inf')], ids=[10, 11, 12, 13],
+                             text=['a', 'b', 'c', 'd'], marker={'color': 'red', 'size': [1, 2, 3, 4]}),
+                  go.Bar(x=['a', 'b'], y=[datetime.date(2020, 1, 2), datetime.datetime(2020, 1, 2, 3, 4, 5)])]
+        self.assertSameJson(traces)
+        self.assertSameJson(go.Layout(title='title', xaxis={'title': 'x'}, annotations=[{'text': 'a'}]))
+        self.assertSameJson({'data': traces, 'layout': go.Layout(barmode='stack')})
+
+    def test_chunks(self):
+        """
+        Test serializing sequences larger than a chunk
+        """
+        values = [float(i) if i % 7 else float('nan') for i in range(100)]
+        original_chunk_size = FigureSerializer.CHUNK_SIZE
+        FigureSerializer.CHUNK_SIZE = 16
+        try:
+            self.assertSameJson([values, tuple(range(100)), [{'a': i} for i in range(40)], []])
+            if numpy is not None:
+                self.assertSameJson(numpy.array(values))
+        finally:
+            FigureSerializer.CHUNK_SIZE = original_chunk_size
+
+    @unittest.skipIf(numpy is None, 'numpy is not available')
+    def test_numpy(self):
+        """
+        Test serializing numpy arrays and scalars
+        """
+        self.assertSameJson(numpy.array([1.5, numpy.nan, numpy.inf, 4]))
+        self.assertSameJson(numpy.arange(10, dtype=numpy.int32))
+        self.assertSameJson(numpy.array([[1, 2], [3, 4]]))
+        self.assertSameJson(numpy.array(['a', 'b']))
+        self.assertSameJson([numpy.float32(1.5), numpy.int64(3), numpy.bool_(True)])
+        self.assertEqual(json.loads(FigureSerializer.dumps(numpy.array(['2020-01-02', 'NaT'], dtype='datetime64[D]'))),
+                         ['2020-01-02', None])
+
+    def test_qgis_values(self):
+        """
+        Test serializing QVariant, NULL and Qt date values
+        """
+        self.assertEqual(json.loads(FigureSerializer.dumps([1, NULL, 'a'])), [1, None, 'a'])
+        self.assertEqual(json.loads(FigureSerializer.dumps([QDate(2020, 1, 2), QDate()])), ['2020-01-02', None])
+        self.assertEqual(json.loads(FigureSerializer.dumps(QDateTime(QDate(2020, 1, 2), QTime(3, 4, 5)))),
+                         '2020-01-02 03:04:05')
+        self.assertEqual(json.loads(FigureSerializer.dumps(QTime(3, 4, 5))), '03:04:05')
+        with self.assertRaises(TypeError):
+            FigureSerializer.dumps(object())
+
+    def test_write(self):
+        """
+        Test writing to a file like object
+        """
+        buffer = io.StringIO()
+        serializer = FigureSerializer(buffer)
+        serializer.write('var data = ')
+        serializer.dump({'x': [1, 2, 3]})
+        self.assertEqual(buffer.getvalue(), 'var data = {"x":[1,2,3]}')
+        self.assertEqual(serializer.written, len(buffer.getvalue()))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyFigureSerializer)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
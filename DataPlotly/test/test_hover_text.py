@@ -0,0 +1,134 @@
+# coding=utf-8
+"""Hover text test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from collections import OrderedDict
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsFeature,
+    QgsExpressionContext,
+    QgsExpressionContextUtils
+)
+from DataPlotly.core.hover_text import HoverTextProvider
+from DataPlotly.core.overlay_figure import OverlayFigure
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.test.utilities import get_qgis_app, create_factory
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+def create_layer():
+    """
+    Creates a memory layer with 3 features
+    """
+    layer = QgsVectorLayer('Point?field=a:integer&field=name:string', 'test', 'memory')
+    features = []
+    for a, name in ((1, 'one'), (2, None), (3, 'three')):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes([a, name])
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class DataPlotlyHoverText(unittest.TestCase):
+    """Test evaluating hover text on demand"""
+
+    def test_provider(self):
+        """
+        Test evaluating the hover text of single features
+        """
+        layer = create_layer()
+        context = QgsExpressionContext()
+        context.appendScopes(QgsExpressionContextUtils.globalProjectLayerScopes(layer))
+        fids = [f.id() for f in layer.getFeatures()]
+
+        provider = HoverTextProvider(layer, '"name" || \' \' || "a"', context)
+        self.assertEqual(provider.text(fids[0]), 'one 1')
+        self.assertEqual(provider.text(fids[1]), '')
+        self.assertIsNone(provider.text(1000))
+
+        provider = HoverTextProvider(layer, 'name', context)
+        self.assertEqual(provider.text(fids[2]), 'three')
+        self.assertEqual(provider.text(fids[1]), '')
+
+        # texts are cached
+        provider.CACHE_SIZE = 2
+        layer.dataProvider().changeAttributeValues({fids[2]: {1: 'changed'}})
+        self.assertEqual(provider.text(fids[2]), 'three')
+        self.assertEqual(provider.text(fids[0]), 'one')
+        self.assertEqual(list(provider.texts), [fids[2], fids[0]])
+
+    def test_factory(self):
+        """
+        Test that plots with hover text on demand don't evaluate it for every feature
+        """
+        layer = create_layer()
+        QgsProject.instance().addMapLayer(layer)
+        try:
+            settings = PlotSettings('scatter')
+            settings.source_layer_id = layer.id()
+            settings.properties['x_name'] = 'a'
+            settings.properties['y_name'] = 'a'
+            settings.layout['additional_info_expression'] = 'upper("name")'
+
+            factory = PlotFactory(settings)
+            self.assertEqual(len(factory.settings.additional_hover_text), 3)
+            self.assertEqual(factory.settings.additional_hover_text[0], 'ONE')
+            self.assertIsNone(factory.hover_text)
+            self.assertNotIn('dataplotlyShowHoverText', factory.build_html({}))
+            factory.dispose()
+
+            factory = PlotFactory(settings, hover_on_demand=True)
+            self.assertEqual(factory.settings.additional_hover_text, [])
+            self.assertEqual(factory.settings.x, [1, 2, 3])
+            self.assertFalse(factory.trace[0].text)
+            self.assertEqual(factory.hover_text.text(factory.settings.feature_ids[2]), 'THREE')
+            self.assertIn('dataplotlyShowHoverText', factory.build_html({}))
+            factory.dispose()
+
+            # not for plot types which don't show hover text
+            settings = PlotSettings('box', properties=settings.properties, layout=settings.layout)
+            settings.source_layer_id = layer.id()
+            factory = PlotFactory(settings, hover_on_demand=True)
+            self.assertFalse(factory.hover_on_demand)
+            self.assertIsNone(factory.hover_text)
+            factory.dispose()
+        finally:
+            QgsProject.instance().removeMapLayer(layer.id())
+
+    def test_overlay(self):
+        """
+        Test that figures show hover text on demand if any of their plots needs it
+        """
+        factories = OrderedDict()
+        factories['1_scatter'] = create_factory('scatter', hover_on_demand=True)
+        factories['2_bar'] = create_factory('bar', hover_on_demand=True)
+        self.assertTrue(factories['1_scatter'].hover_on_demand)
+        self.assertFalse(factories['2_bar'].hover_on_demand)
+
+        # the figure is written by the bar factory, which doesn't show hover text
+        overlay = OverlayFigure()
+        with open(overlay.build(factories)) as f:
+            self.assertIn('dataplotlyShowHoverText', f.read())
+        self.assertNotIn('dataplotlyShowHoverText', overlay.update_script(OrderedDict([('2_bar', factories['2_bar'])])))
+
+        # a plot with hover text on demand is added to a shown figure
+        script = overlay.update_script(factories)
+        self.assertIn('dataplotlyShowHoverText', script)
+        self.assertLess(script.index('dataplotlyShowHoverText'), script.index('dataplotlyUpdateFigure('))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyHoverText)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
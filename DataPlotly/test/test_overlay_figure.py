@@ -0,0 +1,98 @@
+# coding=utf-8
+"""Overlay figure test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import json
+import unittest
+from collections import OrderedDict
+from DataPlotly.core.overlay_figure import OverlayFigure
+from DataPlotly.test.utilities import get_qgis_app, create_factory
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+def parse_update(script):
+    """
+    Returns the arguments of an update script
+    """
+    prefix = 'dataplotlyUpdateFigure('
+    assert script.startswith(prefix) and script.endswith(');')
+    return json.loads('[' + script[len(prefix):-2] + ']')
+
+
+class DataPlotlyOverlayFigure(unittest.TestCase):
+    """Test overlaying plots"""
+
+    def test_merged_layout(self):
+        """
+        Test merging the layouts of overlaid plots
+        """
+        factories = OrderedDict()
+        factories['1_bar'] = create_factory('bar', [1, 2], [3, 4], layout={'title': 'bars'})
+        factories['1_bar'].settings.layout['bar_mode'] = 'stack'
+        factories['1_bar'].rebuild()
+        factories['2_scatter'] = create_factory('scatter', [1, 2], [5, 6], layout={'title': 'points'})
+
+        layout = OverlayFigure.merged_layout(factories)
+        self.assertEqual(layout['title'], 'points')
+        self.assertEqual(layout['barmode'], 'stack')
+
+        # the layout of the last plot is used, not just its bar mode
+        path = factories['2_scatter'].build_figures(ptrace=[f.trace[0] for f in factories.values()])
+        with open(path) as f:
+            self.assertIn('"title":"points"', f.read())
+
+        # the deprecated plot type argument is ignored
+        path = factories['2_scatter'].build_figures('bar', [f.trace[0] for f in factories.values()])
+        with open(path) as f:
+            self.assertIn('"title":"points"', f.read())
+
+    def test_update(self):
+        """
+        Test updating the overlaid plots of a shown figure
+        """
+        factories = OrderedDict()
+        factories['1_scatter'] = create_factory('scatter', [1, 2], [3, 4], layout={'title': 'a'})
+        factories['2_scatter'] = create_factory('scatter', [1, 2], [5, 6], layout={'title': 'b'})
+
+        overlay = OverlayFigure()
+        overlay.build(factories)
+        self.assertEqual(list(overlay.traces), ['1_scatter', '2_scatter'])
+
+        # nothing changed
+        traces, layout, config = parse_update(overlay.update_script(factories))
+        self.assertEqual(traces, [0, 1])
+        self.assertEqual(layout['title'], 'b')
+        self.assertTrue(config['editable'])
+
+        # a rebuilt plot and a new plot are sent, the others are kept
+        factories['1_scatter'].settings.y = [7, 8]
+        factories['1_scatter'].rebuild()
+        factories['3_scatter'] = create_factory('scatter', [1, 2], [9, 10], layout={'title': 'c'})
+        traces, layout, _ = parse_update(overlay.update_script(factories))
+        self.assertEqual(traces[0]['y'], [7, 8])
+        self.assertEqual(traces[1], 1)
+        self.assertEqual(traces[2]['y'], [9, 10])
+        self.assertEqual(layout['title'], 'c')
+
+        # removed plots are deleted
+        del factories['2_scatter']
+        traces, _, _ = parse_update(overlay.update_script(factories))
+        self.assertEqual(traces, [0, 2])
+        self.assertEqual(list(overlay.traces), ['1_scatter', '3_scatter'])
+
+        overlay.clear()
+        traces, _, _ = parse_update(overlay.update_script(factories))
+        self.assertEqual([trace['y'] for trace in traces], [[7, 8], [9, 10]])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyOverlayFigure)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -11,6 +11,8 @@
 import unittest
 import os
 from qgis.core import (
+    NULL,
+    QgsFeature,
     QgsProject,
     QgsVectorLayer,
     QgsReferencedRectangle,
@@ -23,7 +25,8 @@ from qgis.core import (
 )
 from qgis.PyQt.QtTest import QSignalSpy
 from DataPlotly.core.plot_settings import PlotSettings
-from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.plot_factory import PlotFactory, DataDefinedValues
+from DataPlotly.test.utilities import create_factory
 
 
 class DataPlotlyFactory(unittest.TestCase):
@@ -547,6 +550,246 @@ class DataPlotlyFactory(unittest.TestCase):
                                                                        '#ffff00',
                                                                        '#ffff00'])
 
+    def test_data_defined_values(self):
+        """
+        Test collecting data defined values with memoised colors
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        vl1.setSubsetString('id < 10')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.properties['in_color'] = 'red'
+        settings.properties['out_color'] = 'green'
+        settings.data_defined_properties.setProperty(PlotSettings.PROPERTY_COLOR, QgsProperty.fromExpression(
+            'case when "ca" > 100 then \'0,0,255\' else \'not a color\' end'))
+        settings.data_defined_properties.setProperty(PlotSettings.PROPERTY_STROKE_COLOR, QgsProperty.fromValue(
+            '#ffff00'))
+
+        context = QgsExpressionContext()
+        context.appendScope(vl1.createExpressionContextScope())
+        values = DataDefinedValues(settings, context)
+        self.assertIsNone(values.marker_size_property)
+        self.assertIsNone(values.stroke_width_property)
+
+        for f in vl1.getFeatures():
+            context.setFeature(f)
+            values.collect()
+
+        self.assertEqual(values.colors, ['#ff0000', '#ff0000', '#ff0000', '#ff0000', '#ff0000',
+                                         '#0000ff', '#0000ff', '#0000ff', '#0000ff'])
+        self.assertEqual(values.stroke_colors, ['#ffff00'] * 9)
+        self.assertEqual(values.marker_sizes, [])
+        # each distinct value is only decoded once
+        self.assertEqual(values.color_names, {'0,0,255': '#0000ff', 'not a color': '#ff0000', '#ffff00': '#ffff00'})
+
+    def test_field_index_access(self):
+        """
+        Test that reading plain field values by attribute index gives the values read by name
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+        features = list(vl1.getFeatures())
+        fields = ['so4', 'ca', 'mg']
+        indices = [vl1.fields().lookupField(field) for field in fields]
+
+        by_name = [[f[field] for field in fields] for f in features]
+        by_index = []
+        for f in features:
+            attributes = f.attributes()
+            by_index.append([attributes[index] for index in indices])
+        self.assertEqual(by_name, by_index)
+
+        # the factory gives the same values through the index path
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        QgsProject.instance().addMapLayer(vl1)
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.layout['additional_info_expression'] = 'mg'
+        factory = PlotFactory(settings)
+        expected = [v for v in by_name[:len(features)] if v[0] != NULL and v[1] != NULL]
+        self.assertEqual(factory.settings.x, [v[0] for v in expected])
+        self.assertEqual(factory.settings.additional_hover_text, [v[2] for v in expected])
+
+    def test_chunked_fetch(self):
+        """
+        Test fetching values in chunks
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        vl1.setSubsetString('id < 10')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.data_defined_properties.setProperty(PlotSettings.PROPERTY_MARKER_SIZE, QgsProperty.fromExpression('"mg" / 10'))
+
+        factory = PlotFactory(settings, build=False)
+        self.assertIsNone(factory.trace)
+
+        chunks = []
+        for start, end in factory.rebuild_in_chunks(4):
+            chunks.append((start, end))
+            self.assertEqual(len(factory.settings.x), end)
+            self.assertIsNotNone(factory.trace)
+        self.assertEqual(chunks, [(0, 4), (4, 8), (8, 9)])
+        self.assertEqual(factory.settings.x, [98, 88, 267, 329, 319, 137, 350, 151, 203])
+        self.assertEqual(list(factory.trace[0].x), factory.settings.x)
+
+        update = factory.trace_update(4, 8)
+        self.assertEqual(update['x'], [[319, 137, 350, 151]])
+        self.assertEqual(update['y'], [factory.settings.y[4:8]])
+        self.assertEqual(update['ids'], [factory.settings.feature_ids[4:8]])
+        self.assertEqual(update['marker.size'], [factory.settings.data_defined_marker_sizes[4:8]])
+
+        # closing the generator early keeps the values fetched so far
+        chunks = factory.rebuild_in_chunks(4)
+        next(chunks)
+        chunks.close()
+        self.assertEqual(factory.settings.x, [98, 88, 267, 329])
+        self.assertEqual(list(factory.trace[0].x), [98, 88, 267, 329])
+
+        settings.plot_type = 'pie'
+        self.assertIsNone(factory.trace_update(0, 4))
+
+    def test_stats(self):
+        """
+        Test recording performance stats
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        vl1.setSubsetString('id < 10')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.data_defined_properties.setProperty(PlotSettings.PROPERTY_FILTER, QgsProperty.fromExpression('"so4" > 200'))
+
+        factory = PlotFactory(settings)
+        stats = factory.stats
+        self.assertEqual(list(stats.timings.keys()), ['provider', 'fetch', 'trace', 'layout', 'rebuild'])
+        self.assertTrue(all(calls == 1 for _, calls in stats.timings.values()))
+        self.assertGreaterEqual(stats.time('rebuild'), stats.time('fetch'))
+        self.assertGreaterEqual(stats.time('fetch'), stats.time('provider'))
+        self.assertEqual(stats.fetch_path, 'iterator')
+        self.assertEqual(stats.counts['features_read'], 5)
+        self.assertEqual(stats.counts['features_plotted'], 5)
+
+        html = factory.build_html({})
+        self.assertEqual(stats.payload_chars, len(html))
+        self.assertIn('serialize', stats.timings)
+        self.assertGreaterEqual(stats.time('html'), stats.time('serialize'))
+
+        self.assertEqual(stats.to_dict()['counts'], {'features_read': 5, 'features_plotted': 5})
+        self.assertIn('fetched from: iterator', stats.summary())
+
+        # stats are reset when rebuilding
+        factory.rebuild()
+        self.assertNotIn('html', stats.timings)
+        self.assertEqual(stats.payload_chars, 0)
+        # the memory increase is measured from the rebuild
+        if stats.peak_memory_start is not None:
+            self.assertGreaterEqual(stats.peak_memory_increase, 0)
+
+    def test_ternary_hover(self):
+        """
+        Test that ternary hover labels show the raw values
+        """
+        settings = PlotSettings('ternary')
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.properties['z_name'] = 'mg {x}'
+        settings.layout['y_title'] = 'calcium'
+        settings.x = [98, 88, 267]
+        settings.y = [81.87, 22.26, 74.16]
+        settings.z = [12.0, 5.5, 30.1]
+
+        factory = PlotFactory(settings)
+        self.assertEqual(factory.trace[0].hoverinfo, 'text')
+        self.assertEqual(list(factory.trace[0].text), ['so4: 98<br>ca: 81.87<br>mg {x}: 12.0',
+                                                       'so4: 88<br>ca: 22.26<br>mg {x}: 5.5',
+                                                       'so4: 267<br>ca: 74.16<br>mg {x}: 30.1'])
+        # the axis titles are left as set
+        self.assertEqual(factory.layout['ternary']['aaxis']['title'], '')
+        self.assertEqual(factory.layout['ternary']['baxis']['title'], 'calcium')
+        self.assertEqual(factory.layout['ternary']['caxis']['title'], '')
+
+        settings.additional_hover_text = ['a', 'b', 'c']
+        factory = PlotFactory(settings)
+        self.assertEqual(factory.trace[0].text[2], 'so4: 267<br>ca: 74.16<br>mg {x}: 30.1<br>c')
+
+        # labels evaluated on demand aren't sent with the values
+        settings.additional_hover_text = []
+        factory = PlotFactory(settings, hover_on_demand=True)
+        self.assertEqual(factory.trace[0].hoverinfo, 'none')
+        self.assertIsNone(factory.trace[0].text)
+        self.assertEqual(factory.hover_label(1), 'so4: 88<br>ca: 22.26<br>mg {x}: 5.5')
+        self.assertIsNone(factory.hover_label(3))
+        self.assertEqual(factory.hover_labels(2)['2:0'], 'so4: 98<br>ca: 81.87<br>mg {x}: 12.0')
+        self.assertEqual(len(factory.hover_labels(2)), 3)
+
+    def test_dispose(self):
+        """
+        Test that only live factories are rebuilt when their layer changes
+        """
+        layer = QgsVectorLayer('Point?field=so4:double&field=ca:double', 'layer', 'memory')
+        for so4, ca in ((98, 81.87), (88, 22.26), (267, 74.16)):
+            f = QgsFeature(layer.fields())
+            f.setAttributes([so4, ca])
+            layer.dataProvider().addFeature(f)
+        QgsProject.instance().addMapLayer(layer)
+
+        def create_layer_factory(selected_features_only=False):
+            return create_factory('scatter', layer=layer, properties={'x_name': 'so4', 'y_name': 'ca',
+                                                                      'selected_features_only': selected_features_only})
+
+        live = create_layer_factory()
+        live_selected = create_layer_factory(True)
+        disposed = create_layer_factory()
+        disposed.dispose()
+        # disposing twice is harmless
+        disposed.dispose()
+        # an updated plot replaces the previous factory
+        replaced = create_layer_factory(True)
+        replaced.dispose()
+
+        spies = {factory: QSignalSpy(factory.plot_built) for factory in (live, live_selected, disposed, replaced)}
+
+        self.assertTrue(layer.startEditing())
+        before = {factory: len(spy) for factory, spy in spies.items()}
+        self.assertTrue(layer.changeAttributeValue(2, 0, 150))
+        self.assertEqual({factory: len(spy) - before[factory] for factory, spy in spies.items()},
+                         {live: 1, live_selected: 1, disposed: 0, replaced: 0})
+        self.assertEqual(live.settings.x, [98, 150, 267])
+        self.assertEqual(disposed.settings.x, [98, 88, 267])
+
+        # selection changes only rebuild live plots of selected features
+        before = {factory: len(spy) for factory, spy in spies.items()}
+        layer.selectByIds([1])
+        self.assertEqual({factory: len(spy) - before[factory] for factory, spy in spies.items()},
+                         {live: 0, live_selected: 1, disposed: 0, replaced: 0})
+
+        layer.rollBack()
+        QgsProject.instance().removeMapLayer(layer.id())
+
 
 if __name__ == "__main__":
     suite = unittest.makeSuite(DataPlotlyFactory)
@@ -0,0 +1,118 @@
+# coding=utf-8
+"""Plot layout item test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from qgis.core import (
+    QgsFeature,
+    QgsGeometry,
+    QgsLayoutSize,
+    QgsPrintLayout,
+    QgsProject,
+    QgsProperty,
+    QgsVectorLayer
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.layouts.plot_layout_item import PlotLayoutItem
+from DataPlotly.test.utilities import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+def create_layer(uri, rows):
+    """
+    Creates a memory layer with features of (wkt, attributes) rows
+    """
+    layer = QgsVectorLayer(uri, 'layer', 'memory')
+    features = []
+    for wkt, attributes in rows:
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromWkt(wkt))
+        feature.setAttributes(attributes)
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+class DataPlotlyLayoutItem(unittest.TestCase):
+    """Test the plot layout item"""
+
+    def setUp(self):
+        self.coverage = create_layer('Polygon?crs=epsg:4326&field=name:string',
+                                     [('Polygon((0 0, 1 0, 1 1, 0 1, 0 0))', ['first']),
+                                      ('Polygon((2 0, 3 0, 3 1, 2 1, 2 0))', ['second']),
+                                      ('Polygon((4 0, 5 0, 5 1, 4 1, 4 0))', ['third'])])
+        self.points = create_layer('Point?crs=epsg:4326&field=a:integer&field=b:integer',
+                                   [('Point(0.5 0.5)', [1, 2]), ('Point(0.2 0.7)', [2, 3]),
+                                    ('Point(2.5 0.5)', [3, 4]), ('Point(4.5 0.5)', [4, 5])])
+        QgsProject.instance().addMapLayers([self.coverage, self.points])
+
+        self.layout = QgsPrintLayout(QgsProject.instance())
+        self.layout.initializeDefaults()
+        self.layout.atlas().setCoverageLayer(self.coverage)
+        self.layout.atlas().setEnabled(True)
+
+        self.item = PlotLayoutItem(self.layout)
+        self.layout.addLayoutItem(self.item)
+        self.item.attemptResize(QgsLayoutSize(100, 80))
+        settings = PlotSettings('scatter', properties={'x_name': 'a', 'y_name': 'b'})
+        settings.source_layer_id = self.points.id()
+        self.item.set_plot_settings(settings)
+        self.item.filter_by_atlas = True
+        self.item.prefetch_atlas = True
+        self.item.static_renderer = 'qpainter'
+
+    def tearDown(self):
+        self.layout.atlas().endRender()
+        QgsProject.instance().removeMapLayers([self.coverage.id(), self.points.id()])
+
+    def page_key(self):
+        """
+        Returns the cache key of the plot of the current atlas page
+        """
+        return self.item.plot_cache_key(self.item.filter_region())
+
+    def test_prerender(self):
+        """
+        Test that the plots pre-rendered for the next atlas pages are used by these pages
+        """
+        atlas = self.layout.atlas()
+        self.assertTrue(atlas.beginRender())
+        self.assertIsNotNone(self.item.prerenderer)
+        self.assertTrue(atlas.first())
+        first_key = self.page_key()
+        self.assertIn(first_key, self.item.render_cache)
+
+        self.assertTrue(atlas.next())
+        self.assertNotEqual(self.page_key(), first_key)
+        self.assertIn(self.page_key(), self.item.render_cache)
+        self.assertTrue(atlas.next())
+        self.assertIn(self.page_key(), self.item.render_cache)
+
+    def test_expression_context(self):
+        """
+        Test that plots depending on the atlas feature are keyed on it, and not pre-rendered
+        """
+        self.item.plot_settings.data_defined_properties.setProperty(
+            PlotSettings.PROPERTY_MARKER_SIZE, QgsProperty.fromExpression('@atlas_featureid * 5'))
+        self.assertTrue(self.item.depends_on_expression_context())
+
+        atlas = self.layout.atlas()
+        self.assertTrue(atlas.beginRender())
+        self.assertIsNone(self.item.prerenderer)
+        self.assertTrue(atlas.first())
+        first_key = self.page_key()
+        self.assertTrue(atlas.next())
+        self.assertNotEqual(self.page_key()[-1], first_key[-1])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyLayoutItem)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,80 @@
+# coding=utf-8
+"""Plot render host test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from qgis.PyQt.QtCore import QSize
+from DataPlotly.layouts.plot_render_host import PlotRenderHost
+from DataPlotly.test.utilities import get_qgis_app, create_factory
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+X = [1, 2, 2, 3, 3, 3, 4, 4, 5, 12]
+Y = [4, 5, 6, 2, 9, 1, 6, 7, 3, 8]
+
+
+class DataPlotlyRenderHost(unittest.TestCase):
+    """Test the shared plot render host"""
+
+    def test_render(self):
+        """
+        Test rendering several plots with a pool of pages
+        """
+        host = PlotRenderHost(pool_size=2)
+        pictures = {}
+        jobs = [host.render(create_factory(plot_type, X, Y), {'staticPlot': True}, QSize(400, 300),
+                            lambda picture, plot_type=plot_type: pictures.__setitem__(plot_type, picture))
+                for plot_type in ('scatter', 'bar', 'histogram', 'box')]
+        host.wait(jobs, 30000)
+
+        self.assertEqual(set(pictures), {'scatter', 'bar', 'histogram', 'box'})
+        for plot_type, picture in pictures.items():
+            self.assertFalse(picture.boundingRect().isEmpty(), plot_type)
+        # plotly.js is only loaded by the pages of the pool
+        self.assertLessEqual(len(host.pages), 2)
+        self.assertFalse(host.pending(jobs))
+
+        # pages are reused
+        picture = host.render_picture(create_factory('scatter', X, Y), {'staticPlot': True}, QSize(400, 300))
+        self.assertIsNotNone(picture)
+        self.assertLessEqual(len(host.pages), 2)
+
+    def test_rendered_signal(self):
+        """
+        Test that render returns at once and signals the rendered picture
+        """
+        host = PlotRenderHost(pool_size=1)
+        rendered = []
+        host.job_rendered.connect(lambda job_id, picture: rendered.append((job_id, picture)))
+        job = host.render(create_factory('bar', X, Y), {'staticPlot': True}, QSize(400, 300))
+        self.assertEqual(host.pending([job]), {job})
+        self.assertEqual(rendered, [])
+
+        host.wait([job], 30000)
+        self.assertEqual([job_id for job_id, _ in rendered], [job])
+        self.assertFalse(rendered[0][1].boundingRect().isEmpty())
+
+    def test_cancel(self):
+        """
+        Test canceling queued plots
+        """
+        host = PlotRenderHost(pool_size=1)
+        pictures = []
+        job = host.render(create_factory('scatter', X, Y), {}, QSize(400, 300), pictures.append)
+        self.assertEqual(host.pending([job]), {job})
+        host.cancel([job])
+        self.assertFalse(host.pending([job]))
+        self.assertEqual(pictures, [])
+        self.assertIs(PlotRenderHost.instance(), PlotRenderHost.instance())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyRenderHost)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,84 @@
+# coding=utf-8
+"""Plot streamer test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from qgis.core import (
+    QgsFeature,
+    QgsProject,
+    QgsVectorLayer
+)
+from qgis.PyQt.QtTest import QSignalSpy
+from qgis.PyQt.QtWebKitWidgets import QWebView
+from DataPlotly.gui.plot_streamer import PlotStreamer
+from DataPlotly.test.utilities import get_qgis_app, create_factory
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class DataPlotlyStreamer(unittest.TestCase):
+    """Test progressive plot display"""
+
+    def setUp(self):
+        self.layer = QgsVectorLayer('Point?field=so4:double&field=ca:double', 'layer', 'memory')
+        features = []
+        for i in range(10):
+            feature = QgsFeature(self.layer.fields())
+            feature.setAttributes([i, i * 2])
+            features.append(feature)
+        self.layer.dataProvider().addFeatures(features)
+        QgsProject.instance().addMapLayer(self.layer)
+
+    def tearDown(self):
+        self.layer.rollBack()
+        QgsProject.instance().removeMapLayer(self.layer.id())
+
+    def test_layer_modified(self):
+        """
+        Test that streaming restarts when the layer is modified, instead of rebuilding the factory
+        """
+        factory = create_factory('scatter', layer=self.layer, properties={'x_name': 'so4', 'y_name': 'ca'},
+                                 build=False)
+        built_spy = QSignalSpy(factory.plot_built)
+        view = QWebView()
+        streamer = PlotStreamer(factory, view, 4)
+        finished_spy = QSignalSpy(streamer.finished)
+        self.assertFalse(factory.connected)
+
+        streamer.start()
+        streamer.next_chunk()
+        streamer.next_chunk()
+        self.assertEqual(streamer.fetched, 8)
+
+        self.assertTrue(self.layer.startEditing())
+        self.assertTrue(self.layer.changeAttributeValue(2, 0, 100))
+        # the factory isn't rebuilt while streaming, values are fetched again instead
+        self.assertEqual(len(built_spy), 0)
+        self.assertEqual(streamer.fetched, 0)
+        self.assertFalse(streamer.previewed)
+
+        while not streamer.complete and not len(finished_spy):
+            streamer.next_chunk()
+        # the preview is loaded in the view
+        streamer.preview_loaded(True)
+        self.assertEqual(len(finished_spy), 1)
+        self.assertEqual(factory.settings.x, [0, 100, 2, 3, 4, 5, 6, 7, 8, 9])
+
+        # once streaming is done, the factory is rebuilt on layer changes again
+        self.assertTrue(factory.connected)
+        self.assertTrue(self.layer.changeAttributeValue(3, 0, 200))
+        self.assertEqual(len(built_spy), 1)
+        self.assertEqual(factory.settings.x[2], 200)
+        factory.dispose()
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyStreamer)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
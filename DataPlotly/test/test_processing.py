@@ -0,0 +1,147 @@
+# coding=utf-8
+"""Processing algorithm test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+import json
+import shutil
+import tempfile
+from qgis.PyQt.QtCore import QDate, QDateTime, QTime
+from qgis.PyQt.QtGui import QImage
+from qgis.core import (
+    QgsProcessingContext,
+    QgsProcessingFeedback,
+    QgsProcessingUtils
+)
+from DataPlotly.test.utilities import get_qgis_app
+from DataPlotly.processing.dataplotly_algorithms import DataPlotlyProcessingPlot, DataPlotlyProcessingSmallMultiples
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class DataPlotlyProcessing(unittest.TestCase):
+    """Test the Processing algorithm"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def run_algorithm(self, plot_type, **parameters):
+        """
+        Runs the algorithm on the test layer, returning the results
+        """
+        parameters = {**{
+            'INPUT': os.path.join(os.path.dirname(__file__), 'test_layer.shp'),
+            'PLOT_TYPE': DataPlotlyProcessingPlot.PLOT_TYPE_OPTIONS.index(plot_type),
+            'OUTPUT_HTML_FILE': os.path.join(self.temp_dir, 'plot.html'),
+            'OUTPUT_JSON_FILE': os.path.join(self.temp_dir, 'plot.json'),
+            'OUTPUT_IMAGE_FILE': os.path.join(self.temp_dir, 'plot.png')
+        }, **parameters}
+        alg = DataPlotlyProcessingPlot()
+        alg.initAlgorithm()
+        results, ok = alg.run(parameters, QgsProcessingContext(), QgsProcessingFeedback())
+        self.assertTrue(ok)
+        return results
+
+    def test_outputs(self):
+        """
+        Test HTML, JSON and image outputs
+        """
+        results = self.run_algorithm('scatter', XFIELD='so4', YFIELD='"ca" * 2', PLOT_TITLE='test')
+
+        with open(results['OUTPUT_HTML_FILE']) as f:
+            self.assertIn('Plotly.newPlot', f.read())
+
+        with open(results['OUTPUT_JSON_FILE']) as f:
+            figure = json.load(f)
+        self.assertEqual(figure['data'][0]['type'], 'scatter')
+        self.assertEqual(figure['data'][0]['x'][:3], [98, 88, 267])
+        self.assertEqual(figure['data'][0]['y'][:3], [163.74, 44.52, 148.32])
+        self.assertEqual(figure['layout']['xaxis']['title'], 'so4')
+        self.assertEqual(figure['layout']['yaxis']['title'], '"ca" * 2')
+
+        self.assertFalse(QImage(results['OUTPUT_IMAGE_FILE']).isNull())
+
+    def test_plot_types(self):
+        """
+        Test that all plot types can be created
+        """
+        for plot_type in DataPlotlyProcessingPlot.PLOT_TYPE_OPTIONS:
+            results = self.run_algorithm(plot_type, XFIELD='so4', YFIELD='ca', ZFIELD='mg', OUTPUT_IMAGE_FILE=None)
+            with open(results['OUTPUT_JSON_FILE']) as f:
+                self.assertTrue(json.load(f)['data'], plot_type)
+
+    def test_small_multiples(self):
+        """
+        Test creating one plot per group
+        """
+        folder = os.path.join(self.temp_dir, 'plots')
+        parameters = {
+            'INPUT': os.path.join(os.path.dirname(__file__), 'test_layer.shp'),
+            'PLOT_TYPE': DataPlotlyProcessingPlot.PLOT_TYPE_OPTIONS.index('scatter'),
+            'XFIELD': 'so4',
+            'YFIELD': 'ca',
+            'GROUP_BY': 'if("so4" > 200, \'high\', \'low\')',
+            'OUTPUT_FORMATS': [0, 1, 2],
+            'OUTPUT_FOLDER': folder,
+            'OUTPUT': 'memory:'
+        }
+        alg = DataPlotlyProcessingSmallMultiples()
+        alg.initAlgorithm()
+        context = QgsProcessingContext()
+        results, ok = alg.run(parameters, context, QgsProcessingFeedback())
+        self.assertTrue(ok)
+
+        index = QgsProcessingUtils.mapLayerFromString(results['OUTPUT'], context)
+        rows = {f['group']: f for f in index.getFeatures()}
+        self.assertEqual(set(rows), {'high', 'low'})
+        self.assertEqual(index.featureCount(), 2)
+        for group, row in rows.items():
+            for output_format in ('html', 'json', 'svg'):
+                self.assertTrue(os.path.isfile(row[output_format]), row[output_format])
+            with open(row['json']) as f:
+                figure = json.load(f)
+            self.assertEqual(len(figure['data'][0]['x']), row['count'])
+            self.assertTrue(all((x > 200) == (group == 'high') for x in figure['data'][0]['x']))
+
+    def test_small_multiples_dates(self):
+        """
+        Test naming groups of dates
+        """
+        folder = os.path.join(self.temp_dir, 'plots')
+        parameters = {
+            'INPUT': os.path.join(os.path.dirname(__file__), 'test_layer.shp'),
+            'PLOT_TYPE': DataPlotlyProcessingPlot.PLOT_TYPE_OPTIONS.index('scatter'),
+            'XFIELD': 'so4',
+            'YFIELD': 'ca',
+            'GROUP_BY': 'to_date(if("so4" > 200, \'2020-01-01\', \'2020-02-01\'))',
+            'OUTPUT_FORMATS': [1],
+            'OUTPUT_FOLDER': folder,
+            'OUTPUT': 'memory:'
+        }
+        alg = DataPlotlyProcessingSmallMultiples()
+        alg.initAlgorithm()
+        context = QgsProcessingContext()
+        results, ok = alg.run(parameters, context, QgsProcessingFeedback())
+        self.assertTrue(ok)
+
+        index = QgsProcessingUtils.mapLayerFromString(results['OUTPUT'], context)
+        self.assertEqual({f['group'] for f in index.getFeatures()}, {'2020-01-01', '2020-02-01'})
+        self.assertEqual(sorted(os.listdir(folder)), ['0000_2020-02-01.json', '0001_2020-01-01.json'])
+        self.assertEqual(DataPlotlyProcessingSmallMultiples.group_name(QDateTime(QDate(2020, 1, 1), QTime(10, 30))),
+                         '2020-01-01T10:30:00')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyProcessing)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,124 @@
+# coding=utf-8
+"""Feature sampling test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+from collections import Counter
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsProperty
+)
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.sampling import FeatureSampler
+
+
+class DataPlotlySampling(unittest.TestCase):
+    """Test feature sampling"""
+
+    @staticmethod
+    def sample(sampler, values, strata=None):
+        """
+        Samples values with a sampler, returning the sampled values
+        """
+        sample = []
+        for i, value in enumerate(values):
+            index = sampler.sample_index(strata[i] if strata else None)
+            if index is None:
+                continue
+            if index == len(sample):
+                sample.append(value)
+            else:
+                sample[index] = value
+        return sample
+
+    def test_sampler(self):
+        """
+        Test sampling modes
+        """
+        values = list(range(1000))
+
+        sampler = FeatureSampler(FeatureSampler.MODE_COUNT, size=50, seed=1)
+        sample = self.sample(sampler, values)
+        self.assertEqual(len(sample), 50)
+        self.assertEqual(len(set(sample)), 50)
+        self.assertEqual(sampler.count, 50)
+        self.assertEqual(sampler.seen, 1000)
+        self.assertEqual(sampler.description(), 'Sampled 50 of 1000')
+        # reproducible with a seed
+        self.assertEqual(self.sample(FeatureSampler(FeatureSampler.MODE_COUNT, size=50, seed=1), values), sample)
+        self.assertNotEqual(self.sample(FeatureSampler(FeatureSampler.MODE_COUNT, size=50, seed=2), values), sample)
+
+        # fewer values than the sample size
+        self.assertEqual(self.sample(FeatureSampler(FeatureSampler.MODE_COUNT, size=50), values[:10]), values[:10])
+
+        sampler = FeatureSampler(FeatureSampler.MODE_FRACTION, fraction=0.2, seed=1)
+        self.assertTrue(sampler.keeps_order())
+        sample = self.sample(sampler, values)
+        self.assertEqual(sample, sorted(sample))
+        self.assertTrue(150 < len(sample) < 250)
+
+        strata = ['a' if v < 900 else 'b' for v in values]
+        sampler = FeatureSampler(FeatureSampler.MODE_STRATIFIED, size=20, seed=1)
+        sample = self.sample(sampler, values, strata)
+        counts = Counter('a' if v < 900 else 'b' for v in sample)
+        self.assertEqual(counts, {'a': 20, 'b': 20})
+
+    def test_sampled_plot(self):
+        """
+        Test sampling plot values
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        vl1.setSubsetString('id < 10')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        settings = PlotSettings('scatter')
+        settings.source_layer_id = vl1.id()
+        settings.properties['x_name'] = 'so4'
+        settings.properties['y_name'] = 'ca'
+        settings.data_defined_properties.setProperty(PlotSettings.PROPERTY_MARKER_SIZE, QgsProperty.fromExpression('"so4" / 10'))
+
+        factory = PlotFactory(settings)
+        all_x = factory.settings.x
+        all_ids = factory.settings.feature_ids
+        self.assertIsNone(factory.sampler)
+
+        settings.properties['sample_mode'] = FeatureSampler.MODE_COUNT
+        settings.properties['sample_size'] = 4
+        settings.properties['sample_seed'] = 3
+        factory = PlotFactory(settings)
+        self.assertEqual(len(factory.settings.x), 4)
+        # the sample keeps the layer order, and values stay aligned
+        positions = [all_ids.index(fid) for fid in factory.settings.feature_ids]
+        self.assertEqual(positions, sorted(positions))
+        self.assertEqual(factory.settings.x, [all_x[p] for p in positions])
+        self.assertEqual(factory.settings.data_defined_marker_sizes, [x / 10 for x in factory.settings.x])
+        self.assertEqual(factory.layout['annotations'][0]['text'], 'Sampled 4 of 9')
+
+        sample = factory.settings.feature_ids
+        self.assertEqual(PlotFactory(settings).settings.feature_ids, sample)
+
+        settings.properties['sample_mode'] = FeatureSampler.MODE_STRATIFIED
+        settings.properties['sample_size'] = 1
+        settings.properties['sample_field'] = '"so4" > 200'
+        factory = PlotFactory(settings)
+        self.assertEqual(len(factory.settings.x), 2)
+        self.assertEqual(sorted(x > 200 for x in factory.settings.x), [False, True])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlySampling)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""Spatial filter test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+import os
+from qgis.core import (
+    QgsProject,
+    QgsVectorLayer,
+    QgsGeometry,
+    QgsPointXY
+)
+from DataPlotly.core.spatial_filter import SpatialFilter
+
+
+class DataPlotlySpatialFilter(unittest.TestCase):
+    """Test spatial filtering"""
+
+    def test_filter_ids(self):
+        """
+        Test that filtered ids match an exact test against every feature
+        """
+        layer_path = os.path.join(
+            os.path.dirname(__file__), 'test_layer.shp')
+
+        vl1 = QgsVectorLayer(layer_path, 'test_layer', 'ogr')
+        self.assertTrue(vl1.isValid())
+        QgsProject.instance().addMapLayer(vl1)
+
+        regions = [QgsGeometry.fromWkt('Polygon((10.1 43.5, 10.8 43.5, 10.8 43.85, 10.1 43.85, 10.1 43.5))'),
+                   QgsGeometry.fromWkt('Polygon((10.6 43.1, 12 43.1, 12 43.8, 10.6 43.8, 10.6 43.1))'),
+                   QgsGeometry.fromPointXY(QgsPointXY(11, 43.5)).buffer(0.6, 8),
+                   QgsGeometry.fromWkt('Polygon((0 0, 1 0, 1 1, 0 1, 0 0))')]
+
+        spatial_filter = SpatialFilter(vl1)
+        for region in regions:
+            expected = {f.id() for f in vl1.getFeatures() if f.geometry().intersects(region)}
+            self.assertEqual(spatial_filter.filter_ids(region), expected)
+
+            inside, boundary = spatial_filter.classify(region)
+            self.assertFalse(inside & boundary)
+            self.assertTrue(inside.issubset(expected))
+
+        self.assertFalse(spatial_filter.filter_ids(regions[-1]))
+
+        # the index is cached until the layer changes
+        self.assertIn(vl1.id(), SpatialFilter._indexes)  # pylint: disable=protected-access
+        vl1.setSubsetString('id < 10')
+        self.assertNotIn(vl1.id(), SpatialFilter._indexes)  # pylint: disable=protected-access
+
+        expected = {f.id() for f in vl1.getFeatures() if f.geometry().intersects(regions[1])}
+        self.assertEqual(spatial_filter.filter_ids(regions[1]), expected)
+
+        # the layer signals are connected once, and the layer is forgotten once deleted
+        self.assertIn(vl1.id(), SpatialFilter._connected_layers)  # pylint: disable=protected-access
+        layer_id = vl1.id()
+        QgsProject.instance().removeMapLayer(vl1)
+        self.assertNotIn(layer_id, SpatialFilter._indexes)  # pylint: disable=protected-access
+        self.assertNotIn(layer_id, SpatialFilter._connected_layers)  # pylint: disable=protected-access
+
+    def test_eviction(self):
+        """
+        Test that only the indexes of the most recently filtered layers are kept
+        """
+        layers = [QgsVectorLayer('Point', 'layer', 'memory') for _ in range(3)]
+        QgsProject.instance().addMapLayers(layers)
+        region = QgsGeometry.fromWkt('Polygon((0 0, 1 0, 1 1, 0 1, 0 0))')
+
+        max_indexes = SpatialFilter.MAX_INDEXES
+        SpatialFilter.MAX_INDEXES = 2
+        try:
+            SpatialFilter(layers[0]).filter_ids(region)
+            SpatialFilter(layers[1]).filter_ids(region)
+            # the first layer is used again, so the second one is the least recently used
+            SpatialFilter(layers[0]).filter_ids(region)
+            SpatialFilter(layers[2]).filter_ids(region)
+            self.assertEqual(list(SpatialFilter._indexes)[-2:],  # pylint: disable=protected-access
+                             [layers[0].id(), layers[2].id()])
+            self.assertNotIn(layers[1].id(), SpatialFilter._indexes)  # pylint: disable=protected-access
+        finally:
+            SpatialFilter.MAX_INDEXES = max_indexes
+            QgsProject.instance().removeMapLayers([layer.id() for layer in layers])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlySpatialFilter)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
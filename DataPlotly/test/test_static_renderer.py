@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Static renderer test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+from qgis.PyQt.QtCore import QRectF, Qt
+from qgis.PyQt.QtGui import QColor, QImage, QPainter
+from DataPlotly.core.plot_settings import PlotSettings
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.static_renderer import QPainterRenderer, Axis
+from DataPlotly.test.utilities import get_qgis_app
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+X = [1, 2, 2, 3, 3, 3, 4, 4, 5, 12]
+Y = [4, 5, 6, 2, 9, 1, 6, 7, 3, 8]
+
+
+class DataPlotlyStaticRenderer(unittest.TestCase):
+    """Test static plot rendering"""
+
+    @staticmethod
+    def render(plot_type, x=None, y=None) -> QImage:
+        """
+        Renders a plot of the specified type to a 400x300 image
+        """
+        settings = PlotSettings(plot_type, properties={'custom': ['x']})
+        settings.x = x or X
+        settings.y = y or Y
+        factory = PlotFactory(settings)
+
+        image = QImage(400, 300, QImage.Format_ARGB32)
+        image.fill(Qt.transparent)
+        painter = QPainter(image)
+        QPainterRenderer().render(factory, painter, QRectF(0, 0, 400, 300))
+        painter.end()
+        return image
+
+    def test_supported_types(self):
+        """
+        Test that all supported plot types render, deterministically
+        """
+        for plot_type in QPainterRenderer.SUPPORTED_TYPES:
+            self.assertIn(plot_type, PlotFactory.PLOT_TYPES)
+            self.assertTrue(QPainterRenderer.supports(plot_type))
+
+            image = self.render(plot_type)
+            # something was drawn in the plot area
+            self.assertTrue(any(image.pixelColor(x, y).alpha() > 0
+                                for x in range(100, 300, 5) for y in range(100, 220, 5)), plot_type)
+            # and the output is stable
+            self.assertEqual(image, self.render(plot_type), plot_type)
+
+        self.assertFalse(QPainterRenderer.supports('ternary'))
+
+    def test_geometry(self):
+        """
+        Test that values are drawn where the axes map them
+        """
+        # the plot area of a 400x300 image, within the margins of QPainterRenderer.render
+        x_axis = Axis(60, 340)
+        y_axis = Axis(255, 60)
+        fill = QColor(PlotSettings().properties['in_color']).name()
+
+        # the marker of the point (5, 3)
+        image = self.render('scatter')
+        x_axis.set_values(X)
+        y_axis.set_values(Y)
+        self.assertEqual(image.pixelColor(round(x_axis.map(5)), round(y_axis.map(3))).name(), fill)
+        # nothing is drawn where there are no points
+        self.assertEqual(image.pixelColor(round(x_axis.map(9)), round(y_axis.map(5))).alpha(), 0)
+
+        # bars are centered on their category, and as high as their value
+        categories = ['a', 'b', 'c']
+        values = [2, 5, 8]
+        image = self.render('bar', categories, values)
+        x_axis.set_values(categories)
+        y_axis.set_values(values, include_zero=True)
+        zero = y_axis.map(0)
+        for category, value in zip(categories, values):
+            x = round(x_axis.map(category))
+            top = next(y for y in range(50, 260) if image.pixelColor(x, y).name() == fill)
+            # the bar outline and grid lines cover the first pixels of the bar
+            self.assertAlmostEqual(zero - top, zero - y_axis.map(value), delta=2, msg=category)
+
+    def test_axis(self):
+        """
+        Test axis value mapping
+        """
+        axis = Axis(0, 100)
+        axis.set_values([3, 17])
+        self.assertEqual(axis.minimum, 0)
+        self.assertEqual(axis.maximum, 20)
+        self.assertEqual(axis.map(10), 50)
+        self.assertEqual(axis.unit_length(), 5)
+        self.assertEqual([label for _, label in axis.tick_labels()], ['0', '5', '10', '15', '20'])
+
+        axis.set_values(['a', 'b', 'a', 'c'])
+        self.assertEqual([label for _, label in axis.tick_labels()], ['a', 'b', 'c'])
+        self.assertEqual(axis.map('b'), 50)
+        self.assertAlmostEqual(axis.unit_length(), 100 / 3)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlyStaticRenderer)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,177 @@
+# coding=utf-8
+"""Subplot grid test
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import json
+import unittest
+from collections import OrderedDict
+from DataPlotly.core.subplot_grid import SubplotGrid
+from DataPlotly.test.utilities import get_qgis_app, create_factory
+
+QGIS_APP, CANVAS, IFACE, PARENT = get_qgis_app()
+
+
+class DataPlotlySubplotGrid(unittest.TestCase):
+    """Test arranging plots in subplots"""
+
+    def test_domains(self):
+        """
+        Test the cell domains of a grid
+        """
+        grid = SubplotGrid(2, 3, horizontal_spacing=0.1, vertical_spacing=0.2)
+        self.assertEqual(grid.cell_count(), 6)
+        x_domain, y_domain = grid.domains[0]
+        self.assertAlmostEqual(x_domain[0], 0)
+        self.assertAlmostEqual(x_domain[1], 0.8 / 3)
+        self.assertAlmostEqual(y_domain[0], 0.6)
+        self.assertAlmostEqual(y_domain[1], 1)
+        x_domain, y_domain = grid.domains[5]
+        self.assertAlmostEqual(x_domain[0], 1 - 0.8 / 3)
+        self.assertAlmostEqual(x_domain[1], 1)
+        self.assertAlmostEqual(y_domain[0], 0)
+        self.assertAlmostEqual(y_domain[1], 0.4)
+
+        grid.set_shape(1, 1)
+        self.assertEqual(grid.domains, [([0, 1], [0, 1])])
+
+    def test_placement(self):
+        """
+        Test placing plots of different types in the cells
+        """
+        factories = OrderedDict()
+        factories['1_scatter'] = create_factory('scatter', layout={'x_title': 'first'})
+        factories['2_pie'] = create_factory('pie')
+        factories['3_ternary'] = create_factory('ternary')
+        factories['4_bar'] = create_factory('bar', layout={'x_title': 'last'})
+        factories['5_scatter'] = create_factory('scatter')
+
+        grid = SubplotGrid(2, 2)
+        grid.register(factories)
+        placements = [placement for _, placement in grid.traces.values()]
+        self.assertEqual(placements[0], {'xaxis': 'x', 'yaxis': 'y'})
+        self.assertEqual(placements[1], {'domain': {'x': grid.domains[1][0], 'y': grid.domains[1][1]}})
+        self.assertEqual(placements[2], {'subplot': 'ternary3'})
+        self.assertEqual(placements[3], {'xaxis': 'x4', 'yaxis': 'y4'})
+        # plots beyond the grid aren't shown
+        self.assertEqual(placements[4], {'visible': False})
+
+        layout = grid.figure_layout(factories)
+        self.assertEqual(layout['xaxis']['title'], 'first')
+        self.assertEqual(layout['xaxis']['domain'], grid.domains[0][0])
+        self.assertEqual(layout['xaxis']['anchor'], 'y')
+        self.assertEqual(layout['xaxis4']['title'], 'last')
+        self.assertEqual(layout['yaxis4']['domain'], grid.domains[3][1])
+        self.assertEqual(layout['yaxis4']['anchor'], 'x4')
+        self.assertEqual(layout['ternary3']['sum'], 100)
+        self.assertEqual(layout['ternary3']['domain'], {'x': grid.domains[2][0], 'y': grid.domains[2][1]})
+        for key in ('xaxis2', 'yaxis3', 'ternary', 'polar'):
+            self.assertNotIn(key, layout)
+        # the factory traces aren't modified
+        self.assertIsNone(factories['4_bar'].trace[0].xaxis)
+
+    def test_shared_axes(self):
+        """
+        Test sharing axes between the cells of columns and rows
+        """
+        factories = OrderedDict(('{}_scatter'.format(i), create_factory('scatter')) for i in range(4))
+
+        grid = SubplotGrid(2, 2, shared_xaxes=True, shared_yaxes=True)
+        grid.register(factories)
+        self.assertEqual([placement for _, placement in grid.traces.values()],
+                         [{'xaxis': 'x', 'yaxis': 'y'}, {'xaxis': 'x2', 'yaxis': 'y'},
+                          {'xaxis': 'x', 'yaxis': 'y2'}, {'xaxis': 'x2', 'yaxis': 'y2'}])
+        layout = grid.figure_layout(factories)
+        # x axes are drawn along the bottom row, y axes along the first column
+        self.assertEqual(layout['xaxis']['anchor'], 'y2')
+        self.assertEqual(layout['xaxis2']['anchor'], 'y2')
+        self.assertEqual(layout['yaxis']['anchor'], 'x')
+        self.assertEqual(layout['yaxis2']['anchor'], 'x')
+        self.assertNotIn('xaxis3', layout)
+
+    def test_shared_axes_partial_grid(self):
+        """
+        Test that shared axes are anchored to existing axes when the grid is not full
+        """
+        factories = OrderedDict(('{}_scatter'.format(i), create_factory('scatter')) for i in range(3))
+
+        grid = SubplotGrid(2, 2, shared_xaxes=True, shared_yaxes=True)
+        grid.register(factories)
+        layout = grid.figure_layout(factories)
+        # the second column only has a plot in the top row
+        self.assertEqual(layout['xaxis']['anchor'], 'y2')
+        self.assertEqual(layout['xaxis2']['anchor'], 'y')
+        self.assertEqual(layout['yaxis']['anchor'], 'x')
+        self.assertEqual(layout['yaxis2']['anchor'], 'x')
+        for key, axis in layout.items():
+            if key.startswith(('xaxis', 'yaxis')):
+                self.assertIn(axis['anchor'].replace('x', 'xaxis').replace('y', 'yaxis'), layout)
+
+    def test_shared_axes_pie(self):
+        """
+        Test that shared x axes are not anchored to a pie in the bottom row
+        """
+        factories = OrderedDict()
+        factories['1_scatter'] = create_factory('scatter')
+        factories['2_scatter'] = create_factory('scatter')
+        factories['3_pie'] = create_factory('pie')
+        factories['4_scatter'] = create_factory('scatter')
+
+        grid = SubplotGrid(2, 2, shared_xaxes=True)
+        grid.register(factories)
+        layout = grid.figure_layout(factories)
+        # the first column's axis is drawn along the plot above the pie
+        self.assertEqual(layout['xaxis']['anchor'], 'y')
+        self.assertEqual(layout['xaxis2']['anchor'], 'y4')
+        self.assertNotIn('yaxis3', layout)
+
+    def test_update(self):
+        """
+        Test updating the cells of a shown grid
+        """
+        factories = OrderedDict()
+        factories['1_scatter'] = create_factory('scatter')
+        factories['2_pie'] = create_factory('pie')
+
+        grid = SubplotGrid(1, 2)
+        grid.build(factories)
+
+        # a plot is added: the existing cartesian plot keeps its axes, the pie is moved
+        factories['3_scatter'] = create_factory('scatter')
+        grid.set_shape(1, 3)
+        script = grid.update_script(factories)
+        traces, layout, _ = json.loads('[' + script[len('dataplotlyUpdateFigure('):-2] + ']')
+        self.assertEqual(traces[0], 0)
+        self.assertEqual(traces[1]['type'], 'pie')
+        self.assertEqual(traces[1]['domain']['x'], grid.domains[1][0])
+        self.assertEqual(traces[2]['xaxis'], 'x3')
+        self.assertEqual(layout['xaxis']['domain'], grid.domains[0][0])
+
+    def test_build_sub_plots(self):
+        """
+        Test building subplots with a factory
+        """
+        factory = create_factory('scatter')
+        pie = create_factory('pie')
+        path = factory.build_sub_plots(1, 2, [factory.trace[0], pie.trace[0]])
+        with open(path) as f:
+            html = f.read()
+        self.assertIn('"xaxis":"x"', html)
+        self.assertIn('"domain":{"x":[', html)
+
+        path = factory.build_sub_plots(2, 1, [factory.trace[0], create_factory('scatter').trace[0]], shared_xaxes=True)
+        with open(path) as f:
+            html = f.read()
+        self.assertIn('"xaxis":"x","yaxis":"y2"', html)
+        self.assertNotIn('"xaxis2"', html)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(DataPlotlySubplotGrid)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
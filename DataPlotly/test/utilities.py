@@ -10,6 +10,8 @@ from qgis.gui import QgsMapCanvas
 from qgis.PyQt.QtCore import QSize
 from qgis.PyQt.QtWidgets import QWidget
 from qgis.utils import iface
+from DataPlotly.core.plot_factory import PlotFactory
+from DataPlotly.core.plot_settings import PlotSettings
 from .qgis_interface import QgisInterface
 
 LOGGER = logging.getLogger('QGIS')
@@ -100,3 +102,25 @@ def get_qgis_app(cleanup=True):
         IFACE = QgisInterface(CANVAS)
 
     return QGISAPP, CANVAS, IFACE, PARENT
+
+
+def create_factory(plot_type: str, x=None, y=None, z=None,  # pylint: disable=too-many-arguments
+                   properties: dict = None, layout: dict = None, layer=None, **kwargs) -> PlotFactory:
+    """
+    Creates a factory for a plot of the specified type, showing either values (by
+    default [1, 2, 3], [4, 5, 6] and [7, 8, 9]) or the features of a layer
+
+    :param properties: plot properties, overriding the default ones (and a custom
+        name, needed by some plot types such as pie plots)
+    :param layout: plot layout properties, overriding the default ones
+    :param layer: source layer of the plot, whose values are fetched instead of x, y and z
+    :param kwargs: additional arguments of PlotFactory, e.g. hover_on_demand
+    """
+    settings = PlotSettings(plot_type, properties=dict({'custom': ['name']}, **(properties or {})), layout=layout)
+    if layer is not None:
+        settings.source_layer_id = layer.id()
+    else:
+        settings.x = [1, 2, 3] if x is None else x
+        settings.y = [4, 5, 6] if y is None else y
+        settings.z = [7, 8, 9] if z is None else z
+    return PlotFactory(settings, **kwargs)
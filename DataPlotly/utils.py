@@ -21,6 +21,8 @@
  ***************************************************************************/
 """
 
+from numbers import Number
+
 
 def getSortedId(_, field_list):
     '''
@@ -38,15 +40,17 @@ def getSortedId(_, field_list):
 
     # create an empty variable if field_list is empty
     # case is when in the Box Plot the optional X group is empty (not chosen)
-    if not field_list:
+    # (field_list may be an array, which has no truth value)
+    if field_list is None or len(field_list) == 0:  # pylint: disable=len-as-condition
         res = None
 
     # don't sort the list if the item is integer or float (check the first item)
-    elif isinstance(field_list[0], (int, float)):
+    elif isinstance(field_list[0], Number):
         res = list(set(field_list))
 
     # sort the list if items are strings
     else:
+        field_list = list(field_list)
         res = sorted(set(field_list), key=field_list.index)
 
     return res